@@ -0,0 +1,152 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Benchmark the assignment of the families to buses.
+
+The benchmark builds synthetic applications of families living around a
+school, with one to three children each, and assigns these families to
+buses of a given capacity, with just enough buses to transport all the
+children.
+
+Usage:
+
+    python benchmark/benchmark_bus_assignment.py [--count 2000] [--bus-capacity 45]
+"""
+
+import argparse
+import datetime
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from majormode.perseus.model.geolocation import GeoPoint
+from majormode.perseus.model.locale import Locale
+
+from intek.application.model import Child
+from intek.application.model import Parent
+from intek.application.model import Registration
+from intek.application.routing import assign_families_to_buses
+
+
+# Default number of synthetic families to assign to buses.
+DEFAULT_FAMILY_COUNT = 2000
+
+# Default number of children that a bus can transport.
+DEFAULT_BUS_CAPACITY = 45
+
+# Geographical coordinates of the school and of the bus depot.
+SCHOOL_LOCATION = (10.7626, 106.6822)
+DEPOT_LOCATION = (10.8000, 106.7200)
+
+# Standard deviation in degrees of the distance between the homes of the
+# families and the school (about 5 kilometers).
+HOME_LOCATION_DEVIATION = 0.045
+
+
+class SyntheticPlace:
+    def __init__(self, location):
+        self.location = location
+
+
+class SyntheticGeocoder:
+    """
+    Geocoder that returns random locations around the school.
+    """
+    def __init__(self, seed):
+        self.__random = random.Random(seed)
+
+    def geocode(self, address):
+        return SyntheticPlace(GeoPoint(
+            SCHOOL_LOCATION[0] + self.__random.gauss(0, HOME_LOCATION_DEVIATION),
+            SCHOOL_LOCATION[1] + self.__random.gauss(0, HOME_LOCATION_DEVIATION)))
+
+
+def build_registrations(count, geocoder):
+    """
+    Build synthetic applications of families with one to three children.
+
+
+    :param count: Number of applications to build.
+
+    :param geocoder: An object `SyntheticGeocoder`.
+
+
+    :return: A list of objects `Registration`.
+    """
+    locale = Locale('eng')
+    registrations = []
+
+    for i in range(count):
+        parents = [
+            Parent(
+                f'Family{i}', 'Primary', f'parent{i}@example.org', '0900000000',
+                f'{i} Nguyen Hue, District 1, Ho Chi Minh City', locale, False,
+                geocoder=geocoder)
+        ]
+
+        children = [
+            Child(f'Family{i}', f'Child{j}', f'{1 + i % 12}/{1 + i % 28}/{2010 + j}', 'CM1', locale)
+            for j in range(1 + i % 3)
+        ]
+
+        registrations.append(Registration(datetime.datetime.now(), children, parents, i % 2 == 0, locale))
+
+    return registrations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the assignment of the families to buses")
+    parser.add_argument('--count', type=int, default=DEFAULT_FAMILY_COUNT,
+                        help="number of synthetic families")
+    parser.add_argument('--bus-capacity', type=int, default=DEFAULT_BUS_CAPACITY,
+                        help="number of children that a bus can transport")
+    arguments = parser.parse_args()
+
+    registrations = build_registrations(arguments.count, SyntheticGeocoder(0))
+
+    # Geocode the homes before measuring the assignment.
+    for registration in registrations:
+        for parent in registration.parents:
+            parent.location
+
+    children_count = sum([len(registration.children) for registration in registrations])
+    bus_count = math.ceil(children_count / arguments.bus_capacity)
+
+    start_time = time.perf_counter()
+    assignment = assign_families_to_buses(
+        registrations,
+        [arguments.bus_capacity] * bus_count,
+        DEPOT_LOCATION,
+        SCHOOL_LOCATION,
+        seed=0)
+    elapsed_time = time.perf_counter() - start_time
+
+    print(f"{len(registrations)} families, {children_count} children: {assignment.summarize()}")
+    print(f"Assigned in {elapsed_time:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Benchmark the import of the applications into the PostgreSQL database of
+the school bus platform.
+
+The benchmark streams the records of synthetic applications into the
+staging table `gf_registration` with a binary `COPY`, and imports them
+with the function `gf_main_bulk`, in a single transaction.
+
+The import creates accounts, children, and homes: run the benchmark
+against a throwaway database where the platform schema and the scripts
+`db/create_gf_table.sql` and `db/create_gf_function.sql` have been
+loaded, for instance a local PostGIS container.
+
+Usage:
+
+    python benchmark/benchmark_database_loading.py --dsn postgresql://postgres@localhost/test [--count 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from intek.application.database import RegistrationDatabaseLoader
+from intek.application.etl import build_database_records
+
+from benchmark_bus_assignment import SyntheticGeocoder
+from benchmark_bus_assignment import build_registrations
+
+
+# Default number of synthetic applications to import.
+DEFAULT_REGISTRATION_COUNT = 2000
+
+# Identification of the school the children attend.
+DEFAULT_SCHOOL_ID = '836dff6a-bd7b-11e7-b6f1-0008a20c190f'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the import of the applications into the database")
+    parser.add_argument('--dsn', required=True,
+                        help="connection string to a throwaway PostgreSQL database")
+    parser.add_argument('--count', type=int, default=DEFAULT_REGISTRATION_COUNT,
+                        help="number of synthetic applications")
+    parser.add_argument('--school-id', default=DEFAULT_SCHOOL_ID,
+                        help="identification of the school the children attend")
+    arguments = parser.parse_args()
+
+    registrations = build_registrations(arguments.count, SyntheticGeocoder(0))
+    records = list(build_database_records(registrations))
+
+    with RegistrationDatabaseLoader(arguments.dsn, arguments.school_id) as loader:
+        start_time = time.perf_counter()
+        record_count = loader.load(records)
+        elapsed_time = time.perf_counter() - start_time
+
+    print(f"Imported {record_count} records in {elapsed_time:.3f}s ({record_count / elapsed_time:,.0f} records/s)")
+
+
+if __name__ == '__main__':
+    main()
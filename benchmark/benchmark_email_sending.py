@@ -0,0 +1,294 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Benchmark the sending of the application confirmation e-mails.
+
+The benchmark starts a Simple Mail Transfer Protocol (SMTP) sink on
+localhost, which accepts and discards the e-mails, and it sends the
+confirmation e-mails of synthetic applications, written in the four
+supported languages, with each of the following methods:
+
+- `connection per message`: the function `send_registration_confirmation_email`
+  opens a new connection to the SMTP server for each e-mail;
+
+- `pooled mailer`: the same function sends the e-mails through a mailer
+  that keeps its connections to the SMTP server open;
+
+- `outbox dispatcher`: the e-mails are queued in an outbox, and sent
+  concurrently by the dispatcher of this outbox.
+
+The sink can simulate the processing time of a remote SMTP relay.  The
+latency is measured per call to `send_registration_confirmation_email`
+for the first two methods, and per e-mail for the dispatcher.
+
+Usage:
+
+    python benchmark/benchmark_email_sending.py [--count 200] [--concurrency 4]
+"""
+
+import argparse
+import datetime
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from majormode.perseus.model.locale import Locale
+from majormode.perseus.model.smtp import SmtpConnectionProperties
+
+from intek.application.attachment import AttachmentCache
+from intek.application.dispatcher import DispatchMetrics
+from intek.application.etl import enqueue_registration_confirmation_emails
+from intek.application.etl import send_registration_confirmation_email
+from intek.application.mailer import Mailer
+from intek.application.model import Child
+from intek.application.model import Parent
+from intek.application.model import Registration
+from intek.application.outbox import EmailOutbox
+from intek.application.outbox import OutboxDispatcher
+
+
+# Default number of synthetic applications to send the confirmation
+# e-mails of.
+DEFAULT_REGISTRATION_COUNT = 200
+
+# Default number of e-mails sent concurrently by the dispatcher.
+DEFAULT_CONCURRENCY = 4
+
+# Default time in milliseconds the SMTP sink takes to accept an e-mail.
+DEFAULT_SINK_LATENCY = 10
+
+# Languages of the synthetic applications.
+LOCALES = [Locale('eng'), Locale('fra'), Locale('kor'), Locale('vie')]
+
+# Absolute path of the folder where the e-mail templates are stored in.
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'intek', 'application', 'templates')
+
+# Name and e-mail address of the author of the e-mails.
+AUTHOR_NAME = 'Benchmark'
+AUTHOR_EMAIL_ADDRESS = 'benchmark@example.org'
+
+
+class SmtpSinkHandler(socketserver.StreamRequestHandler):
+    """
+    Minimal SMTP session that accepts every command and discards the
+    e-mails.  The sink advertises the authentication but not STARTTLS.
+    """
+    def __reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.__reply('220 localhost SMTP sink')
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+
+            command = line.decode('ascii', 'replace').strip().upper()
+
+            if command.startswith('EHLO'):
+                self.wfile.write(b'250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n')
+            elif command.startswith('HELO'):
+                self.__reply('250 localhost')
+            elif command.startswith('AUTH'):
+                self.__reply('235 2.7.0 Authentication successful')
+            elif command.startswith('DATA'):
+                self.__reply('354 End data with <CR><LF>.<CR><LF>')
+                byte_count = 0
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data == b'.\r\n':
+                        break
+                    byte_count += len(data)
+
+                time.sleep(self.server.latency)
+                self.server.record_message(byte_count)
+                self.__reply('250 2.0.0 Ok: queued')
+            elif command.startswith('QUIT'):
+                self.__reply('221 2.0.0 Bye')
+                break
+            else:
+                self.__reply('250 2.0.0 Ok')
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """
+    SMTP server running on localhost that counts and discards the e-mails
+    it receives.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, latency):
+        super().__init__(('127.0.0.1', 0), SmtpSinkHandler)
+        self.latency = latency
+        self.__lock = threading.Lock()
+        self.reset()
+
+    @property
+    def byte_count(self):
+        return self.__byte_count
+
+    @property
+    def message_count(self):
+        return self.__message_count
+
+    @property
+    def port_number(self):
+        return self.server_address[1]
+
+    def record_message(self, byte_count):
+        with self.__lock:
+            self.__message_count += 1
+            self.__byte_count += byte_count
+
+    def reset(self):
+        with self.__lock:
+            self.__message_count = 0
+            self.__byte_count = 0
+
+
+def build_registrations(count):
+    """
+    Build synthetic applications, written in the four supported languages.
+    One family out of three has a secondary parent who prefers another
+    language, which results in two e-mails for this family.
+
+
+    :param count: Number of applications to build.
+
+
+    :return: A list of objects `Registration`.
+    """
+    registrations = []
+
+    for i in range(count):
+        locale = LOCALES[i % len(LOCALES)]
+
+        parents = [
+            Parent(
+                f'Family{i}', 'Primary', f'parent{i}a@example.org', '0900000000',
+                f'{i} Nguyen Hue, District 1, Ho Chi Minh City', locale, False)
+        ]
+
+        if i % 3 == 0:
+            parents.append(
+                Parent(
+                    f'Family{i}', 'Secondary', f'parent{i}b@example.org', '0900000001',
+                    f'{i} Nguyen Hue, District 1, Ho Chi Minh City', LOCALES[(i + 1) % len(LOCALES)], True))
+
+        children = [
+            Child(f'Family{i}', f'Child{j}', f'{1 + i % 12}/{1 + i % 28}/{2010 + j}', 'CM1', locale)
+            for j in range(1 + i % 2)
+        ]
+
+        registrations.append(Registration(datetime.datetime.now(), children, parents, i % 2 == 0, locale))
+
+    return registrations
+
+
+def send_directly(registrations, smtp_connection_properties, mailer, metrics):
+    for registration in registrations:
+        start_time = time.time()
+        send_registration_confirmation_email(
+            registration,
+            smtp_connection_properties,
+            TEMPLATE_PATH,
+            AUTHOR_NAME,
+            AUTHOR_EMAIL_ADDRESS,
+            mailer=mailer)
+        metrics.record(start_time, time.time(), True)
+
+
+def send_with_dispatcher(registrations, smtp_connection_properties, concurrency):
+    with tempfile.TemporaryDirectory() as path:
+        outbox = EmailOutbox(os.path.join(path, 'email_outbox.db'))
+        for registration in registrations:
+            enqueue_registration_confirmation_emails(
+                registration,
+                outbox,
+                TEMPLATE_PATH,
+                AUTHOR_NAME,
+                AUTHOR_EMAIL_ADDRESS)
+
+        with Mailer(smtp_connection_properties, pool_size=concurrency, attachment_cache=AttachmentCache()) as mailer:
+            dispatcher = OutboxDispatcher(outbox, mailer, concurrency=concurrency)
+            dispatcher.stop()
+
+    return dispatcher.metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sending of the confirmation e-mails")
+    parser.add_argument('--count', type=int, default=DEFAULT_REGISTRATION_COUNT,
+                        help="number of synthetic applications")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="number of e-mails sent concurrently by the dispatcher")
+    parser.add_argument('--sink-latency', type=int, default=DEFAULT_SINK_LATENCY, metavar='MILLISECONDS',
+                        help="time the SMTP sink takes to accept an e-mail")
+    arguments = parser.parse_args()
+
+    sink = SmtpSink(arguments.sink_latency / 1000)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+
+    smtp_connection_properties = SmtpConnectionProperties('127.0.0.1', 'benchmark', 'benchmark', sink.port_number)
+    registrations = build_registrations(arguments.count)
+
+    def run_connection_per_message():
+        metrics = DispatchMetrics()
+        send_directly(registrations, smtp_connection_properties, None, metrics)
+        return metrics
+
+    def run_pooled_mailer():
+        metrics = DispatchMetrics()
+        with Mailer(smtp_connection_properties, attachment_cache=AttachmentCache()) as mailer:
+            send_directly(registrations, smtp_connection_properties, mailer, metrics)
+        return metrics
+
+    def run_outbox_dispatcher():
+        return send_with_dispatcher(registrations, smtp_connection_properties, arguments.concurrency)
+
+    for name, run in (
+            ('connection per message', run_connection_per_message),
+            ('pooled mailer', run_pooled_mailer),
+            (f'outbox dispatcher x{arguments.concurrency}', run_outbox_dispatcher)):
+        sink.reset()
+        start_time = time.perf_counter()
+        metrics = run()
+        elapsed_time = time.perf_counter() - start_time
+
+        print(f"{name:>24}: {sink.message_count} e-mails in {elapsed_time:.3f}s "
+              f"({sink.message_count / elapsed_time:,.1f} messages/s, "
+              f"p50 {metrics.get_latency_percentile(50) * 1000:.1f} ms, "
+              f"p99 {metrics.get_latency_percentile(99) * 1000:.1f} ms, "
+              f"{sink.byte_count:,} bytes)")
+
+    sink.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Benchmark the rendering of the localized confirmation e-mail templates.
+
+The benchmark compares the rendering of an e-mail by reading its
+template from the disk and expanding its placeholders, with the
+rendering of a template compiled once and cached.
+
+Usage:
+
+    python benchmark/benchmark_email_template.py [--count 10000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from intek.application.template import EmailTemplate
+from intek.application.template import expand_placeholders_value
+from intek.application.template import get_email_subject
+
+
+# Default number of e-mails to render.
+DEFAULT_RENDER_COUNT = 10000
+
+# Absolute path of the folder where the e-mail templates are stored in.
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'intek', 'application', 'templates')
+
+# Placeholders of a confirmation e-mail.
+PLACEHOLDERS = {
+    'parent_name': 'Jean DUPONT / NGUYỄN Thị Lan',
+    'payment_amount': '100,000',
+    'registration_id': '123-456-789',
+}
+
+
+def render_from_disk(template_file_path_name):
+    with open(template_file_path_name, 'rt') as fd:
+        content = expand_placeholders_value(fd.read(), PLACEHOLDERS)
+
+    return get_email_subject(content), content
+
+
+def render_compiled(template_file_path_name):
+    return EmailTemplate.load(template_file_path_name).render(PLACEHOLDERS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the rendering of the e-mail templates")
+    parser.add_argument('--count', type=int, default=DEFAULT_RENDER_COUNT, help="number of e-mails to render")
+    arguments = parser.parse_args()
+
+    template_file_path_names = [
+        os.path.join(TEMPLATE_PATH, file_name)
+        for file_name in sorted(os.listdir(TEMPLATE_PATH))
+        if file_name.endswith('.html')
+    ]
+
+    # Check that both methods render the same e-mails.
+    for template_file_path_name in template_file_path_names:
+        assert render_from_disk(template_file_path_name) == render_compiled(template_file_path_name)
+
+    for name, render in (('read and expand', render_from_disk), ('compiled', render_compiled)):
+        start_time = time.perf_counter()
+        for i in range(arguments.count):
+            render(template_file_path_names[i % len(template_file_path_names)])
+        elapsed_time = time.perf_counter() - start_time
+
+        print(f"{name:>16}: {arguments.count} renders in {elapsed_time:.3f}s "
+              f"({arguments.count / elapsed_time:,.0f} renders/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+Benchmark the calculation of the distances between the homes of the
+families.
+
+The benchmark compares the calculation of the matrix of the distances
+between random homes around a school with a pure Python loop, with the
+vectorized calculation of this matrix.  It then finds the nearest other
+home of each home of a large season, block by block, without building
+the whole matrix in memory.
+
+Usage:
+
+    python benchmark/benchmark_geomath.py [--count 1000] [--large-count 20000]
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from intek.application.geomath import EARTH_RADIUS
+from intek.application.geomath import calculate_distance_matrix
+from intek.application.geomath import iterate_distance_matrix
+
+
+# Default number of homes of the distance matrix calculated with both
+# methods.
+DEFAULT_HOME_COUNT = 1000
+
+# Default number of homes of the large season.
+DEFAULT_LARGE_HOME_COUNT = 20000
+
+# Geographical coordinates of the school.
+SCHOOL_LOCATION = (10.7626, 106.6822)
+
+
+def build_homes(count, random_state):
+    latitudes = SCHOOL_LOCATION[0] + random_state.normal(0, 0.045, count)
+    longitudes = SCHOOL_LOCATION[1] + random_state.normal(0, 0.045, count)
+    return latitudes, longitudes
+
+
+def calculate_distance_matrix_with_loop(latitudes, longitudes):
+    matrix = []
+
+    for latitude1, longitude1 in zip(latitudes, longitudes):
+        row = []
+        for latitude2, longitude2 in zip(latitudes, longitudes):
+            phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+            a = math.sin((phi2 - phi1) / 2) ** 2 \
+                + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(longitude2 - longitude1) / 2) ** 2
+            row.append(2 * EARTH_RADIUS * math.asin(math.sqrt(min(1.0, a))))
+        matrix.append(row)
+
+    return matrix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the calculation of the distances between homes")
+    parser.add_argument('--count', type=int, default=DEFAULT_HOME_COUNT,
+                        help="number of homes of the distance matrix calculated with both methods")
+    parser.add_argument('--large-count', type=int, default=DEFAULT_LARGE_HOME_COUNT,
+                        help="number of homes of the large season")
+    arguments = parser.parse_args()
+
+    random_state = np.random.RandomState(0)
+    latitudes, longitudes = build_homes(arguments.count, random_state)
+
+    start_time = time.perf_counter()
+    expected_matrix = calculate_distance_matrix_with_loop(latitudes.tolist(), longitudes.tolist())
+    loop_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    matrix = calculate_distance_matrix(latitudes, longitudes)
+    vectorized_time = time.perf_counter() - start_time
+
+    error = np.abs(matrix - np.array(expected_matrix)).max()
+    print(f"{arguments.count}x{arguments.count} distance matrix: "
+          f"pure Python loop {loop_time:.3f}s, vectorized {vectorized_time:.3f}s "
+          f"({loop_time / vectorized_time:,.0f}x faster, max difference {error:.1e} m)")
+
+    # Find the nearest other home of each home of a large season.  The whole
+    # matrix would take 8 bytes per pair of homes.
+    latitudes, longitudes = build_homes(arguments.large_count, random_state)
+
+    start_time = time.perf_counter()
+    nearest_distances = np.empty(arguments.large_count)
+    for start, block in iterate_distance_matrix(latitudes, longitudes, latitudes, longitudes):
+        block[np.arange(len(block)), np.arange(start, start + len(block))] = np.inf
+        nearest_distances[start:start + len(block)] = block.min(axis=1)
+    elapsed_time = time.perf_counter() - start_time
+
+    print(f"{arguments.large_count}x{arguments.large_count} distance matrix "
+          f"({arguments.large_count ** 2 * 8 / 1024 ** 3:.1f} GB if built at once) reduced by blocks "
+          f"in {elapsed_time:.3f}s; median distance to the nearest home {np.median(nearest_distances):.0f} m")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+/**
+ * Copyright (C) 2020 Majormode.  All rights reserved.
+ *
+ * This software is the confidential and proprietary information of
+ * Majormode or one of its subsidiaries.  You shall not disclose this
+ * confidential information and shall use it only in accordance with the
+ * terms of the license agreement or other applicable agreement you
+ * entered into with Majormode.
+ *
+ * MAJORMODE MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY
+ * OF THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+ * TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ * PURPOSE, OR NON-INFRINGEMENT.  MAJORMODE SHALL NOT BE LIABLE FOR ANY
+ * LOSSES OR DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING
+ * OR DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+ */
+
+-- Benchmark the export of the children registered by the families with
+-- the function `gf_export_upmd_database`, against its former version that
+-- looked up each field of the parents with a correlated subquery, and
+-- the accounts of the parents with unindexed searches of their e-mail
+-- address.
+--
+-- The script imports synthetic applications with the function
+-- `gf_main_bulk`, exports them with each version, prints the duration of
+-- each export and a digest of the rows exported, which must be the same,
+-- and rolls back all the changes:
+--
+--     psql -v row_count=10000 -f db/benchmark_gf_export_upmd_database.sql
+
+\if :{?row_count}
+\else
+  \set row_count 10000
+\endif
+
+\set school_id '836dff6a-bd7b-11e7-b6f1-0008a20c190f'
+
+BEGIN;
+
+/**
+ * Former version of the function `gf_export_upmd_database`.
+ */
+CREATE FUNCTION pg_temp.gf_export_upmd_database_legacy()
+  RETURNS TABLE (
+    registration_id text,
+    child_account_id uuid,
+    child_qrcode text,
+    child_first_name text,
+    child_last_name text,
+    child_full_name text,
+    child_dob date,
+    child_grade_level smallint,
+    grade_short_name text,
+    class_name text,
+    parent1_account_id uuid,
+    parent1_first_name text,
+    parent1_last_name text,
+    parent1_full_name text,
+    parent1_locale text,
+    parent1_email_address text,
+    parent1_phone_number text,
+    parent1_address text,
+    parent2_account_id uuid,
+    parent2_first_name text,
+    parent2_last_name text,
+    parent2_full_name text,
+    parent2_locale text,
+    parent2_email_address text,
+    parent2_phone_number text,
+    parent2_address text
+  )
+  VOLATILE
+  LANGUAGE SQL
+AS $$
+  SELECT
+      registration_id,
+      child.account_id,
+      CONCAT('student.', child.account_id::text) AS qrcode,
+      child.first_name,
+      child.last_name,
+      child.full_name,
+      child.dob,
+      child.grade_level,
+      (SELECT grade_short_name FROM education_grade WHERE country_code = 'FR' AND education_grade.grade_level = child.grade_level) AS grade_short_name,
+      (SELECT grade_short_name FROM education_grade WHERE country_code = 'FR' AND education_grade.grade_level = child.grade_level) || ' ' || COALESCE(school_class.class_name, '') AS class_name,
+      parent1_account_id,
+      (SELECT first_name FROM account WHERE account_id = parent1_account_id) AS parent1_first_name,
+      (SELECT last_name FROM account WHERE account_id = parent1_account_id) AS parent1_last_name,
+      (SELECT full_name FROM account WHERE account_id = parent1_account_id) AS parent1_full_name,
+      (SELECT locale FROM account WHERE account_id = parent1_account_id) AS parent1_locale,
+      parent1_email_address,
+      (SELECT value FROM account_contact WHERE account_id = parent1_account_id and name = 'PHONE' AND is_primary = true) AS parent1_phone_number,
+      (SELECT property_value FROM place INNER JOIN place_address USING (place_id) WHERE place.account_id = parent1_account_id AND category = 'home' AND property_name = 'formatted_address' LIMIT 1) AS parent1_address,
+      parent2_account_id,
+      (SELECT first_name FROM account WHERE account_id = parent2_account_id) AS parent2_first_name,
+      (SELECT last_name FROM account WHERE account_id = parent2_account_id) AS parent2_last_name,
+      (SELECT full_name FROM account WHERE account_id = parent2_account_id) AS parent2_full_name,
+      (SELECT locale FROM account WHERE account_id = parent2_account_id) AS parent2_locale,
+      parent2_email_address,
+      (SELECT value FROM account_contact WHERE account_id = parent2_account_id and name = 'PHONE' AND is_primary = true) AS parent2_phone_number,
+      (SELECT property_value FROM place INNER JOIN place_address USING (place_id) WHERE place.account_id = parent2_account_id AND category = 'home' AND property_name = 'formatted_address' LIMIT 1) AS parent2_address
+    FROM (
+      SELECT
+          registration_id,
+          (SELECT account_id FROM account_contact WHERE value = parent1_email_address) AS parent1_account_id,
+          parent1_email_address,
+          (SELECT account_id FROM account_contact WHERE value = parent2_email_address) AS parent2_account_id,
+          parent2_email_address
+      FROM (
+          SELECT
+              registration_id,
+              parent1_email_address,
+              CASE
+              WHEN parent2_email_address = parent1_email_address THEN
+                  NULL
+              ELSE
+                  parent2_email_address
+              END AS parent2_email_address
+          FROM
+              gf_registration
+          WHERE
+              registration_id IS NOT NULL
+      ) AS foo
+    ) AS foo
+    INNER JOIN account AS parent1_account
+      ON parent1_account.account_id = parent1_account_id
+    INNER JOIN guardian_child
+      ON guardian_account_id = parent1_account_id
+    INNER JOIN child
+      ON child.account_id = guardian_child.child_account_id
+    LEFT JOIN school_class
+      ON school_class.class_id = child.class_id
+    WHERE
+      parent1_account.object_status = 'enabled'
+$$;
+
+/**
+ * Return the duration of an export and a digest of its rows.
+ *
+ *
+ * @param p_function_name: Name of the function that exports the rows.
+ */
+CREATE FUNCTION pg_temp.gf_benchmark_export(
+    IN p_function_name text)
+  RETURNS text
+  VOLATILE
+  LANGUAGE PLPGSQL
+AS $$
+DECLARE
+  v_start_time timestamptz = clock_timestamp();
+  v_row_count bigint;
+  v_digest text;
+BEGIN
+  EXECUTE format(
+      'SELECT count(*), md5(string_agg(foo::text, E''\n'' ORDER BY foo::text)) FROM %s() AS foo',
+      p_function_name)
+    INTO v_row_count, v_digest;
+
+  RETURN format('%s rows in %s, digest %s', v_row_count, clock_timestamp() - v_start_time, v_digest);
+END;
+$$;
+
+-- Stage families of one to three children.  The first record of a family
+-- declares the parents; every third family has a second parent, who
+-- lives at the same home every other time.
+DELETE FROM gf_registration;
+
+INSERT INTO gf_registration (
+    registration_id,
+    registration_time,
+    child_first_name,
+    child_last_name,
+    child_full_name,
+    child_dob,
+    grade_level,
+    parent1_first_name,
+    parent1_last_name,
+    parent1_full_name,
+    parent1_locale,
+    parent1_email_address,
+    parent1_phone_number,
+    parent1_home_formatted_address,
+    parent1_home_geocoded_address,
+    parent1_home_location,
+    parent2_first_name,
+    parent2_last_name,
+    parent2_full_name,
+    parent2_locale,
+    parent2_email_address,
+    parent2_phone_number,
+    parent2_home_formatted_address,
+    parent2_home_geocoded_address,
+    parent2_home_location,
+    is_enabled,
+    line_number)
+  SELECT
+      CASE WHEN child_rank = 1 THEN 'BENCHMARK-' || family_number END,
+      CASE WHEN child_rank = 1 THEN current_timestamp END,
+      'Child' || child_rank,
+      'BENCHMARK' || family_number,
+      'Child' || child_rank || ' BENCHMARK' || family_number,
+      '2010-01-01'::date + (family_number % 2000)::int + child_rank * 400,
+      ((family_number + child_rank) % 12)::smallint,
+      CASE WHEN child_rank = 1 THEN 'Parent' END,
+      CASE WHEN child_rank = 1 THEN 'BENCHMARK' || family_number END,
+      CASE WHEN child_rank = 1 THEN 'Parent BENCHMARK' || family_number END,
+      CASE WHEN child_rank = 1 THEN 'eng' END,
+      CASE WHEN child_rank = 1 THEN 'benchmark.parent' || family_number || '@example.org' END,
+      CASE WHEN child_rank = 1 THEN '+849' || lpad(family_number::text, 8, '0') END,
+      CASE WHEN child_rank = 1 THEN family_number || ' Nguyen Hue, District 1' END,
+      CASE WHEN child_rank = 1 THEN family_number || ' Nguyễn Huệ, Quận 1' END,
+      CASE WHEN child_rank = 1 THEN
+        '(' || (10.7 + (family_number % 997) / 10000.0) || ', ' || (106.6 + (family_number % 991) / 10000.0) || ')'
+      END,
+      CASE WHEN child_rank = 1 AND family_number % 3 = 0 THEN 'Partner' END,
+      CASE WHEN child_rank = 1 AND family_number % 3 = 0 THEN 'BENCHMARK' || family_number END,
+      CASE WHEN child_rank = 1 AND family_number % 3 = 0 THEN 'Partner BENCHMARK' || family_number END,
+      CASE WHEN child_rank = 1 AND family_number % 3 = 0 THEN 'vie' END,
+      CASE WHEN child_rank = 1 AND family_number % 3 = 0 THEN 'benchmark.partner' || family_number || '@example.org' END,
+      NULL,
+      CASE WHEN child_rank = 1 AND family_number % 6 = 3 THEN family_number || ' Le Loi, District 3' END,
+      NULL,
+      CASE WHEN child_rank = 1 AND family_number % 6 = 3 THEN
+        '(' || (10.8 + (family_number % 997) / 10000.0) || ', ' || (106.7 + (family_number % 991) / 10000.0) || ')'
+      END,
+      true,
+      line_number
+    FROM (
+      SELECT
+          family_number,
+          child_rank,
+          row_number() OVER (ORDER BY family_number, child_rank) AS line_number
+        FROM
+          generate_series(1, :row_count) AS family_number
+        CROSS JOIN LATERAL
+          generate_series(1, 1 + family_number % 3) AS child_rank
+    ) AS foo
+    WHERE
+      line_number <= :row_count;
+
+SELECT gf_main_bulk(:'school_id') AS record_count;
+SELECT gf_set_parents_password();
+
+ANALYZE account;
+ANALYZE account_contact;
+ANALYZE child;
+ANALYZE guardian_child;
+ANALYZE place;
+ANALYZE place_address;
+
+SELECT pg_temp.gf_benchmark_export('pg_temp.gf_export_upmd_database_legacy') AS legacy_export;
+SELECT pg_temp.gf_benchmark_export('gf_export_upmd_database') AS export;
+
+ROLLBACK;
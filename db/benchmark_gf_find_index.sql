@@ -0,0 +1,269 @@
+/**
+ * Copyright (C) 2020 Majormode.  All rights reserved.
+ *
+ * This software is the confidential and proprietary information of
+ * Majormode or one of its subsidiaries.  You shall not disclose this
+ * confidential information and shall use it only in accordance with the
+ * terms of the license agreement or other applicable agreement you
+ * entered into with Majormode.
+ *
+ * MAJORMODE MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY
+ * OF THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+ * TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ * PURPOSE, OR NON-INFRINGEMENT.  MAJORMODE SHALL NOT BE LIABLE FOR ANY
+ * LOSSES OR DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING
+ * OR DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+ */
+
+-- Check that the lookups of the functions `gf_find_child`,
+-- `gf_find_home`, and `gf_find_parent` are served by the indexes of
+-- `db/create_gf_index.sql`, and measure the duration of these lookups.
+--
+-- The script imports synthetic applications with the function
+-- `gf_main_bulk`, which creates about 150,000 accounts of parents and
+-- children for the default 100,000 records.  It prints the execution
+-- plan of each lookup, raises an exception if a lookup doesn't scan the
+-- expected index, prints the average duration of each function, and
+-- rolls back all the changes:
+--
+--     psql -v row_count=100000 -f db/benchmark_gf_find_index.sql
+
+\set ON_ERROR_STOP on
+
+\if :{?row_count}
+\else
+  \set row_count 100000
+\endif
+
+\set school_id '836dff6a-bd7b-11e7-b6f1-0008a20c190f'
+
+BEGIN;
+
+/**
+ * Print the execution plan of a lookup and check that this lookup scans
+ * one of the expected indexes.
+ *
+ *
+ * @param p_lookup_name: Name of the lookup, printed with its plan.
+ *
+ * @param p_index_names: Names of the indexes the lookup is expected to
+ *     scan, any of them.
+ *
+ * @param p_query: Query of the lookup.
+ */
+CREATE FUNCTION pg_temp.gf_benchmark_check_plan(
+    IN p_lookup_name text,
+    IN p_index_names text[],
+    IN p_query text)
+  RETURNS void
+  VOLATILE
+  LANGUAGE PLPGSQL
+AS $$
+DECLARE
+  v_line text;
+  v_plan text = '';
+  v_index_name text;
+BEGIN
+  FOR v_line IN EXECUTE 'EXPLAIN (ANALYZE, BUFFERS) ' || p_query LOOP
+    v_plan = v_plan || E'\n' || v_line;
+  END LOOP;
+
+  RAISE NOTICE '%:%', p_lookup_name, v_plan;
+
+  FOREACH v_index_name IN ARRAY p_index_names LOOP
+    IF v_plan ~ ('Index (Only )?Scan using ' || v_index_name || ' |Bitmap Index Scan on ' || v_index_name || '\M') THEN
+      RETURN;
+    END IF;
+  END LOOP;
+
+  RAISE EXCEPTION '% does not scan any of the indexes %', p_lookup_name, p_index_names;
+END;
+$$;
+
+-- Stage families of one to three children, with one parent each, and
+-- import them.
+DELETE FROM gf_registration;
+
+INSERT INTO gf_registration (
+    registration_id,
+    registration_time,
+    child_first_name,
+    child_last_name,
+    child_full_name,
+    child_dob,
+    grade_level,
+    parent1_first_name,
+    parent1_last_name,
+    parent1_full_name,
+    parent1_locale,
+    parent1_email_address,
+    parent1_phone_number,
+    parent1_home_formatted_address,
+    parent1_home_geocoded_address,
+    parent1_home_location,
+    is_enabled,
+    line_number)
+  SELECT
+      CASE WHEN child_rank = 1 THEN 'BENCHMARK-' || family_number END,
+      CASE WHEN child_rank = 1 THEN current_timestamp END,
+      'Child' || child_rank,
+      'BENCHMARK' || family_number,
+      'Child' || child_rank || ' BENCHMARK' || family_number,
+      '2010-01-01'::date + (family_number % 2000)::int + child_rank * 400,
+      ((family_number + child_rank) % 12)::smallint,
+      CASE WHEN child_rank = 1 THEN 'Parent' END,
+      CASE WHEN child_rank = 1 THEN 'BENCHMARK' || family_number END,
+      CASE WHEN child_rank = 1 THEN 'Parent BENCHMARK' || family_number END,
+      CASE WHEN child_rank = 1 THEN 'eng' END,
+      CASE WHEN child_rank = 1 THEN 'benchmark.parent' || family_number || '@example.org' END,
+      CASE WHEN child_rank = 1 THEN '+849' || lpad(family_number::text, 8, '0') END,
+      CASE WHEN child_rank = 1 THEN family_number || ' Nguyen Hue, District 1' END,
+      CASE WHEN child_rank = 1 THEN family_number || ' Nguyễn Huệ, Quận 1' END,
+      CASE WHEN child_rank = 1 THEN
+        '(' || (10.7 + (family_number % 997) / 10000.0) || ', ' || (106.6 + (family_number % 991) / 10000.0) || ')'
+      END,
+      true,
+      line_number
+    FROM (
+      SELECT
+          family_number,
+          child_rank,
+          row_number() OVER (ORDER BY family_number, child_rank) AS line_number
+        FROM
+          generate_series(1, :row_count) AS family_number
+        CROSS JOIN LATERAL
+          generate_series(1, 1 + family_number % 3) AS child_rank
+    ) AS foo
+    WHERE
+      line_number <= :row_count;
+
+SELECT gf_main_bulk(:'school_id') AS record_count;
+
+ANALYZE account;
+ANALYZE account_contact;
+ANALYZE child;
+ANALYZE place;
+
+-- Pick a family in the middle of the synthetic applications, with the
+-- name of its parent in a different case than the one registered.
+SELECT
+    upper(gf_registration.parent1_full_name) AS parent_full_name,
+    upper(gf_registration.parent1_email_address) AS parent_email_address,
+    gf_registration.child_full_name,
+    gf_registration.child_dob,
+    place.account_id AS parent_account_id,
+    ST_AsEWKT(place.location) AS home_location
+  FROM
+    gf_registration
+  INNER JOIN account
+    ON account.full_name = gf_registration.parent1_full_name
+  INNER JOIN place
+    ON place.account_id = account.account_id
+  WHERE
+    gf_registration.parent1_full_name IS NOT NULL
+  ORDER BY
+    abs(gf_registration.line_number - :row_count / 2)
+  LIMIT 1
+\gset
+
+SELECT pg_temp.gf_benchmark_check_plan(
+  'gf_find_parent',
+  ARRAY['idx_account_contact_name_lower_value', 'idx_account_lower_full_name'],
+  format(
+    $query$
+      SELECT
+          account_id
+        FROM
+          account_contact
+        INNER JOIN account
+          USING (account_id)
+        WHERE
+          lower(account.full_name) = lower(%L)
+          AND account_contact.name = 'EMAIL'
+          AND lower(account_contact.value) = lower(%L)
+    $query$,
+    :'parent_full_name',
+    :'parent_email_address'));
+
+SELECT pg_temp.gf_benchmark_check_plan(
+  'gf_find_child',
+  ARRAY['idx_child_ghost_full_name_dob'],
+  format(
+    $query$
+      SELECT
+          account_id
+        FROM
+          child
+        WHERE
+          account_type = 'ghost'
+          AND full_name = %L
+          AND dob = %L::date
+    $query$,
+    :'child_full_name',
+    :'child_dob'));
+
+SELECT pg_temp.gf_benchmark_check_plan(
+  'gf_find_home',
+  ARRAY['idx_place_account_id_location'],
+  format(
+    $query$
+      SELECT
+          place_id
+        FROM
+          place
+        WHERE
+          account_id = %L::uuid
+          AND location = %L::geometry
+    $query$,
+    :'parent_account_id',
+    :'home_location'));
+
+-- Measure the average duration of the lookup functions over the first
+-- thousand families.
+DO $$
+DECLARE
+  v_record record;
+  v_lookup_count integer = 0;
+  v_start_time timestamptz;
+  v_parent_duration interval = '0';
+  v_child_duration interval = '0';
+  v_home_duration interval = '0';
+  v_parent_account_id uuid;
+BEGIN
+  FOR v_record IN
+    SELECT
+        parent1_full_name,
+        parent1_email_address,
+        gf_parse_location_string(parent1_home_location) AS parent1_home_location,
+        child_full_name,
+        child_dob
+      FROM
+        gf_registration
+      WHERE
+        parent1_full_name IS NOT NULL
+      ORDER BY
+        line_number
+      LIMIT 1000
+  LOOP
+    v_start_time = clock_timestamp();
+    v_parent_account_id = gf_find_parent(v_record.parent1_full_name, 'EMAIL', v_record.parent1_email_address);
+    v_parent_duration = v_parent_duration + (clock_timestamp() - v_start_time);
+
+    v_start_time = clock_timestamp();
+    PERFORM gf_find_child(v_record.child_full_name, v_record.child_dob);
+    v_child_duration = v_child_duration + (clock_timestamp() - v_start_time);
+
+    v_start_time = clock_timestamp();
+    PERFORM gf_find_home(v_parent_account_id, v_record.parent1_home_location);
+    v_home_duration = v_home_duration + (clock_timestamp() - v_start_time);
+
+    v_lookup_count = v_lookup_count + 1;
+  END LOOP;
+
+  RAISE NOTICE 'gf_find_parent: % per lookup', v_parent_duration / v_lookup_count;
+  RAISE NOTICE 'gf_find_child: % per lookup', v_child_duration / v_lookup_count;
+  RAISE NOTICE 'gf_find_home: % per lookup', v_home_duration / v_lookup_count;
+END;
+$$;
+
+ROLLBACK;
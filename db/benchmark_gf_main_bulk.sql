@@ -0,0 +1,207 @@
+/**
+ * Copyright (C) 2020 Majormode.  All rights reserved.
+ *
+ * This software is the confidential and proprietary information of
+ * Majormode or one of its subsidiaries.  You shall not disclose this
+ * confidential information and shall use it only in accordance with the
+ * terms of the license agreement or other applicable agreement you
+ * entered into with Majormode.
+ *
+ * MAJORMODE MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY
+ * OF THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+ * TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ * PURPOSE, OR NON-INFRINGEMENT.  MAJORMODE SHALL NOT BE LIABLE FOR ANY
+ * LOSSES OR DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING
+ * OR DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+ */
+
+-- Benchmark the import of the family applications with the function
+-- `gf_main`, which processes the records one by one, and with the
+-- function `gf_main_bulk`, which processes them all at once.
+--
+-- The script stages synthetic applications in the table
+-- `gf_registration`, imports them with each function, prints the
+-- duration of each import and a digest of the children, parents, homes,
+-- and links produced, which must be the same, and rolls back all the
+-- changes:
+--
+--     psql -v row_count=10000 -f db/benchmark_gf_main_bulk.sql
+--     psql -v row_count=100000 -f db/benchmark_gf_main_bulk.sql
+--
+-- The function `gf_main` counts the records with a `smallint`, and it
+-- is skipped beyond 32,767 records.
+
+\if :{?row_count}
+\else
+  \set row_count 10000
+\endif
+
+\set school_id '836dff6a-bd7b-11e7-b6f1-0008a20c190f'
+
+BEGIN;
+
+SELECT set_config('gf.benchmark_row_count', :'row_count', true);
+SELECT set_config('gf.benchmark_school_id', :'school_id', true);
+
+/**
+ * Return a digest of the children, parents, homes, and links between
+ * parents and children created from the synthetic applications.
+ */
+CREATE FUNCTION pg_temp.gf_benchmark_digest()
+  RETURNS text
+  STABLE
+  LANGUAGE SQL
+AS $$
+  SELECT
+      count(*) || ' links, digest ' || md5(string_agg(line, E'\n' ORDER BY line))
+    FROM (
+      SELECT
+          concat_ws(
+            '|',
+            child.full_name,
+            child.dob,
+            child.grade_level,
+            child.get_off_school_bus_unaccompanied,
+            account.full_name,
+            account.locale,
+            (SELECT string_agg(name || ':' || value, ',' ORDER BY name, value)
+               FROM account_contact
+               WHERE account_contact.account_id = account.account_id),
+            guardian_child.role,
+            ST_AsText(place.location),
+            (SELECT string_agg(property_name || ':' || property_value, ',' ORDER BY property_name)
+               FROM place_address
+               WHERE place_address.place_id = place.place_id)) AS line
+        FROM
+          guardian_child
+        INNER JOIN child
+          ON child.account_id = guardian_child.child_account_id
+        INNER JOIN account
+          ON account.account_id = guardian_child.guardian_account_id
+        LEFT JOIN place
+          ON place.place_id = guardian_child.home_id
+        WHERE
+          child.full_name LIKE '% BENCHMARK%'
+    ) AS foo;
+$$;
+
+-- Stage families of one to three children.  The first record of a family
+-- declares the parents; every third family has a second parent, who
+-- lives at the same home every other time.
+DELETE FROM gf_registration;
+
+INSERT INTO gf_registration (
+    registration_id,
+    registration_time,
+    child_first_name,
+    child_last_name,
+    child_full_name,
+    child_dob,
+    grade_level,
+    parent1_first_name,
+    parent1_last_name,
+    parent1_full_name,
+    parent1_locale,
+    parent1_email_address,
+    parent1_phone_number,
+    parent1_home_formatted_address,
+    parent1_home_geocoded_address,
+    parent1_home_location,
+    parent2_first_name,
+    parent2_last_name,
+    parent2_full_name,
+    parent2_locale,
+    parent2_email_address,
+    parent2_phone_number,
+    parent2_home_formatted_address,
+    parent2_home_geocoded_address,
+    parent2_home_location,
+    is_enabled,
+    line_number)
+  SELECT
+      CASE WHEN child_rank = 1 THEN 'BENCHMARK-' || family_number END,
+      CASE WHEN child_rank = 1 THEN current_timestamp END,
+      'Child' || child_rank,
+      'BENCHMARK' || family_number,
+      'Child' || child_rank || ' BENCHMARK' || family_number,
+      '2010-01-01'::date + (family_number % 2000)::int + child_rank * 400,
+      ((family_number + child_rank) % 12)::smallint,
+      CASE WHEN child_rank = 1 THEN 'Parent' END,
+      CASE WHEN child_rank = 1 THEN 'BENCHMARK' || family_number END,
+      CASE WHEN child_rank = 1 THEN 'Parent BENCHMARK' || family_number END,
+      CASE WHEN child_rank = 1 THEN 'eng' END,
+      CASE WHEN child_rank = 1 THEN 'benchmark.parent' || family_number || '@example.org' END,
+      CASE WHEN child_rank = 1 THEN '+849' || lpad(family_number::text, 8, '0') END,
+      CASE WHEN child_rank = 1 THEN family_number || ' Nguyen Hue, District 1' END,
+      CASE WHEN child_rank = 1 THEN family_number || ' Nguyễn Huệ, Quận 1' END,
+      CASE WHEN child_rank = 1 THEN
+        '(' || (10.7 + (family_number % 997) / 10000.0) || ', ' || (106.6 + (family_number % 991) / 10000.0) || ')'
+      END,
+      CASE WHEN child_rank = 1 AND family_number % 3 = 0 THEN 'Partner' END,
+      CASE WHEN child_rank = 1 AND family_number % 3 = 0 THEN 'BENCHMARK' || family_number END,
+      CASE WHEN child_rank = 1 AND family_number % 3 = 0 THEN 'Partner BENCHMARK' || family_number END,
+      CASE WHEN child_rank = 1 AND family_number % 3 = 0 THEN 'vie' END,
+      CASE WHEN child_rank = 1 AND family_number % 3 = 0 THEN 'benchmark.partner' || family_number || '@example.org' END,
+      NULL,
+      CASE WHEN child_rank = 1 AND family_number % 6 = 3 THEN family_number || ' Le Loi, District 3' END,
+      NULL,
+      CASE WHEN child_rank = 1 AND family_number % 6 = 3 THEN
+        '(' || (10.8 + (family_number % 997) / 10000.0) || ', ' || (106.7 + (family_number % 991) / 10000.0) || ')'
+      END,
+      true,
+      line_number
+    FROM (
+      SELECT
+          family_number,
+          child_rank,
+          row_number() OVER (ORDER BY family_number, child_rank) AS line_number
+        FROM
+          generate_series(1, :row_count) AS family_number
+        CROSS JOIN LATERAL
+          generate_series(1, 1 + family_number % 3) AS child_rank
+    ) AS foo
+    WHERE
+      line_number <= :row_count;
+
+SAVEPOINT before_import;
+
+DO $$
+DECLARE
+  v_row_count integer = current_setting('gf.benchmark_row_count')::integer;
+  v_school_id uuid = current_setting('gf.benchmark_school_id')::uuid;
+  v_start_time timestamptz;
+  v_duration interval;
+BEGIN
+  IF v_row_count > 32767 THEN
+    RAISE NOTICE 'gf_main: skipped (more than 32,767 records)';
+  ELSE
+    -- Silence the notice that the function raises for each record.
+    PERFORM set_config('client_min_messages', 'warning', true);
+    v_start_time = clock_timestamp();
+    PERFORM gf_main(v_school_id);
+    v_duration = clock_timestamp() - v_start_time;
+    PERFORM set_config('client_min_messages', 'notice', true);
+
+    RAISE NOTICE 'gf_main: % records in % (%)', v_row_count, v_duration, pg_temp.gf_benchmark_digest();
+  END IF;
+END;
+$$;
+
+ROLLBACK TO SAVEPOINT before_import;
+
+DO $$
+DECLARE
+  v_row_count integer = current_setting('gf.benchmark_row_count')::integer;
+  v_school_id uuid = current_setting('gf.benchmark_school_id')::uuid;
+  v_start_time timestamptz;
+  v_duration interval;
+BEGIN
+  v_start_time = clock_timestamp();
+  PERFORM gf_main_bulk(v_school_id);
+  v_duration = clock_timestamp() - v_start_time;
+
+  RAISE NOTICE 'gf_main_bulk: % records in % (%)', v_row_count, v_duration, pg_temp.gf_benchmark_digest();
+END;
+$$;
+
+ROLLBACK;
@@ -19,7 +19,15 @@
 
 DELETE FROM gf_registration;
 \copy gf_registration FROM './tmp/registrations.csv' DELIMITER ',' CSV;
+-- The function `gf_main_bulk` is to replace the function `gf_main`
+-- only once `db/benchmark_gf_main_bulk.sql` has shown that both produce
+-- identical digests on the data of the school.  The same goes for the
+-- function `gf_main_incremental`, which relies on `gf_main_bulk`, and
+-- which replaces both `gf_main` and `gf_set_parents_password`:
+--
+--     SELECT gf_main_incremental('836dff6a-bd7b-11e7-b6f1-0008a20c190f');
 SELECT gf_main('836dff6a-bd7b-11e7-b6f1-0008a20c190f');
 UPDATE child SET grade_level = 1 WHERE grade_level IS NULL;
 SELECT gf_set_parents_password();
-\copy (SELECT * FROM gf_export_upmd_database()) TO ./tmp/upmd_database_YYYYMMDD.csv WITH HEADER CSV;
+REFRESH MATERIALIZED VIEW gf_upmd_export;
+\copy (SELECT * FROM gf_upmd_export) TO ./tmp/upmd_database_YYYYMMDD.csv WITH HEADER CSV;
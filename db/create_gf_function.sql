@@ -138,7 +138,7 @@ CREATE OR REPLACE FUNCTION gf_find_child(
     IN p_full_name text,
     IN p_dob date)
   RETURNS uuid
-  IMMUTABLE
+  STABLE
   LANGUAGE SQL
 AS $$
   SELECT
@@ -168,7 +168,7 @@ CREATE OR REPLACE FUNCTION gf_find_home(
     IN p_account_id uuid,
     IN p_location geometry)
   RETURNS uuid
-  IMMUTABLE
+  STABLE
   LANGUAGE SQL
 AS $$
   SELECT
@@ -220,7 +220,7 @@ CREATE OR REPLACE FUNCTION gf_find_parent(
     IN p_property_name text,
     IN p_property_value text)
   RETURNS uuid
-  IMMUTABLE
+  STABLE
   LANGUAGE SQL
 AS $$
   SELECT
@@ -810,14 +810,688 @@ END;
 $$;
 
 
+-- The function `gen_random_uuid()` is built in PostgreSQL only from
+-- version 13; it is provided by the extension `pgcrypto` on the former
+-- versions.
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+
+-- Remove the former signature of the function, which would make the
+-- calls with default arguments ambiguous.
+DROP FUNCTION IF EXISTS gf_main_bulk(uuid, smallint);
+
+/**
+ * Process family applications to school bus transportation service, all
+ * at once.
+ *
+ * The function produces the same children, parents, homes, and links
+ * between parents and children than the function `gf_main`, but it
+ * processes all the records of the table `gf_registration` with a few
+ * set-based statements, instead of looking up and inserting the records
+ * one by one:
+ *
+ * 1. The records are grouped by family with window functions: a record
+ *    with a registration ID starts a new family, and the following
+ *    records of this family refer to the last record of this family that
+ *    declares the first parent, respectively the second parent.
+ *
+ * 2. The children, the parents, and their homes are deduplicated, then
+ *    matched with the accounts and places already registered, with a
+ *    single join each.  The identification of the accounts and places to
+ *    create is generated upfront with `gen_random_uuid()` (PostgreSQL 13,
+ *    or the extension `pgcrypto`), so that the records inserted don't
+ *    need to be matched back with the records staged.
+ *
+ * 3. The accounts, contact information, places, addresses, and links are
+ *    inserted with one statement per table.  A contact information
+ *    already used by another account is skipped (`ON CONFLICT DO
+ *    NOTHING`), as the function `gf_register_parent` does.
+ *
+ * The function processes either all the records, or only the records of
+ * some families, identified by the registration ID of their first record
+ * (cf. function `gf_main_incremental`).
+ *
+ * The staging tables are temporary, and dropped at the end of the
+ * transaction.
+ *
+ * Note: when the e-mail address of a new parent is already used by
+ * another parent with a different name, the function `gf_main` creates a
+ * new account, without e-mail address, each time this parent is found in
+ * the records, while this function creates a single account.
+ *
+ *
+ * @param p_school_id: identification of the school the children attend.
+ *
+ * @param p_minimal_age_for_getting_off_school_bus_unaccompanied: Minimal
+ *     age of a child to be allowed to get off a school bus without the
+ *     presence of a guardian of him (cf. function `gf_register_child`).
+ *
+ * @param p_registration_ids: Registration IDs of the families to process,
+ *     or `NULL` to process all the records.
+ *
+ *
+ * @return: The number of records processed.
+ */
+CREATE OR REPLACE FUNCTION gf_main_bulk(
+    IN p_school_id uuid,
+    IN p_minimal_age_for_getting_off_school_bus_unaccompanied smallint = 12,
+    IN p_registration_ids text[] = NULL)
+  RETURNS integer
+  VOLATILE
+  LANGUAGE PLPGSQL
+AS $$
+DECLARE
+  v_record_count integer;
+  v_school_year_start_date date = (date_part('year', CURRENT_DATE) || '-09-04')::date;
+BEGIN
+  DROP TABLE IF EXISTS
+    gf_bulk_registration,
+    gf_bulk_record,
+    gf_bulk_child,
+    gf_bulk_parent_occurrence,
+    gf_bulk_parent,
+    gf_bulk_home;
+
+  -- Group the records by family, and select the records of the families
+  -- to process.
+  CREATE TEMPORARY TABLE gf_bulk_registration ON COMMIT DROP AS
+    SELECT
+        *
+      FROM (
+        SELECT
+            *,
+            first_value(registration_id)
+              OVER (PARTITION BY family_number ORDER BY line_number) AS family_registration_id
+          FROM (
+            SELECT
+                *,
+                count(registration_id) OVER (ORDER BY line_number) AS family_number
+              FROM
+                gf_registration
+          ) AS foo
+      ) AS foo
+      WHERE
+        p_registration_ids IS NULL
+        OR family_registration_id = ANY(p_registration_ids);
+
+  -- Determine the record that declares the first parent, and the second
+  -- parent, of the child of each record.
+  CREATE TEMPORARY TABLE gf_bulk_record ON COMMIT DROP AS
+    SELECT
+        line_number,
+        child_first_name,
+        child_last_name,
+        child_full_name,
+        child_dob,
+        grade_level,
+        max(CASE WHEN parent1_full_name IS NOT NULL THEN line_number END)
+          OVER (PARTITION BY family_number ORDER BY line_number) AS parent1_line_number,
+        max(CASE WHEN parent2_full_name IS NOT NULL THEN line_number END)
+          OVER (PARTITION BY family_number ORDER BY line_number) AS parent2_line_number
+      FROM
+        gf_bulk_registration;
+
+  GET DIAGNOSTICS v_record_count = ROW_COUNT;
+
+  -- Match the children with the children already registered, keeping the
+  -- information of the first record of a child declared several times.
+  CREATE TEMPORARY TABLE gf_bulk_child ON COMMIT DROP AS
+    SELECT
+        COALESCE(existing_child.account_id, gen_random_uuid()) AS account_id,
+        existing_child.account_id IS NULL AS is_new,
+        foo.*
+      FROM (
+        SELECT DISTINCT ON (child_full_name, child_dob)
+            line_number,
+            child_first_name,
+            child_last_name,
+            child_full_name,
+            child_dob,
+            grade_level
+          FROM
+            gf_bulk_record
+          ORDER BY
+            child_full_name,
+            child_dob,
+            line_number
+      ) AS foo
+      LEFT JOIN LATERAL (
+        SELECT
+            account_id
+          FROM
+            child
+          WHERE
+            account_type = 'ghost'
+            AND full_name = foo.child_full_name
+            AND dob = foo.child_dob
+          LIMIT 1
+      ) AS existing_child
+        ON true;
+
+  INSERT INTO child (
+      account_id,
+      account_type,
+      first_name,
+      last_name,
+      full_name,
+      dob,
+      school_id,
+      grade_level,
+      locale,
+      get_off_school_bus_unaccompanied)
+    SELECT
+        account_id,
+        'ghost',
+        child_first_name,
+        child_last_name,
+        child_full_name,
+        child_dob,
+        p_school_id,
+        grade_level,
+        'fra',
+        extract(year from age(v_school_year_start_date, child_dob))
+          > p_minimal_age_for_getting_off_school_bus_unaccompanied
+      FROM
+        gf_bulk_child
+      WHERE
+        is_new
+      ORDER BY
+        line_number;
+
+  -- Collect the parents declared in the records.  A parent is identified
+  -- by his full name and his e-mail address; a parent with no e-mail
+  -- address is a new parent each time he is declared.
+  CREATE TEMPORARY TABLE gf_bulk_parent_occurrence ON COMMIT DROP AS
+    SELECT
+        foo.*,
+        CASE
+        WHEN email_address IS NULL THEN
+          line_number || '/' || parent_rank
+        ELSE
+          lower(full_name) || E'\n' || lower(email_address)
+        END AS parent_key,
+        gf_parse_location_string(home_location_str) AS home_location,
+        NULL::uuid AS account_id,
+        false AS is_first_parent_home,
+        NULL::uuid AS home_id
+      FROM (
+        SELECT
+            line_number,
+            1 AS parent_rank,
+            parent1_first_name AS first_name,
+            parent1_last_name AS last_name,
+            parent1_full_name AS full_name,
+            parent1_locale AS locale,
+            parent1_email_address AS email_address,
+            parent1_phone_number AS phone_number,
+            parent1_home_formatted_address AS home_formatted_address,
+            parent1_home_geocoded_address AS home_geocoded_address,
+            parent1_home_location AS home_location_str
+          FROM
+            gf_bulk_registration
+          WHERE
+            parent1_full_name IS NOT NULL
+        UNION ALL
+        SELECT
+            line_number,
+            2 AS parent_rank,
+            parent2_first_name,
+            parent2_last_name,
+            parent2_full_name,
+            parent2_locale,
+            parent2_email_address,
+            parent2_phone_number,
+            parent2_home_formatted_address,
+            parent2_home_geocoded_address,
+            parent2_home_location
+          FROM
+            gf_bulk_registration
+          WHERE
+            parent2_full_name IS NOT NULL
+      ) AS foo;
+
+  -- Match the parents with the parents already registered, keeping the
+  -- information of the first declaration of a parent.
+  CREATE TEMPORARY TABLE gf_bulk_parent ON COMMIT DROP AS
+    SELECT
+        COALESCE(existing_parent.account_id, gen_random_uuid()) AS account_id,
+        existing_parent.account_id IS NULL AS is_new,
+        foo.*
+      FROM (
+        SELECT DISTINCT ON (parent_key)
+            parent_key,
+            line_number,
+            parent_rank,
+            first_name,
+            last_name,
+            full_name,
+            locale,
+            email_address,
+            phone_number
+          FROM
+            gf_bulk_parent_occurrence
+          ORDER BY
+            parent_key,
+            line_number,
+            parent_rank
+      ) AS foo
+      LEFT JOIN LATERAL (
+        SELECT
+            account_id
+          FROM
+            account_contact
+          INNER JOIN account
+            USING (account_id)
+          WHERE
+            lower(account.full_name) = lower(foo.full_name)
+            AND account_contact.name = 'EMAIL'
+            AND lower(account_contact.value) = lower(foo.email_address)
+          LIMIT 1
+      ) AS existing_parent
+        ON true;
+
+  INSERT INTO account(
+      account_id,
+      first_name,
+      last_name,
+      full_name,
+      locale)
+    SELECT
+        account_id,
+        first_name,
+        last_name,
+        full_name,
+        locale
+      FROM
+        gf_bulk_parent
+      WHERE
+        is_new
+      ORDER BY
+        line_number,
+        parent_rank;
+
+  INSERT INTO account_contact(
+      account_id,
+      name,
+      value,
+      is_primary,
+      is_verified)
+    SELECT
+        account_id,
+        name,
+        lower(value),
+        true,
+        true
+      FROM (
+        SELECT
+            account_id,
+            line_number,
+            parent_rank,
+            1 AS contact_rank,
+            'EMAIL' AS name,
+            email_address AS value
+          FROM
+            gf_bulk_parent
+          WHERE
+            is_new
+            AND email_address IS NOT NULL
+        UNION ALL
+        SELECT
+            account_id,
+            line_number,
+            parent_rank,
+            2,
+            'PHONE',
+            phone_number
+          FROM
+            gf_bulk_parent
+          WHERE
+            is_new
+            AND phone_number IS NOT NULL
+      ) AS foo
+      ORDER BY
+        line_number,
+        parent_rank,
+        contact_rank
+    ON CONFLICT DO NOTHING;
+
+  -- Resolve the account of each parent declared, and the location of the
+  -- home where this parent puts his child up.  The second parent shares
+  -- the home of the first parent when he has no home location, or when
+  -- this location is the same.
+  UPDATE
+      gf_bulk_parent_occurrence
+    SET
+      account_id = gf_bulk_parent.account_id
+    FROM
+      gf_bulk_parent
+    WHERE
+      gf_bulk_parent.parent_key = gf_bulk_parent_occurrence.parent_key;
+
+  UPDATE
+      gf_bulk_parent_occurrence AS parent2
+    SET
+      is_first_parent_home = true
+    FROM
+      gf_bulk_record,
+      gf_bulk_parent_occurrence AS parent1
+    WHERE
+      parent2.parent_rank = 2
+      AND gf_bulk_record.line_number = parent2.line_number
+      AND parent1.parent_rank = 1
+      AND parent1.line_number = gf_bulk_record.parent1_line_number
+      AND parent2.home_location = parent1.home_location;
+
+  UPDATE
+      gf_bulk_parent_occurrence
+    SET
+      is_first_parent_home = true
+    WHERE
+      parent_rank = 2
+      AND home_location IS NULL;
+
+  -- Match the homes of the parents with the homes already registered.
+  CREATE TEMPORARY TABLE gf_bulk_home ON COMMIT DROP AS
+    SELECT
+        COALESCE(existing_home.place_id, gen_random_uuid()) AS place_id,
+        existing_home.place_id IS NULL AS is_new,
+        foo.*
+      FROM (
+        SELECT DISTINCT ON (account_id, home_location)
+            account_id,
+            home_location,
+            home_formatted_address,
+            home_geocoded_address,
+            line_number,
+            parent_rank
+          FROM
+            gf_bulk_parent_occurrence
+          WHERE
+            home_location IS NOT NULL
+            AND NOT is_first_parent_home
+          ORDER BY
+            account_id,
+            home_location,
+            line_number,
+            parent_rank
+      ) AS foo
+      LEFT JOIN LATERAL (
+        SELECT
+            place_id
+          FROM
+            place
+          WHERE
+            place.account_id = foo.account_id
+            AND place.location = foo.home_location
+          LIMIT 1
+      ) AS existing_home
+        ON true;
+
+  INSERT INTO place(
+      place_id,
+      account_id,
+      location,
+      is_location_edited,
+      category,
+      is_address_edited)
+    SELECT
+        place_id,
+        account_id,
+        home_location,
+        false,
+        'home',
+        true
+      FROM
+        gf_bulk_home
+      WHERE
+        is_new
+      ORDER BY
+        line_number,
+        parent_rank;
+
+  INSERT INTO place_address(
+      place_id,
+      account_id,
+      locale,
+      property_name,
+      property_value)
+    SELECT
+        place_id,
+        account_id,
+        'eng',
+        property_name,
+        property_value
+      FROM (
+        SELECT
+            place_id,
+            account_id,
+            line_number,
+            parent_rank,
+            'formatted_address' AS property_name,
+            home_formatted_address AS property_value
+          FROM
+            gf_bulk_home
+          WHERE
+            is_new
+        UNION ALL
+        SELECT
+            place_id,
+            account_id,
+            line_number,
+            parent_rank,
+            'geocoded_address',
+            home_geocoded_address
+          FROM
+            gf_bulk_home
+          WHERE
+            is_new
+            AND home_geocoded_address IS NOT NULL
+      ) AS foo
+      ORDER BY
+        line_number,
+        parent_rank,
+        property_name DESC;
+
+  UPDATE
+      gf_bulk_parent_occurrence
+    SET
+      home_id = gf_bulk_home.place_id
+    FROM
+      gf_bulk_home
+    WHERE
+      NOT gf_bulk_parent_occurrence.is_first_parent_home
+      AND gf_bulk_home.account_id = gf_bulk_parent_occurrence.account_id
+      AND gf_bulk_home.home_location = gf_bulk_parent_occurrence.home_location;
+
+  UPDATE
+      gf_bulk_parent_occurrence AS parent2
+    SET
+      home_id = parent1.home_id
+    FROM
+      gf_bulk_record,
+      gf_bulk_parent_occurrence AS parent1
+    WHERE
+      parent2.parent_rank = 2
+      AND parent2.is_first_parent_home
+      AND gf_bulk_record.line_number = parent2.line_number
+      AND parent1.parent_rank = 1
+      AND parent1.line_number = gf_bulk_record.parent1_line_number;
+
+  -- Link each child with the first parent, and the second parent if any,
+  -- of his record, unless they are already linked.
+  INSERT INTO guardian_child(
+      guardian_account_id,
+      child_account_id,
+      role,
+      home_id)
+    SELECT DISTINCT ON (guardian_account_id, child_account_id)
+        guardian_account_id,
+        child_account_id,
+        'legal',
+        home_id
+      FROM (
+        SELECT
+            gf_bulk_parent_occurrence.account_id AS guardian_account_id,
+            gf_bulk_child.account_id AS child_account_id,
+            gf_bulk_parent_occurrence.home_id,
+            gf_bulk_record.line_number,
+            gf_bulk_parent_occurrence.parent_rank
+          FROM
+            gf_bulk_record
+          INNER JOIN gf_bulk_child
+            ON gf_bulk_child.child_full_name = gf_bulk_record.child_full_name
+              AND gf_bulk_child.child_dob = gf_bulk_record.child_dob
+          INNER JOIN gf_bulk_parent_occurrence
+            ON (gf_bulk_parent_occurrence.parent_rank = 1
+                AND gf_bulk_parent_occurrence.line_number = gf_bulk_record.parent1_line_number)
+              OR (gf_bulk_parent_occurrence.parent_rank = 2
+                AND gf_bulk_parent_occurrence.line_number = gf_bulk_record.parent2_line_number)
+      ) AS foo
+      WHERE
+        NOT EXISTS (
+          SELECT
+              true
+            FROM
+              guardian_child
+            WHERE
+              guardian_child.guardian_account_id = foo.guardian_account_id
+              AND guardian_child.child_account_id = foo.child_account_id)
+      ORDER BY
+        guardian_account_id,
+        child_account_id,
+        line_number,
+        parent_rank;
+
+  RETURN v_record_count;
+END;
+$$;
+
+/**
+ * Import into the platform only the families whose records, staged in
+ * the table `gf_registration`, have been added or changed since the last
+ * import.
+ *
+ * The records of each family, from the record that holds the
+ * registration ID of this family to the record before the next
+ * registration ID, are hashed together, ignoring their line numbers,
+ * which shift when families are added before them.  The families whose
+ * digest differs from the digest recorded in the table
+ * `gf_registration_digest` are imported with the function
+ * `gf_main_bulk`, the passwords of their parents are set with the
+ * function `gf_set_parents_password`, and their digest is recorded.  The
+ * cost of an import is therefore proportional to the number of families
+ * added or changed, and not to the number of families staged.
+ *
+ * The records staged before the first registration ID don't belong to
+ * any family, and they are ignored.
+ *
+ *
+ * @param p_school_id: identification of the school the children attend.
+ *
+ * @param p_minimal_age_for_getting_off_school_bus_unaccompanied: Minimal
+ *     age of a child to be allowed to get off a school bus without the
+ *     presence of a guardian of him (cf. function `gf_register_child`).
+ *
+ *
+ * @return: The number of records processed.
+ */
+CREATE OR REPLACE FUNCTION gf_main_incremental(
+    IN p_school_id uuid,
+    IN p_minimal_age_for_getting_off_school_bus_unaccompanied smallint = 12)
+  RETURNS integer
+  VOLATILE
+  LANGUAGE PLPGSQL
+AS $$
+DECLARE
+  v_record_count integer = 0;
+  v_registration_ids text[];
+BEGIN
+  DROP TABLE IF EXISTS gf_bulk_family_digest;
+
+  CREATE TEMPORARY TABLE gf_bulk_family_digest ON COMMIT DROP AS
+    SELECT
+        family_registration_id AS registration_id,
+        md5(string_agg(
+          (to_jsonb(foo) - 'line_number' - 'family_number' - 'family_registration_id')::text,
+          E'\n'
+          ORDER BY line_number)) AS digest
+      FROM (
+        SELECT
+            *,
+            first_value(registration_id)
+              OVER (PARTITION BY family_number ORDER BY line_number) AS family_registration_id
+          FROM (
+            SELECT
+                *,
+                count(registration_id) OVER (ORDER BY line_number) AS family_number
+              FROM
+                gf_registration
+          ) AS foo
+      ) AS foo
+      WHERE
+        family_registration_id IS NOT NULL
+      GROUP BY
+        family_registration_id;
+
+  SELECT
+      array_agg(gf_bulk_family_digest.registration_id)
+    INTO
+      v_registration_ids
+    FROM
+      gf_bulk_family_digest
+    LEFT JOIN gf_registration_digest
+      USING (registration_id)
+    WHERE
+      gf_registration_digest.digest IS DISTINCT FROM gf_bulk_family_digest.digest;
+
+  IF v_registration_ids IS NOT NULL THEN
+    v_record_count = gf_main_bulk(
+      p_school_id,
+      p_minimal_age_for_getting_off_school_bus_unaccompanied,
+      v_registration_ids);
+
+    PERFORM gf_set_parents_password(v_registration_ids);
+
+    INSERT INTO gf_registration_digest(
+        registration_id,
+        digest)
+      SELECT
+          registration_id,
+          digest
+        FROM
+          gf_bulk_family_digest
+        WHERE
+          registration_id = ANY(v_registration_ids)
+      ON CONFLICT (registration_id) DO UPDATE
+        SET
+          digest = EXCLUDED.digest,
+          update_time = current_timestamp;
+  END IF;
+
+  RAISE NOTICE '% families added or changed, % records processed',
+    COALESCE(cardinality(v_registration_ids), 0), v_record_count;
+
+  RETURN v_record_count;
+END;
+$$;
+
+
+-- Remove the former signature of the function, which would make the
+-- calls without arguments ambiguous.
+DROP FUNCTION IF EXISTS gf_set_parents_password();
+
 /**
  * Set the password of the parent accounts freshly created.
  *
  * The function uses the registration ID of a parent to set the password
  * of this parent.  The function doesn't set the password of parent
  * accounts that have already a password defined.
+ *
+ *
+ * @param p_registration_ids: Registration IDs of the families whose
+ *     parents' password to set, or `NULL` to consider all the records.
  */
-CREATE OR REPLACE FUNCTION gf_set_parents_password()
+CREATE OR REPLACE FUNCTION gf_set_parents_password(
+    IN p_registration_ids text[] = NULL)
   RETURNS void
   VOLATILE
   LANGUAGE SQL
@@ -837,12 +1511,18 @@ AS $$
               parent1_email_address AS email_address
             FROM
               gf_registration
+            WHERE
+              p_registration_ids IS NULL
+              OR registration_id = ANY(p_registration_ids)
           UNION
           SELECT
               registration_id,
               parent2_email_address AS email_address
             FROM
               gf_registration
+            WHERE
+              p_registration_ids IS NULL
+              OR registration_id = ANY(p_registration_ids)
         ) AS foo
         INNER JOIN account_contact
           ON (account_contact.value = foo.email_address)
@@ -852,7 +1532,20 @@ AS $$
       AND account.account_id = foo.account_id;
 $$;
 
-
+/**
+ * Return the children registered by the families, with the information
+ * of their parents, to be imported into the school bus platform.
+ *
+ * The accounts of the parents are found by their e-mail address,
+ * compared case-insensitively, as the contact information is stored in
+ * lower case.  The information of each parent, including the primary
+ * phone number and the formatted address of the home, is joined once
+ * per parent, instead of being looked up field by field for each child.
+ *
+ *
+ * @return: A set of records, one per child of the first parent of a
+ *     family whose account is enabled.
+ */
 CREATE OR REPLACE FUNCTION gf_export_upmd_database()
   RETURNS TABLE (
     registration_id text,
@@ -882,44 +1575,20 @@ CREATE OR REPLACE FUNCTION gf_export_upmd_database()
     parent2_phone_number text,
     parent2_address text
   )
-  VOLATILE
+  STABLE
   LANGUAGE SQL
 AS $$
-  SELECT
-      registration_id,
-      child.account_id,
-      CONCAT('student.', child.account_id::text) AS qrcode,
-      child.first_name,
-      child.last_name,
-      child.full_name,
-      child.dob,
-      child.grade_level,
-      (SELECT grade_short_name FROM education_grade WHERE country_code = 'FR' AND education_grade.grade_level = child.grade_level) AS grade_short_name,
-      (SELECT grade_short_name FROM education_grade WHERE country_code = 'FR' AND education_grade.grade_level = child.grade_level) || ' ' || COALESCE(school_class.class_name, '') AS class_name,
-      parent1_account_id,
-      (SELECT first_name FROM account WHERE account_id = parent1_account_id) AS parent1_first_name,
-      (SELECT last_name FROM account WHERE account_id = parent1_account_id) AS parent1_last_name,
-      (SELECT full_name FROM account WHERE account_id = parent1_account_id) AS parent1_full_name,
-      (SELECT locale FROM account WHERE account_id = parent1_account_id) AS parent1_locale,
-      parent1_email_address,
-      (SELECT value FROM account_contact WHERE account_id = parent1_account_id and name = 'PHONE' AND is_primary = true) AS parent1_phone_number,
-      (SELECT property_value FROM place INNER JOIN place_address USING (place_id) WHERE place.account_id = parent1_account_id AND category = 'home' AND property_name = 'formatted_address' LIMIT 1) AS parent1_address,
-      parent2_account_id,
-      (SELECT first_name FROM account WHERE account_id = parent2_account_id) AS parent2_first_name,
-      (SELECT last_name FROM account WHERE account_id = parent2_account_id) AS parent2_last_name,
-      (SELECT full_name FROM account WHERE account_id = parent2_account_id) AS parent2_full_name,
-      (SELECT locale FROM account WHERE account_id = parent2_account_id) AS parent2_locale,
-      parent2_email_address,
-      (SELECT value FROM account_contact WHERE account_id = parent2_account_id and name = 'PHONE' AND is_primary = true) AS parent2_phone_number,
-      (SELECT property_value FROM place INNER JOIN place_address USING (place_id) WHERE place.account_id = parent2_account_id AND category = 'home' AND property_name = 'formatted_address' LIMIT 1) AS parent2_address
-    FROM (
+  WITH
+    -- Families registered with the first record of their applications, and
+    -- the accounts of their parents, found by their e-mail address.
+    registration AS (
       SELECT
-          registration_id,
-          (SELECT account_id FROM account_contact WHERE value = parent1_email_address) AS parent1_account_id,
-          parent1_email_address,
-          (SELECT account_id FROM account_contact WHERE value = parent2_email_address) AS parent2_account_id,
-          parent2_email_address
-      FROM (
+          foo.registration_id,
+          parent1.account_id AS parent1_account_id,
+          foo.parent1_email_address,
+          parent2.account_id AS parent2_account_id,
+          foo.parent2_email_address
+        FROM (
           SELECT
               registration_id,
               parent1_email_address,
@@ -929,20 +1598,156 @@ AS $$
               ELSE
                   parent2_email_address
               END AS parent2_email_address
-          FROM
+            FROM
               gf_registration
-          WHERE
+            WHERE
               registration_id IS NOT NULL
-      ) AS foo
-    ) AS foo
-    INNER JOIN account AS parent1_account
-      ON parent1_account.account_id = parent1_account_id
+        ) AS foo
+        INNER JOIN LATERAL (
+          SELECT
+              account_id
+            FROM
+              account_contact
+            WHERE
+              name = 'EMAIL'
+              AND lower(value) = lower(foo.parent1_email_address)
+            LIMIT 1
+        ) AS parent1
+          ON true
+        LEFT JOIN LATERAL (
+          SELECT
+              account_id
+            FROM
+              account_contact
+            WHERE
+              name = 'EMAIL'
+              AND lower(value) = lower(foo.parent2_email_address)
+            LIMIT 1
+        ) AS parent2
+          ON true
+    ),
+
+    registered_parent AS (
+      SELECT
+          parent1_account_id AS account_id
+        FROM
+          registration
+      UNION
+      SELECT
+          parent2_account_id AS account_id
+        FROM
+          registration
+        WHERE
+          parent2_account_id IS NOT NULL
+    ),
+
+    -- Information of the parents, with their primary phone number and the
+    -- formatted address of their home, aggregated once per parent.
+    parent AS (
+      SELECT
+          account.account_id,
+          account.first_name,
+          account.last_name,
+          account.full_name,
+          account.locale,
+          account.object_status,
+          phone.value AS phone_number,
+          home.property_value AS address
+        FROM
+          account
+        INNER JOIN registered_parent
+          USING (account_id)
+        LEFT JOIN (
+          SELECT DISTINCT ON (account_id)
+              account_id,
+              value
+            FROM
+              account_contact
+            INNER JOIN registered_parent
+              USING (account_id)
+            WHERE
+              name = 'PHONE'
+              AND is_primary = true
+            ORDER BY
+              account_id
+        ) AS phone
+          USING (account_id)
+        LEFT JOIN (
+          SELECT DISTINCT ON (place.account_id)
+              place.account_id,
+              place_address.property_value
+            FROM
+              place
+            INNER JOIN registered_parent
+              ON registered_parent.account_id = place.account_id
+            INNER JOIN place_address
+              ON place_address.place_id = place.place_id
+            WHERE
+              place.category = 'home'
+              AND place_address.property_name = 'formatted_address'
+            ORDER BY
+              place.account_id
+        ) AS home
+          USING (account_id)
+    )
+
+  SELECT
+      registration.registration_id,
+      child.account_id,
+      CONCAT('student.', child.account_id::text) AS qrcode,
+      child.first_name,
+      child.last_name,
+      child.full_name,
+      child.dob,
+      child.grade_level,
+      education_grade.grade_short_name,
+      education_grade.grade_short_name || ' ' || COALESCE(school_class.class_name, '') AS class_name,
+      registration.parent1_account_id,
+      parent1.first_name,
+      parent1.last_name,
+      parent1.full_name,
+      parent1.locale,
+      registration.parent1_email_address,
+      parent1.phone_number,
+      parent1.address,
+      registration.parent2_account_id,
+      parent2.first_name,
+      parent2.last_name,
+      parent2.full_name,
+      parent2.locale,
+      registration.parent2_email_address,
+      parent2.phone_number,
+      parent2.address
+    FROM
+      registration
+    INNER JOIN parent AS parent1
+      ON parent1.account_id = registration.parent1_account_id
+    LEFT JOIN parent AS parent2
+      ON parent2.account_id = registration.parent2_account_id
     INNER JOIN guardian_child
-      ON guardian_account_id = parent1_account_id
+      ON guardian_child.guardian_account_id = registration.parent1_account_id
     INNER JOIN child
       ON child.account_id = guardian_child.child_account_id
     LEFT JOIN school_class
       ON school_class.class_id = child.class_id
+    LEFT JOIN education_grade
+      ON education_grade.country_code = 'FR'
+        AND education_grade.grade_level = child.grade_level
     WHERE
-      parent1_account.object_status = 'enabled'
+      parent1.object_status = 'enabled'
 $$;
+
+/**
+ * Snapshot of the export of the children and their parents, to read it
+ * several times without running the function `gf_export_upmd_database`
+ * again.  The view is created empty, and it is refreshed after each
+ * import of the applications:
+ *
+ *     REFRESH MATERIALIZED VIEW gf_upmd_export;
+ */
+CREATE MATERIALIZED VIEW IF NOT EXISTS gf_upmd_export AS
+  SELECT
+      *
+    FROM
+      gf_export_upmd_database()
+  WITH NO DATA;
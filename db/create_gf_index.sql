@@ -0,0 +1,61 @@
+/**
+ * Copyright (C) 2020 Majormode.  All rights reserved.
+ *
+ * This software is the confidential and proprietary information of
+ * Majormode or one of its subsidiaries.  You shall not disclose this
+ * confidential information and shall use it only in accordance with the
+ * terms of the license agreement or other applicable agreement you
+ * entered into with Majormode.
+ *
+ * MAJORMODE MAKES NO REPRESENTATIONS OR WARRANTIES ABOUT THE SUITABILITY
+ * OF THE SOFTWARE, EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+ * TO THE IMPLIED WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ * PURPOSE, OR NON-INFRINGEMENT.  MAJORMODE SHALL NOT BE LIABLE FOR ANY
+ * LOSSES OR DAMAGES SUFFERED BY LICENSEE AS A RESULT OF USING, MODIFYING
+ * OR DISTRIBUTING THIS SOFTWARE OR ITS DERIVATIVES.
+ */
+
+-- Indexes serving the lookups of the functions `gf_find_child`,
+-- `gf_find_home`, and `gf_find_parent`, and of the set-based import
+-- `gf_main_bulk`, which otherwise scan the whole tables of the platform
+-- for each record.
+--
+-- The indexes are built without locking the tables against writes, which
+-- cannot be done inside a transaction block: run the script with
+-- `psql -f db/create_gf_index.sql`, without `--single-transaction`.  The
+-- script can be run several times.
+--
+-- The script also declares the lookup functions `STABLE`, for the
+-- databases where they have been created `IMMUTABLE`: these functions
+-- read tables, and the planner must not fold their calls into constants
+-- cached across the records of `gf_main`.
+
+-- `gf_find_parent` and `gf_main_bulk` compare the full name of a parent
+-- case-insensitively.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_account_lower_full_name
+  ON account (lower(full_name));
+
+-- `gf_find_parent` and `gf_main_bulk` find a contact information by its
+-- name and its value compared case-insensitively.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_account_contact_name_lower_value
+  ON account_contact (name, lower(value));
+
+-- `gf_find_child` and `gf_main_bulk` only look for the children who have
+-- no account of their own, by their full name and their date of birth.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_child_ghost_full_name_dob
+  ON child (full_name, dob)
+  WHERE account_type = 'ghost';
+
+-- `gf_find_home` and `gf_main_bulk` look for the residence of a parent
+-- at an exact location.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_place_account_id_location
+  ON place (account_id, location);
+
+ALTER FUNCTION gf_find_child(text, date) STABLE;
+ALTER FUNCTION gf_find_home(uuid, geometry) STABLE;
+ALTER FUNCTION gf_find_parent(text, text, text) STABLE;
+
+ANALYZE account;
+ANALYZE account_contact;
+ANALYZE child;
+ANALYZE place;
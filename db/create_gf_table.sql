@@ -48,3 +48,14 @@ CREATE TABLE gf_registration (
   is_enabled boolean NULL,
   line_number int NOT NULL
 );
+
+/**
+ * Digest of the records of each family already imported into the
+ * platform, to import only the families that have been added or changed
+ * since (cf. function `gf_main_incremental`).
+ */
+CREATE TABLE gf_registration_digest (
+  registration_id text NOT NULL PRIMARY KEY,
+  digest text NOT NULL,
+  update_time timestamptz NOT NULL DEFAULT current_timestamp
+);
@@ -0,0 +1,156 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from email.mime.application import MIMEApplication
+from email.mime.image import MIMEImage
+import io
+import logging
+import mimetypes
+import os
+import threading
+
+from PIL import Image
+
+
+# Minimal quality of the JPEG compression used to reduce the size of an
+# image attachment, below which the image is downscaled instead.
+MIN_JPEG_QUALITY = 60
+
+# Factor applied to the dimensions of an image attachment each time it
+# needs to be downscaled to fit the size budget.
+DOWNSCALE_FACTOR = 0.8
+
+
+class AttachmentCache:
+    """
+    Cache of the Multipurpose Internet Mail Extensions (MIME) parts of the
+    files attached to e-mails.
+
+    Each file is read and encoded once, and the same MIME part is attached
+    to all the e-mails.  The MIME part of a file is built again when the
+    file has been modified.
+    """
+    def __init__(self, max_byte_count=None):
+        """
+        Build a new object `AttachmentCache`.
+
+
+        :param max_byte_count: Maximal size in bytes of an image attachment.
+            An image larger than this size is compressed, and downscaled if
+            needed, to fit this size.  If not defined, images are attached as
+            they are.
+        """
+        self.__max_byte_count = max_byte_count
+
+        # The key corresponds to the absolute path and name of a file, and the
+        # value corresponds to a tuple `(modification_time, part)`.
+        self.__parts_cache = dict()
+        self.__lock = threading.Lock()
+
+    def __build_part(self, file_path_name):
+        """
+        Build the MIME part of a file to attach to e-mails.
+
+
+        :param file_path_name: Absolute path and name of the file.
+
+
+        :return: An object `MIMEImage` if the file is an image, an object
+            `MIMEApplication` otherwise.
+        """
+        with open(file_path_name, 'rb') as fd:
+            data = fd.read()
+
+        mime_type, _ = mimetypes.guess_type(file_path_name)
+
+        if mime_type and mime_type.startswith('image/'):
+            if self.__max_byte_count and len(data) > self.__max_byte_count:
+                data = reduce_image_size(data, self.__max_byte_count)
+                mime_type = 'image/jpeg'
+
+            part = MIMEImage(data, _subtype=mime_type.split('/')[1])
+        else:
+            part = MIMEApplication(data)
+
+        part.add_header('Content-Disposition', 'attachment', filename=os.path.basename(file_path_name))
+
+        return part
+
+    def get(self, file_path_name):
+        """
+        Return the MIME part of a file to attach to e-mails.
+
+
+        :param file_path_name: Absolute path and name of the file.
+
+
+        :return: An object `MIMEBase`.
+        """
+        modification_time = os.stat(file_path_name).st_mtime
+
+        with self.__lock:
+            modification_time_, part = self.__parts_cache.get(file_path_name, (None, None))
+            if modification_time_ != modification_time:
+                part = self.__build_part(file_path_name)
+                self.__parts_cache[file_path_name] = (modification_time, part)
+
+        return part
+
+
+def reduce_image_size(data, max_byte_count):
+    """
+    Compress an image in JPEG, and downscale it if needed, until its size
+    fits a size budget.
+
+
+    :param data: The binary data of an image.
+
+    :param max_byte_count: Maximal size in bytes of the image.
+
+
+    :return: The binary data of the image in JPEG.
+    """
+    image = Image.open(io.BytesIO(data))
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    original_byte_count = len(data)
+    quality = 85
+
+    while True:
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=quality, optimize=True)
+        data = buffer.getvalue()
+
+        if len(data) <= max_byte_count or min(image.size) <= 1:
+            break
+
+        if quality > MIN_JPEG_QUALITY:
+            quality -= 10
+        else:
+            width, height = image.size
+            image = image.resize(
+                (max(1, int(width * DOWNSCALE_FACTOR)), max(1, int(height * DOWNSCALE_FACTOR))),
+                Image.LANCZOS)
+
+    logging.info(f"Reduced the size of an image attachment from {original_byte_count} to {len(data)} bytes")
+
+    return data
@@ -0,0 +1,191 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# Alphabet of the base 32 encoding of the geohashes.
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Default number of characters of the geohash of a cluster of locations.
+# A cell of a geohash of 7 characters is about 150 meters wide.
+DEFAULT_GEOHASH_PRECISION = 7
+
+
+class LocationCluster:
+    """
+    Home locations of families grouped together, represented by their
+    centroid.
+    """
+    def __init__(self, key):
+        """
+        Build a new object `LocationCluster`.
+
+
+        :param key: Key of the cluster, such as the geohash of the cell of the
+            grid the locations belong to.
+        """
+        self.__key = key
+
+        # The key corresponds to a registration ID, and the value corresponds
+        # to a tuple `(children_count, locations)` of the number of children
+        # of the family and of the home locations of this family in the
+        # cluster.
+        self.__registrations = dict()
+
+    def __len__(self):
+        return len(self.__registrations)
+
+    def add(self, registration_id, children_count, location):
+        """
+        Add the home location of a family to the cluster.
+
+
+        :param registration_id: Identification of the application of the
+            family.
+
+        :param children_count: Number of children of the family.
+
+        :param location: An object `GeoPoint` of the home of the family.
+        """
+        _, locations = self.__registrations.get(registration_id, (None, []))
+        self.__registrations[registration_id] = (children_count, locations + [location])
+
+    @property
+    def centroid(self):
+        """
+        Return the centroid of the home locations of the cluster.
+
+
+        :return: A tuple `(latitude, longitude)`.
+        """
+        latitudes = []
+        longitudes = []
+
+        for _, locations in self.__registrations.values():
+            for location in locations:
+                latitudes.append(location.latitude)
+                longitudes.append(location.longitude)
+
+        return sum(latitudes) / len(latitudes), sum(longitudes) / len(longitudes)
+
+    @property
+    def children_count(self):
+        return sum([children_count for children_count, _ in self.__registrations.values()])
+
+    @property
+    def family_count(self):
+        return len(self.__registrations)
+
+    @property
+    def key(self):
+        return self.__key
+
+    @property
+    def registration_ids(self):
+        return sorted(self.__registrations)
+
+    def remove(self, registration_id):
+        """
+        Remove the home locations of a family from the cluster.
+
+
+        :param registration_id: Identification of the application of the
+            family.
+        """
+        del self.__registrations[registration_id]
+
+
+def build_location_clusters(registrations, precision=DEFAULT_GEOHASH_PRECISION):
+    """
+    Group the home locations of families in the cells of a geohash grid.
+
+    Each location is assigned to its cell in constant time, so that the
+    families who live in the same building, with slightly different
+    geographical coordinates, are grouped together.
+
+
+    :param registrations: A list of objects `Registration`.
+
+    :param precision: Number of characters of the geohash of the cells.
+
+
+    :return: A list of objects `LocationCluster` sorted by geohash.
+    """
+    clusters = dict()
+
+    for registration in registrations:
+        for location in set([parent.location for parent in registration.parents if parent.location]):
+            geohash = encode_geohash(location.latitude, location.longitude, precision)
+
+            cluster = clusters.get(geohash)
+            if cluster is None:
+                cluster = clusters[geohash] = LocationCluster(geohash)
+
+            cluster.add(registration.registration_id, len(registration.children), location)
+
+    return [clusters[geohash] for geohash in sorted(clusters)]
+
+
+def encode_geohash(latitude, longitude, precision=DEFAULT_GEOHASH_PRECISION):
+    """
+    Return the geohash of a geographical location.
+
+    The geohash interleaves the bits of the bisections of the longitude
+    and of the latitude intervals, starting with the longitude, and
+    encodes them in base 32.  Locations that share the same geohash prefix
+    are in the same cell of the grid of this precision.
+
+
+    :param latitude: Latitude of the location.
+
+    :param longitude: Longitude of the location.
+
+    :param precision: Number of characters of the geohash.
+
+
+    :return: A string of base 32 characters.
+    """
+    latitude_interval = [-90.0, 90.0]
+    longitude_interval = [-180.0, 180.0]
+
+    characters = []
+    bits = 0
+    bit_count = 0
+    is_longitude = True
+
+    while len(characters) < precision:
+        value, interval = (longitude, longitude_interval) if is_longitude else (latitude, latitude_interval)
+
+        middle = (interval[0] + interval[1]) / 2
+        if value >= middle:
+            bits = (bits << 1) | 1
+            interval[0] = middle
+        else:
+            bits <<= 1
+            interval[1] = middle
+
+        is_longitude = not is_longitude
+        bit_count += 1
+
+        if bit_count == 5:
+            characters.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(characters)
@@ -0,0 +1,336 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import logging
+import math
+import queue
+import threading
+import time
+
+
+# Default number of messages sent concurrently.
+DEFAULT_CONCURRENCY = 1
+
+# Default number of messages waiting to be sent, per worker, above which
+# the producer of messages is blocked until a worker is available.
+DEFAULT_QUEUE_SIZE_PER_WORKER = 2
+
+# Default time in seconds the producer of messages waits for room in the
+# queue of the messages waiting to be sent, when this queue is full.
+DEFAULT_SUBMIT_TIMEOUT = 60
+
+
+class TokenBucket:
+    """
+    Token bucket that limits the rate at which operations are performed.
+
+    The bucket is refilled with tokens at a constant rate, up to its
+    capacity.  Each operation consumes a token, waiting for the bucket to
+    be refilled when it's empty.  The capacity of the bucket determines
+    the number of operations that can be performed in a burst.
+    """
+    def __init__(self, rate, capacity=None):
+        """
+        Build a new object `TokenBucket`.
+
+
+        :param rate: Number of tokens added to the bucket per second.
+
+        :param capacity: Maximal number of tokens the bucket holds.  Defaults
+            to the number of tokens added in one second, and at least `1`.
+        """
+        if rate <= 0:
+            raise ValueError("the rate of a token bucket must be positive")
+
+        self.__rate = rate
+        self.__capacity = capacity or max(1.0, rate)
+        self.__token_count = self.__capacity
+        self.__last_refill_time = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Consume a token, waiting for the bucket to be refilled if it's empty.
+        """
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                self.__token_count = min(
+                    self.__capacity,
+                    self.__token_count + (now - self.__last_refill_time) * self.__rate)
+                self.__last_refill_time = now
+
+                if self.__token_count >= 1:
+                    self.__token_count -= 1
+                    return
+
+                wait_time = (1 - self.__token_count) / self.__rate
+
+            time.sleep(wait_time)
+
+    @property
+    def rate(self):
+        return self.__rate
+
+
+class DispatchMetrics:
+    """
+    Metrics of the messages sent by a dispatcher: number of messages sent
+    and failed, and latency of the messages.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.reset()
+
+    @property
+    def failure_count(self):
+        return self.__failure_count
+
+    def get_latency_percentile(self, percentile):
+        """
+        Return a percentile of the latency of the messages.
+
+
+        :param percentile: A number between `0` and `100`.
+
+
+        :return: The latency in seconds below which this percentage of the
+            messages have been sent, or `None` if no message has been sent.
+        """
+        with self.__lock:
+            latencies = sorted(self.__latencies)
+
+        if not latencies:
+            return None
+
+        return latencies[max(0, math.ceil(len(latencies) * percentile / 100) - 1)]
+
+    @property
+    def message_count(self):
+        return self.__message_count
+
+    @property
+    def messages_per_second(self):
+        """
+        Return the rate at which the messages have been processed, from the
+        start of the first message to the end of the last message.
+
+
+        :return: The number of messages processed per second.
+        """
+        if self.__first_start_time is None:
+            return 0.0
+
+        elapsed_time = self.__last_end_time - self.__first_start_time
+        message_count = self.__message_count + self.__failure_count
+        return message_count / elapsed_time if elapsed_time > 0 else float(message_count)
+
+    def record(self, start_time, end_time, succeeded):
+        """
+        Record the result of an attempt to send a message.
+
+
+        :param start_time: Time, in seconds, when the attempt started.
+
+        :param end_time: Time, in seconds, when the attempt ended.
+
+        :param succeeded: Indicate whether the message has been sent.
+        """
+        with self.__lock:
+            if succeeded:
+                self.__message_count += 1
+            else:
+                self.__failure_count += 1
+
+            self.__latencies.append(end_time - start_time)
+
+            if self.__first_start_time is None or start_time < self.__first_start_time:
+                self.__first_start_time = start_time
+            if self.__last_end_time is None or end_time > self.__last_end_time:
+                self.__last_end_time = end_time
+
+    def reset(self):
+        """
+        Reset the metrics.
+        """
+        with self.__lock:
+            self.__message_count = 0
+            self.__failure_count = 0
+            self.__latencies = []
+            self.__first_start_time = None
+            self.__last_end_time = None
+
+    def summarize(self):
+        """
+        Return a human-readable summary of the metrics.
+
+
+        :return: A string.
+        """
+        summary = f"{self.__message_count} sent, {self.__failure_count} failed " \
+                  f"({self.messages_per_second:.2f} messages/s"
+
+        if self.__latencies:
+            summary += f", p50 {self.get_latency_percentile(50) * 1000:.0f} ms" \
+                       f", p99 {self.get_latency_percentile(99) * 1000:.0f} ms"
+
+        return summary + ")"
+
+
+class ConcurrentDispatcher:
+    """
+    Pool of worker threads that send messages concurrently, with an
+    optional limit of the rate at which the messages are sent.
+
+    The messages are submitted to a bounded queue: the producer is blocked
+    when the workers cannot keep up with the messages submitted, for a
+    limited time after which the message is rejected, so that the producer
+    can hold back the messages it has still to submit.
+    """
+    # Item put in the queue to request a worker to stop.
+    __STOP = object()
+
+    def __init__(
+            self,
+            send_function,
+            concurrency=DEFAULT_CONCURRENCY,
+            rate_limit=None,
+            queue_size=None):
+        """
+        Build a new object `ConcurrentDispatcher`.
+
+
+        :param send_function: A function that takes a message and sends it.
+            The function returns `False`, or raises an exception, when the
+            message couldn't be sent.
+
+        :param concurrency: Number of worker threads sending messages.
+
+        :param rate_limit: Maximal number of messages sent per second.  If
+            not defined, the rate is not limited.
+
+        :param queue_size: Maximal number of messages waiting to be sent.
+            Defaults to `DEFAULT_QUEUE_SIZE_PER_WORKER` messages per worker.
+        """
+        if concurrency < 1:
+            raise ValueError("the concurrency of a dispatcher must be at least 1")
+
+        self.__send_function = send_function
+        self.__concurrency = concurrency
+        self.__token_bucket = rate_limit and TokenBucket(rate_limit)
+        self.__queue = queue.Queue(queue_size or concurrency * DEFAULT_QUEUE_SIZE_PER_WORKER)
+        self.__metrics = DispatchMetrics()
+        self.__workers = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __work(self):
+        while True:
+            message = self.__queue.get()
+
+            try:
+                if message is self.__STOP:
+                    break
+
+                if self.__token_bucket:
+                    self.__token_bucket.acquire()
+
+                start_time = time.time()
+                try:
+                    succeeded = self.__send_function(message) is not False
+                except Exception:
+                    logging.exception("Failed to send a message")
+                    succeeded = False
+
+                self.__metrics.record(start_time, time.time(), succeeded)
+
+            finally:
+                self.__queue.task_done()
+
+    @property
+    def concurrency(self):
+        return self.__concurrency
+
+    def join(self):
+        """
+        Wait for all the messages submitted to be processed.
+        """
+        self.__queue.join()
+
+    @property
+    def metrics(self):
+        return self.__metrics
+
+    def start(self):
+        """
+        Start the worker threads.
+        """
+        if self.__workers:
+            return
+
+        for i in range(self.__concurrency):
+            worker = threading.Thread(target=self.__work, name=f'DispatcherWorker-{i}', daemon=True)
+            worker.start()
+            self.__workers.append(worker)
+
+    def stop(self):
+        """
+        Wait for the messages submitted to be processed, and stop the worker
+        threads.
+        """
+        for _ in self.__workers:
+            self.__queue.put(self.__STOP)
+
+        for worker in self.__workers:
+            worker.join()
+
+        self.__workers = []
+
+    def submit(self, message, timeout=DEFAULT_SUBMIT_TIMEOUT):
+        """
+        Submit a message to send, blocking while the queue of the messages
+        waiting to be sent is full.
+
+
+        :param message: A message to pass to the send function.
+
+        :param timeout: Maximal time in seconds to wait for room in the
+            queue.  If `None`, wait until a worker takes a message from the
+            queue.
+
+
+        :raise Full: If the queue is still full after the timeout.
+        """
+        if not self.__workers:
+            raise RuntimeError("the dispatcher has not been started")
+
+        try:
+            self.__queue.put_nowait(message)
+        except queue.Full:
+            logging.warning(
+                f"The queue of the dispatcher is full ({self.__queue.maxsize} messages); "
+                "waiting for the workers to catch up...")
+            self.__queue.put(message, timeout=timeout)
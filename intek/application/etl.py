@@ -23,12 +23,13 @@
 
 import collections
 import csv
+import datetime
 import getpass
 import logging
 import pickle
 import os
-import re
 import socket
+import sys
 import time
 import traceback
 
@@ -39,12 +40,42 @@ from majormode.perseus.model.locale import Locale
 from majormode.perseus.utils import email_util
 import googleapiclient.discovery
 import googleapiclient.errors
-import simplekml
+import numpy as np
 
+from .attachment import AttachmentCache
+from .clustering import DEFAULT_GEOHASH_PRECISION
+from .clustering import build_location_clusters
 from .geocoding import GoogleGeocoder
+from .geojson import GeoJsonExporter
+from .geomath import calculate_distances_to_point
+from .geomath import flag_outliers
+from .geomath import get_home_locations
+from .kml import KmlExporter
+from .mailer import Mailer
+from .masterlist import GoogleSheetsMasterList
+from .masterlist import SqliteMasterList
+from .masterlist import synchronize_master_lists
+from .matching import find_duplicate_children
 from .model import PAYMENT_AMOUNT_NON_UPMD
 from .model import PAYMENT_AMOUNT_UPMD
 from .model import Registration
+from .model import get_grade_name
+from .model import parse_registration_id
+from .model import prettify_registration_id
+from .outbox import EmailOutbox
+from .outbox import OutboxDispatcher
+from .outbox import OutboxMessage
+from .rendering import EmailOutputFormat
+from .rendering import build_file_name as build_email_file_name
+from .rendering import write_email_messages
+from .routing import assign_families_to_buses
+from .sheets import get_sheet_names
+from .sheets import read_google_sheet_values
+from .spatial import SpatialIndex
+from .stops import propose_bus_stops
+from .submission import RegistrationIndex
+from .submission import SubmissionStatus
+from .template import EmailTemplate
 
 
 # Default name of the file where the OAuth2 token to access Google
@@ -59,10 +90,26 @@ DEFAULT_GOOGLE_CREDENTIALS_FILE_NAME = 'google_credentials.json'
 # Default time in seconds between two consecutive executions.
 DEFAULT_IDLE_TIME_BETWEEN_CONSECUTIVE_EXECUTION = 60 * 5
 
+# Default name of the SQLite database file where the e-mails to send to
+# the parents are queued in.
+DEFAULT_EMAIL_OUTBOX_FILE_NAME = 'email_outbox.db'
+
+# Default number of families which confirmation e-mails are re-sent in
+# one batch.
+DEFAULT_RESEND_BATCH_SIZE = 50
+
+# Default name of the file where the index of the application forms
+# submitted by the families is stored in.
+DEFAULT_REGISTRATION_INDEX_FILE_NAME = 'registration_index.pickle'
+
 # Default name of the file where the connection properties to the
 # Simple Mail Transfer Protocol (SMTP) is stored in.
 DEFAULT_SMTP_CONNECTION_PROPERTIES_FILE_NAME = 'smtp_connection_properties.pickle'
 
+# Extensions of the localized files to attach to the application
+# confirmation e-mail.
+ATTACHMENT_FILE_EXTENSIONS = ('jpg', 'jpeg')
+
 # Default relative path of the folder where the e-mail templates and
 # attachment files are stored in.
 DEFAULT_TEMPLATE_RELATIVE_PATH = 'templates'
@@ -73,26 +120,6 @@ FRENCH_LOCALE = Locale('fra')
 KOREAN_LOCALE = Locale('kor')
 VIETNAMESE_LOCALE = Locale('vie')
 
-# Mapping between education grade names and their corresponding levels.
-GRADE_NAMES = {
-    'TPS': 1,
-    'PS': 2,
-    'MS': 3,
-    'GS': 4,
-    'CP': 5,
-    'CE1': 6,
-    'CE2': 7,
-    'CM1': 8,
-    'CM2': 9,
-    'Sixième': 10,
-    'Cinquième': 11,
-    'Quatrième': 12,
-    'Troisième': 13,
-    'Seconde': 14,
-    'Première': 15,
-    'Terminale': 16,
-}
-
 # OAuth2 scope information for the Google Sheets API: the script needs
 # that the owner(s) of the Google Sheets documents allows read/write
 # access to these sheets and their properties.
@@ -109,14 +136,6 @@ PLACEHOLDER_REGISTRATION_ID = 'registration_id'
 PLACEHOLDER_PAYMENT_AMOUNT = 'payment_amount'
 PLACEHOLDER_IS_APE_MEMBER = 'is_ape_member'
 
-# Regular expression matching the pattern of a placeholder where its
-# name needs to be replaced by its corresponding value.
-#
-# Placeholder names are surrounded by "::" and "::".  Placeholder names
-# must consist of any letter (A-Z), any digit (0-9), an underscore, or
-# a dot.  Placeholder names must start with a letter.
-REGEX_PLACEHOLDER_NAME = re.compile(r'::((?i)[a-z][a-z0-9_.]*)::')
-
 
 def build_current_directory_path_name(file_name):
     """
@@ -149,7 +168,7 @@ def build_registration_confirmation_email_content(registration, locale, template
 
     :return: The localized content of the email.
     """
-    template_content = get_registration_confirmation_email_template(locale, template_path)
+    template = EmailTemplate.load(get_registration_confirmation_email_template_file_path_name(locale, template_path))
 
     placeholders = {
         PLACEHOLDER_PARENT_NAME: ' / '.join([parent.fullname for parent in registration.parents]),
@@ -157,10 +176,140 @@ def build_registration_confirmation_email_content(registration, locale, template
         PLACEHOLDER_REGISTRATION_ID: prettify_registration_id(registration.registration_id),
     }
 
-    email_content = expand_placeholders_value(template_content, placeholders)
-    email_subject = get_email_subject(email_content)
+    return template.render(placeholders)
+
+
+def build_registration_confirmation_emails(registration, email_template_path):
+    """
+    Build the confirmation e-mails to send to the parents of a family who
+    submitted a application to the school bus transportation service.
+
+    The function optimizes the number of e-mail to be sent to the parents,
+    by grouping parents by their preferred languages.  If two parents (or
+    more) share the same preferred language, the function groups them in
+    a same list of recipients which one email, written in this language,
+    is sent to.
+
+
+    :param registration: An object `Registration`.
+
+    :param email_template_path: The absolute path of the folder where
+        localized e-mail templates and files to attach are stored in.
+
+
+    :return: A list of tuples `(locale, parent_email_addresses, subject,
+        content, attachment_file_path_name)`.
+    """
+    # Group the parents by their preferred languages. Well, they are
+    # supposed to be only 2 parents, but who knows in the future.
+    parents_locale_mapping = collections.defaultdict(list)
+    for parent in registration.parents:
+        parents_locale_mapping[parent.locale].append(parent)
+
+    emails = []
+
+    for locale, parents in parents_locale_mapping.items():
+        email_subject, email_content = \
+            build_registration_confirmation_email_content(registration, locale, email_template_path)
+
+        parent_email_addresses = [parent.email_address for parent in parents]
+
+        attachment_file_path_name = get_registration_confirmation_email_attachment_file_path_name(
+            registration.locale,
+            email_template_path)
+
+        emails.append((locale, parent_email_addresses, email_subject, email_content, attachment_file_path_name))
+
+    return emails
+
+
+def build_registration_confirmation_messages(
+        registration,
+        email_template_path,
+        author_name,
+        author_email_address,
+        tag=None):
+    """
+    Build the confirmation messages to send to the parents of a family,
+    identified by their idempotency key.
+
+
+    :param registration: An object `Registration`.
+
+    :param email_template_path: The absolute path of the folder where
+        localized e-mail templates and files to attach are stored in.
+
+    :param author_name: Complete name of the originator of the message.
+
+    :param author_email_address: Address of the mailbox to which the author
+        of the message suggests that replies be sent.
+
+    :param tag: A string added to the idempotency key of the messages, so
+        that they are sent again even if identical messages have already
+        been sent.
+
+
+    :return: A list of tuples `(locale, message)` where `message` is an
+        object `OutboxMessage`.
+    """
+    return [
+        (
+            locale,
+            OutboxMessage(
+                OutboxMessage.generate_message_key(
+                    registration.registration_id,
+                    parent_email_addresses,
+                    email_subject,
+                    email_content,
+                    tag=tag),
+                registration.registration_id,
+                author_name,
+                author_email_address,
+                parent_email_addresses,
+                email_subject,
+                email_content,
+                attachment_file_path_names=[attachment_file_path_name])
+        )
+        for locale, parent_email_addresses, email_subject, email_content, attachment_file_path_name
+        in build_registration_confirmation_emails(registration, email_template_path)
+    ]
+
+
+def build_database_records(registrations):
+    """
+    Build the records of the applications of families to stage in the
+    table `gf_registration` of the PostgreSQL database.
+
+    The records correspond to the rows of the master list (cf. function
+    `build_registration_rows`), with values converted to the types of the
+    columns of the table, and a line number.
+
+
+    :param registrations: A list of objects `Registration`.
+
+
+    :return: An iterator of tuples of the values of the columns
+        `GF_REGISTRATION_COLUMNS`.
+    """
+    line_number = 0
 
-    return email_subject, email_content
+    for registration in registrations:
+        for row in build_registration_rows(registration):
+            line_number += 1
+            registration_id, registration_time, first_name, last_name, full_name, dob, grade_level = row[:7]
+
+            yield (
+                prettify_registration_id(registration_id) if registration_id != '' else None,
+                datetime.datetime.strptime(registration_time, '%Y-%m-%d %H:%M:%S') if registration_time else None,
+                first_name,
+                last_name,
+                full_name,
+                datetime.datetime.strptime(dob, '%Y-%m-%d').date(),
+                grade_level,
+                *[value or None for value in row[7:]],
+                None,  # The applications are enabled by default.
+                line_number
+            )
 
 
 def build_registration_rows(registration):
@@ -278,175 +427,59 @@ def build_smtp_connection_properties(
     return new_properties
 
 
-def expand_placeholders_value(content, placeholders, ignore_unused_placeholders=False):
-    """
-    Replace the placeholders defined in the given content with their
-    corresponding values.
-
-
-    :param content: The content with placeholders {{placeholder}} to be
-        replaced with their corresponding values.
-
-    :param placeholders: A dictionary where the key corresponds to the
-        name of a placeholder, the value corresponding to the value of the
-        placeholder.
-
-    :param ignore_unused_placeholders: Indicate whether to ignore
-        placeholders that would have been defined but that would have not
-        been declared in the given content.
-
-
-    :return: The content where the placeholders have been replaced with
-        their corresponding values.
-    """
-    # Find the list of placeholder names that have been used in the given
-    # document but that have not been defined with a corresponding value.
-    used_placeholders = set([
-        (match.group(0), match.group(1))
-        for match in REGEX_PLACEHOLDER_NAME.finditer(content)
-    ])
-
-    used_placeholder_names = [name for (_, name) in used_placeholders]
-
-    if used_placeholders:
-        undefined_placeholder_names = [
-            name
-            for name in used_placeholder_names
-            if name not in placeholders
-        ]
-
-        assert len(undefined_placeholder_names) == 0, \
-            "the following placeholders are declared but have not been defined: " \
-            f"{','.join(undefined_placeholder_names)}"
-
-    # Find the list of placeholder names that have been defined but have not
-    # been used in the given document.
-    if placeholders:
-        unused_placeholder_names = [
-            name
-            for name in placeholders
-            if name not in used_placeholder_names
-        ]
-
-        if len(unused_placeholder_names) > 0:
-            assert ignore_unused_placeholders, \
-                "the following placeholders are defined but have not been declared: " \
-                f"{','.join(unused_placeholder_names)}"
-
-    # Replace the placeholders referred in the content by their
-    # corresponding value.
-    for (placeholder_expression, placeholder_name) in used_placeholders:
-        content = content.replace(placeholder_expression, placeholders[placeholder_name])
-
-    return content
-
-
-def export_kml(registrations, kml_file_path_name):
-    """
-
-    :param registrations:
-    :param kml_file_path_name:
-    :return:
-    """
-    # Group the registrations by locations.
-    placemarks = collections.defaultdict(list)
-
-    for registration in registrations:
-        # Retrieve the distinct locations of the parents of this registration.
-        logging.info(
-            "Finding distinct parents' home locations of the registration " 
-            f"{prettify_registration_id(registration.registration_id)}...")
-
-        locations = set([
-            parent.location
-            for parent in registration.parents
-            if parent.location])
-
-        for location in locations:
-            placemarks[location].append(registration)
-
-    # Generate the geographical map of all the distinct locations,
-    # calculating for each location the number of children living there.
-    kml = simplekml.Kml()
-
-    for location, registrations in placemarks.items():
-        children_count = sum([len(registration.children) for registration in registrations])
-        families_count = len(registrations)
-        description = ', '.join([
-            prettify_registration_id(registration.registration_id)
-            for registration in registrations
-        ])
-
-        kml.newpoint(
-            name=f"{children_count} ({families_count})",
-            description=description,
-            coords=[(location.longitude, location.latitude)])
-
-    kml.save(os.path.realpath(os.path.expanduser(kml_file_path_name)))
-
-
-def fetch_processed_registration_ids(spreadsheets_resource, spreadsheet_id):
+def enqueue_registration_confirmation_emails(
+        registration,
+        outbox,
+        email_template_path,
+        author_name,
+        author_email_address,
+        locale=None,
+        tag=None):
     """
-    Return the list of identifications of the registrations that have been
-    already processed and stored in the master list.
-
-
-    :param spreadsheets_resource: An object `googleapiclient.discovery.Resource`
-        returned by the Google API client library.
+    Queue the confirmation e-mails to send to the parents of a family in
+    the outbox, in one transaction.
 
-    :param spreadsheet_id: Identification of the Google Sheets document
-        where all the family registrations have been stored in.
 
+    :param registration: An object `Registration`.
 
-    :return: A list of integers representing all the registrations that
-        have been already processed so far.
-
-
-    :raise ValueError: if the Google Sheets has more than one sheet.
-    """
-    sheet_names = get_sheet_names(spreadsheets_resource, spreadsheet_id)
-    if len(sheet_names) > 1:
-        raise ValueError(f"the output Google spreadsheet must contain one sheet only: {', '.join(sheet_names)}")
-
-    sheet_name = sheet_names[0]
-    rows = read_google_sheet_values(spreadsheets_resource, spreadsheet_id, sheet_name, 'A3:M')
-    return [int(''.join([c for c in values[0] if c.isdigit()])) for values in rows if values[0]]
+    :param outbox: An object `EmailOutbox`.
 
+    :param email_template_path: The absolute path of the folder where
+        localized e-mail templates and files to attach are stored in.
 
-def filter_duplicate_registrations(registrations):
-    """
-    Return a list of registrations where duplicates have been removed.
+    :param author_name: Complete name of the originator of the message.
 
-    A parent may have submitted an application several times.  This may
-    happen for instance when the parent realizes he has previously
-    submitted an application with missing or erroneous information.  The
-    parent then decides to submit a new application to replace the
-    previous one.
+    :param author_email_address: Address of the mailbox to which the author
+        of the message suggests that replies be sent.
 
+    :param locale: An object `Locale`.  If defined, only the e-mail written
+        in this language is queued.
 
-    :param registrations: A list of objects `Registration`.
+    :param tag: A string added to the idempotency key of the e-mails, so
+        that they are queued even if identical e-mails have already been
+        queued without this tag.
 
 
-    :return: A list of unique registrations.
+    :return: The number of e-mails queued.  E-mails already queued are not
+        queued again.
     """
-    # Sort registrations by reversed chronological order.
-    sorted_registrations = sorted(
-        registrations,
-        key=lambda registration: registration.registration_time,
-        reverse=True)
+    messages = [
+        message
+        for locale_, message in build_registration_confirmation_messages(
+            registration,
+            email_template_path,
+            author_name,
+            author_email_address,
+            tag=tag)
+        if locale is None or locale_ == locale
+    ]
 
-    # Add registrations from the more recent to the first submitted ones,
-    # filtering out those that have been already added (the duplicated
-    # oldest registrations are filtered out0.
-    filtered_registrations = dict()
-    for registration in sorted_registrations:
-        if registration.registration_id not in filtered_registrations:
-            filtered_registrations[registration.registration_id] = registration
+    message_count = outbox.enqueue(messages)
+    logging.info(
+        f"Queued {message_count} e-mails for the application "
+        f"{prettify_registration_id(registration.registration_id)}")
 
-    # Return the unique registrations sorted by chronological order.
-    return sorted(
-        filtered_registrations.values(),
-        key=lambda registration: registration.registration_time)
+    return message_count
 
 
 def flatten_list(l):
@@ -482,35 +515,15 @@ def get_registration_confirmation_email_attachment_file_path_name(locale, templa
 
     :return: The content of the localized e-mail template.
     """
-    attachment_file_path_name = os.path.join(template_path, f'{locale}.jpg')
-    if not os.path.exists(attachment_file_path_name):
-        attachment_file_path_name = os.path.join(template_path, f'{ENGLISH_LOCALE}.jpg')
+    for locale_ in (locale, ENGLISH_LOCALE):
+        for file_extension in ATTACHMENT_FILE_EXTENSIONS:
+            attachment_file_path_name = os.path.join(template_path, f'{locale_}.{file_extension}')
+            if os.path.exists(attachment_file_path_name):
+                return attachment_file_path_name
 
     return attachment_file_path_name
 
 
-def get_email_subject(content):
-    """
-    Return the subject of the HTML email taken from the title of the HTML
-    template.
-
-
-    :return: the subject of the HTML email template.
-
-
-    :raise AssertError: If the content of the HTML email template has not
-        been read, of if this HTML has no title defined.
-    """
-    start_offset = content.find('<title>')
-    assert start_offset > 0, "The HTML template has no title defined"
-    start_offset = content.find('>', start_offset) + 1
-
-    end_offset = content.find('</title>', start_offset)
-    assert end_offset > 0, "The HTML template has no title end tag."
-
-    return content[start_offset:end_offset]
-
-
 def get_google_oauth2_token(
         scopes,
         google_credentials_file_path_name=None,
@@ -563,21 +576,6 @@ def get_google_oauth2_token(
     return oauth2_token
 
 
-def get_grade_name(grade_level):
-    """
-    Return the name of an education grade.
-
-
-    :param grade_level: Level of the education grade to return the name.
-
-
-    :return: Name of the specified education grade.
-    """
-    for grade_name, grade_level_ in GRADE_NAMES.items():
-        if grade_level_ == grade_level:
-            return grade_name
-
-
 def get_registration_confirmation_email_template(locale, template_path):
     """
     Return a localized e-mail template.
@@ -597,131 +595,76 @@ def get_registration_confirmation_email_template(locale, template_path):
 
     :return: The content of the localized e-mail template.
     """
-    template_file_path_name = os.path.join(template_path, f'{locale}.html')
-    if not os.path.exists(template_file_path_name):
-        template_file_path_name = os.path.join(template_path, f'{ENGLISH_LOCALE}.html')
-
-    with open(template_file_path_name, 'rt') as fd:
-        return fd.read()
+    return EmailTemplate.load(get_registration_confirmation_email_template_file_path_name(locale, template_path)).content
 
 
-def get_sheet_names(spreadsheets_resource, spreadsheet_id):
+def get_registration_confirmation_email_template_file_path_name(locale, template_path):
     """
-    Return the names of all the sheets of a Google Sheets document.
-
-
-    :param spreadsheets_resource: An object `googleapiclient.discovery.Resource`
-        returned by the Google API client library.
+    Return the absolute path and name of a localized e-mail template.
 
-    :param spreadsheet_id: Identification of a Google Sheet document.
 
+    :param locale: An object `Locale` that references that language of the
+        e-mail template.  If no template corresponds to the specified
+        locale, the functions returns the e-mail template written in
+        English.
 
-    :return: A list of the names of the sheets that this Google Sheets
-        document contains.
-    """
-    spreadsheet_metadata = spreadsheets_resource.get(spreadsheetId=spreadsheet_id).execute()
-    sheets = spreadsheet_metadata['sheets']
-    return [sheet.get('properties', {})['title'] for sheet in sheets]
+    :param template_path: The absolute path of the folder where localized
+        e-mail templates are stored in.
 
 
-def get_sheet_used_row_count(
-        spreadsheets_resource,
-        spreadsheet_id,
-        sheet_name=None):
+    :return: The absolute path and name of the localized e-mail template.
     """
-    Return the number of rows already used in the specified sheet.
-
-    A row is used when at least one of its columns is not empty.
-
-
-    :param spreadsheets_resource: An object `googleapiclient.discovery.Resource`
-        returned by the Google API client library.
-
-    :param spreadsheet_id: Identification of a Google Sheets document.
+    template_file_path_name = os.path.join(template_path, f'{locale}.html')
+    if not os.path.exists(template_file_path_name):
+        template_file_path_name = os.path.join(template_path, f'{ENGLISH_LOCALE}.html')
 
-    :param sheet_name: Name of the sheet to count the number of rows
-        already used, or `None` if the Google Sheets contains just one
-        sheet.
+    return template_file_path_name
 
 
-    :return: The number of rows already used in the specified sheet of a
-        Google Sheets document.
+def index_registrations(registrations, registration_index):
     """
-    # Determine the name of the sheet, if not passed.
-    if sheet_name is None:
-        sheet_names = get_sheet_names(spreadsheets_resource, spreadsheet_id)
-        if len(sheet_names) > 1:
-            raise ValueError(f"the argument 'sheet_name' has not been passed while the Google Sheets contain several sheets: {', '.join(sheet_names)}")
-        sheet_name = sheet_names[0]
-
-    # @patch: Reading each individual row of a sheet is time consuming as
-    #    this sends one request per row to fetch.  For optimization purpose,
-    #    we consider that the first column of each row of a sheet always
-    #    contains a value when the row is not empty.  Therefore, we fetch
-    #    the range composed of the first column of the sheet.  Google Sheets
-    #    return the values of the first columns of every non-empty row.  The
-    #    number of rows returned corresponds to the index of the last row
-    #    that is not empty.
-    row_index = len(read_google_sheet_values(
-        spreadsheets_resource,
-        spreadsheet_id,
-        sheet_name,
-        'A1:A')) + 1
-
-    # Read the column values of each consecutive row until a row is empty.
-    while True:
-        values = read_google_sheet_values(
-            spreadsheets_resource,
-            spreadsheet_id,
-            sheet_name,
-            f'A{row_index}:M{row_index}')
-        if not values:
-            break
-        row_index += 1
-
-    return row_index - 1
+    Index the application forms submitted by the families, and return the
+    most recent application of each family.
 
+    A parent may have submitted an application several times.  This may
+    happen for instance when the parent realizes he has previously
+    submitted an application with missing or erroneous information.  The
+    parent then decides to submit a new application to replace the
+    previous one.  This new application may be submitted before or after
+    the previous application has been processed.
 
-def insert_registration_to_master_list(
-        registration,
-        spreadsheets_resource,
-        spreadsheet_id,
-        sheet_range):
-    """
-    Insert the information of a application to the school bus
-    transportation service to the master list.
 
+    :param registrations: A list of objects `Registration`, in any order.
 
-    :param registration: An object `Registration`.
+    :param registration_index: An object `RegistrationIndex` of the
+        applications indexed so far.  This index is updated with the
+        specified registrations.
 
-    :param spreadsheets_resource: An object `googleapiclient.discovery.Resource`
-        returned by the Google API client library.
 
-    :param spreadsheet_id: Identification of the Google Sheets document
-        used as the master list of the registrations of all the families
-        to the school bus transportation service.
+    :return: An ordered dictionary where the key corresponds to a
+        registration ID and the value corresponds to a tuple
+        `(registration, status)` of the most recent application of the
+        family, and an item of the enumeration `SubmissionStatus` that
+        indicates whether the family submitted its application for the
+        first time, or submitted it again with or without changes.
+    """
+    latest_registrations = collections.OrderedDict()
 
-    :param sheet_range: Range (a row) in the master list sheet where to
-        start inserting the information of this application.
+    for registration in registrations:
+        status = registration_index.update(registration)
+        if status == SubmissionStatus.outdated:
+            continue
 
+        # A family that submits a new or modified application, and that
+        # resubmits it in the same batch, still needs its application to be
+        # processed.
+        _, previous_status = latest_registrations.get(registration.registration_id, (None, None))
+        if previous_status in (SubmissionStatus.new, SubmissionStatus.resubmitted_changed):
+            status = previous_status
 
-    :raise ValueError: If the Google Sheets document contains more than
-        one sheet.
-    """
-    # Find the name of the unique sheet contained in this spreadsheet.
-    sheet_names = get_sheet_names(spreadsheets_resource, spreadsheet_id)
-    if len(sheet_names) > 1:
-        raise ValueError(f"the output Google spreadsheet must contain one sheet only: {', '.join(sheet_names)}")
-    sheet_name = sheet_names[0]
+        latest_registrations[registration.registration_id] = (registration, status)
 
-    spreadsheets_resource.values().update(
-        spreadsheetId=spreadsheet_id,
-        range=f'{sheet_name}!{sheet_range}',
-        valueInputOption='RAW',
-        body={
-            'values': build_registration_rows(registration)
-        }) \
-        .execute()
+    return latest_registrations
 
 
 def load_registrations_from_csv_file(csv_file_path_name, locale):
@@ -803,51 +746,36 @@ def load_registrations_from_google_sheet(
     return registrations
 
 
-def prettify_registration_id(id_):
-    """
-    Convert a application ID to human-readable string.
-
-
-    :param id_: Identification of a application.
-
-
-    :return: A string version of the application ID decomposed in groups
-        of 3 digits separated with a dash character.
-    """
-    segments = []
-    while id_ > 0:
-        segments.append(str(id_ % 1000).zfill(3))
-        id_ //= 1000
-
-    return '-'.join(reversed(segments))
-
-
 def process_registration(
         registration,
         smtp_connection_properties,
-        spreadsheets_resource,
-        spreadsheet_id,
-        sheet_range,
+        master_list,
         author_email_address=None,
         author_name=None,
         no_email=False,
-        template_path=None):
+        template_path=None,
+        mailer=None,
+        outbox=None):
     """
     Process a new application.
 
+    When an outbox is passed, the confirmation e-mails of the application
+    are queued in the outbox, to be sent by a dispatcher.  Otherwise, the
+    confirmation e-mails are sent right away.  In both cases, the
+    application is stored in the master list only afterwards, so that an
+    application which e-mails have not been queued is processed again on
+    the next run; queueing these e-mails again is harmless, as the outbox
+    ignores the messages it already contains.
+
 
     :param registration: An object `Registration`.
 
     :param smtp_connection_properties: Properties to connect to the Simple
         Mail Transfer Protocol (SMTP) server.
 
-    :param spreadsheets_resource: An object `googleapiclient.discovery.Resource`
-        returned by the Google API client library.
-
-    :param spreadsheet_id: Identification of a Google Sheet document.
-
-    :param sheet_range: Range (a row) in the master list sheet where to
-        start inserting the information of this application.
+    :param master_list: An object `GoogleSheetsMasterList` or
+        `SqliteMasterList` where to append the information of this
+        application.
 
     :param author_email_address: Address of the mailbox to which the author
         of the message suggests that replies be sent.
@@ -859,20 +787,29 @@ def process_registration(
 
     :param template_path: The absolute path of the folder where localized
         e-mail templates and files to attach are stored in.
+
+    :param mailer: An object `Mailer` to send the e-mails with.
+
+    :param outbox: An object `EmailOutbox` to queue the e-mails in.
     """
     if not no_email:
-        send_registration_confirmation_email(
-            registration,
-            smtp_connection_properties,
-            template_path,
-            author_name,
-            author_email_address)
+        if outbox:
+            enqueue_registration_confirmation_emails(
+                registration,
+                outbox,
+                template_path,
+                author_name,
+                author_email_address)
+        else:
+            send_registration_confirmation_email(
+                registration,
+                smtp_connection_properties,
+                template_path,
+                author_name,
+                author_email_address,
+                mailer=mailer)
 
-    insert_registration_to_master_list(
-        registration,
-        spreadsheets_resource,
-        spreadsheet_id,
-        sheet_range)
+    master_list.append_registrations([build_registration_rows(registration)])
 
 
 def read_csv_file_values(csv_file_path_name, has_header=True):
@@ -900,35 +837,84 @@ def read_csv_file_values(csv_file_path_name, has_header=True):
         return rows
 
 
-def read_google_sheet_values(
-        spreadsheets_resource,
-        spreadsheet_id,
-        sheet_name,
-        sheet_range):
+def resend_registration_confirmation_emails(
+        registrations,
+        outbox,
+        dispatcher,
+        email_template_path,
+        author_name,
+        author_email_address,
+        locale=None,
+        batch_size=DEFAULT_RESEND_BATCH_SIZE,
+        tag=None):
     """
-    Return the values of the ranges of the sheet of a Google Sheets document.
+    Send again the confirmation e-mails of applications, rendered with the
+    current e-mail templates.
 
+    The e-mails are queued in the outbox and sent by batches of families.
+    The outbox keeps track of the e-mails already sent: an interrupted run
+    resumes where it stopped, as the e-mails already sent are not queued
+    again.  For the same reason, an e-mail which content is identical to
+    an e-mail already sent is not sent again, unless a tag is passed, in
+    which case only the e-mails already sent with this tag are skipped.
 
-    :param spreadsheets_resource: An object `googleapiclient.discovery.Resource`
-        returned by the Google API client library.
 
-    :param spreadsheet_id: Identification of a Google Sheet document.
+    :param registrations: A list of objects `Registration`.
+
+    :param outbox: An object `EmailOutbox`.
+
+    :param dispatcher: An object `OutboxDispatcher` that sends the e-mails
+        queued in the outbox.  The thread of this dispatcher must not be
+        running.
+
+    :param email_template_path: The absolute path of the folder where
+        localized e-mail templates and files to attach are stored in.
+
+    :param author_name: Complete name of the originator of the message.
+
+    :param author_email_address: Address of the mailbox to which the author
+        of the message suggests that replies be sent.
+
+    :param locale: An object `Locale`.  If defined, only the e-mails written
+        in this language are sent.
 
-    :param sheet_name: Name of a sheet in this Google Sheet document.
+    :param batch_size: Number of families which e-mails are sent in one
+        batch.
 
-    :param sheet_range: String representation of the range to return
-        values.
+    :param tag: A string added to the idempotency key of the e-mails, so
+        that they are sent again even if their content has not been
+        modified since they were last sent.  The same tag is to be passed
+        to resume an interrupted run.
 
 
-    :return: A list of a arrays (lists) of values.
+    :return: The number of e-mails sent.
     """
-    sheet_range_values = spreadsheets_resource.values().get(
-        spreadsheetId=spreadsheet_id,
-        range=f'{sheet_name}!{sheet_range}').execute()
+    queued_message_count = 0
+    sent_message_count = 0
+
+    for offset in range(0, len(registrations), batch_size):
+        for registration in registrations[offset:offset + batch_size]:
+            queued_message_count += enqueue_registration_confirmation_emails(
+                registration,
+                outbox,
+                email_template_path,
+                author_name,
+                author_email_address,
+                locale=locale,
+                tag=tag)
+
+        sent_message_count += dispatcher.dispatch()
+
+        logging.info(
+            f"Re-sent the confirmation e-mails of {min(offset + batch_size, len(registrations))}/"
+            f"{len(registrations)} families")
 
-    range_values = sheet_range_values.get('values', [])
+    if registrations and not queued_message_count:
+        logging.warning(
+            "No confirmation e-mail has been queued, as identical e-mails have already "
+            "been sent to these families; use a resend tag to send them again")
 
-    return range_values
+    return sent_message_count
 
 
 def run(arguments):
@@ -938,9 +924,50 @@ def run(arguments):
         build_current_directory_path_name(DEFAULT_GOOGLE_CREDENTIALS_FILE_NAME) if not arguments.google_credentials_file_path_name \
         else os.path.realpath(os.path.expanduser(arguments.google_credentials_file_path_name))
 
+    # Get the absolute file path name where the index of the application
+    # forms submitted by the families is stored in.
+    registration_index_file_path_name = \
+        build_current_directory_path_name(DEFAULT_REGISTRATION_INDEX_FILE_NAME)
+
+    # Check whether the script needs to write the confirmation e-mails to
+    # a folder instead of sending them.
+    email_output_path = arguments.email_output_path \
+        and os.path.realpath(os.path.expanduser(arguments.email_output_path))
+
+    # Check whether the script needs to send e-mails.  The queries of the
+    # families who live around a location, or within an area, only read
+    # the applications.
+    is_email_disabled = arguments.no_email or email_output_path \
+        or arguments.query_location or arguments.query_bounding_box
+
     # Read the properties to connect to the Simple Mail Transfer Protocol
     # (SMTP).
-    smtp_connection_properties = build_smtp_connection_properties(arguments)
+    smtp_connection_properties = None if is_email_disabled \
+        else build_smtp_connection_properties(arguments)
+
+    # Build the mailer that keeps the connections to the SMTP server open
+    # across the e-mails sent to the parents.
+    mailer = None if is_email_disabled \
+        else Mailer(
+            smtp_connection_properties,
+            pool_size=arguments.smtp_pool_size,
+            attachment_cache=AttachmentCache(max_byte_count=arguments.email_attachment_max_size))
+
+    # Build the outbox where the e-mails to send to the parents are queued,
+    # and start the dispatcher that sends these e-mails in the background.
+    outbox = None if is_email_disabled \
+        else EmailOutbox(build_current_directory_path_name(DEFAULT_EMAIL_OUTBOX_FILE_NAME))
+
+    dispatcher = None if is_email_disabled \
+        else OutboxDispatcher(
+            outbox,
+            mailer,
+            concurrency=arguments.smtp_pool_size,
+            rate_limit=arguments.email_rate_limit and arguments.email_rate_limit / 60)
+    # The confirmation e-mails are re-sent by batches, which the dispatcher
+    # sends from the main thread.
+    if dispatcher and not arguments.resend_confirmations:
+        dispatcher.start()
 
     # Get the absolute path of the folder where the e-mail templates and
     # attachment files are stored in.
@@ -976,6 +1003,17 @@ def run(arguments):
         raise ValueError("the name and the e-mail of the author of the e-mails to be sent to "
                          "the parents must be passed")
 
+    # Check that the confirmation e-mails can be re-sent to the families
+    # already stored in the master list.
+    if arguments.resend_confirmations:
+        if arguments.no_email or email_output_path:
+            raise ValueError("the confirmation e-mails cannot be re-sent when e-mails are disabled "
+                             "or written to a folder")
+
+        if not arguments.output_google_spreadsheet_id and not arguments.master_list_file_path_name:
+            raise ValueError("the master list Google spreadsheet ID or SQLite file must be passed to "
+                             "re-send the confirmation e-mails")
+
     # Build the geocoder object if the script needs to geocode parents'
     # address(es).
     if not arguments.no_geocoding and not arguments.google_api_key:
@@ -983,6 +1021,55 @@ def run(arguments):
 
     geocoder = None if arguments.no_geocoding else GoogleGeocoder(arguments.google_api_key)
 
+    # Build the exporter that updates the KML file with the children's homes
+    # across the executions of the main loop.
+    kml_exporter = None if arguments.no_kml or not arguments.output_kml_file_path_name \
+        else KmlExporter(
+            os.path.realpath(os.path.expanduser(arguments.output_kml_file_path_name)),
+            precision=arguments.map_cluster_precision)
+
+    # Build the exporter that writes the children's homes to a GeoJSON file
+    # and/or to GeoJSON tiles.
+    geojson_exporter = None \
+        if not arguments.output_geojson_file_path_name and not arguments.output_geojson_tiles_path \
+        else GeoJsonExporter(
+            geojson_file_path_name=arguments.output_geojson_file_path_name
+                and os.path.realpath(os.path.expanduser(arguments.output_geojson_file_path_name)),
+            tiles_path=arguments.output_geojson_tiles_path
+                and os.path.realpath(os.path.expanduser(arguments.output_geojson_tiles_path)),
+            min_zoom=arguments.geojson_tile_min_zoom,
+            max_zoom=arguments.geojson_tile_max_zoom)
+
+    # Build the loader that imports the applications of the families into
+    # the PostgreSQL database of the school bus platform.
+    if arguments.database_dsn and not arguments.database_school_id:
+        raise ValueError("the identification of the school must be passed to import the applications "
+                         "into the database")
+
+    if arguments.database_incremental and not arguments.database_bulk:
+        raise ValueError("the incremental import into the database relies on the function gf_main_bulk, "
+                         "which must have been validated and enabled with --database-bulk")
+
+    if arguments.upmd_database_file_path_name and not arguments.database_dsn:
+        raise ValueError("the connection string to the database must be passed to export the children "
+                         "registered to the platform")
+
+    upmd_database_file_path_name = arguments.upmd_database_file_path_name \
+        and os.path.realpath(os.path.expanduser(arguments.upmd_database_file_path_name))
+
+    # The loader depends on the package `psycopg2`, which is an optional
+    # dependency of this tool (`pip install ...[database]`), imported only
+    # when the applications are to be imported into the database.
+    database_loader = None
+    if arguments.database_dsn:
+        from .database import RegistrationDatabaseLoader
+
+        database_loader = RegistrationDatabaseLoader(
+            arguments.database_dsn,
+            arguments.database_school_id,
+            bulk=arguments.database_bulk,
+            incremental=arguments.database_incremental)
+
     # Check whether the script needs to loop for even until the user
     # decides to stop it
     does_loop = arguments.loop and input_google_spreadsheet_id
@@ -1007,6 +1094,38 @@ def run(arguments):
         service = googleapiclient.discovery.build('sheets', 'v4', credentials=oauth2_token, cache_discovery=False)
         spreadsheets_resource = service.spreadsheets()
 
+    # Build the master list where the script stores the information from
+    # the application forms submitted by the families.  When the master
+    # list is stored in a local SQLite database, the Google Sheets master
+    # list, if any, is a view published from this local master list at
+    # regular intervals.
+    google_sheets_master_list = None if not output_google_spreadsheet_id \
+        else GoogleSheetsMasterList(spreadsheets_resource, output_google_spreadsheet_id)
+
+    if arguments.master_list_file_path_name:
+        master_list = SqliteMasterList(os.path.realpath(os.path.expanduser(arguments.master_list_file_path_name)))
+        published_master_list = google_sheets_master_list
+
+        # Seed an empty local master list with the registrations already
+        # published to the Google Sheets master list, such as when the local
+        # master list is created for a season already started.  Otherwise the
+        # families already processed would be considered as new, and their
+        # confirmation e-mails would be sent again.
+        if published_master_list and not master_list.fetch_registration_blocks():
+            logging.info("Seeding the local master list with the Google Sheets master list...")
+            synchronize_master_lists(published_master_list, master_list)
+    else:
+        master_list = google_sheets_master_list
+        published_master_list = None
+
+    last_publication_time = None
+
+    # Indicate whether the applications need to be imported again into the
+    # database of the school bus platform, as some applications have been
+    # added or modified since the last import, or as no import has succeeded
+    # yet since the script started.
+    is_database_outdated = True
+
     # Execute the main loop of the application.
     while True:
         try:
@@ -1030,48 +1149,240 @@ def run(arguments):
                     spreadsheets_resource,
                     geocoder=geocoder)
 
+            # Write the confirmation e-mails of the most recent application of
+            # each family to a folder, without updating the index of the
+            # applications nor the master list.
+            if email_output_path:
+                write_registration_confirmation_emails(
+                    [registration for registration, _ in index_registrations(registrations, RegistrationIndex()).values()],
+                    email_output_path,
+                    email_template_path,
+                    arguments.author_name,
+                    arguments.author_email_address,
+                    output_format=EmailOutputFormat[arguments.email_output_format],
+                    max_workers=arguments.email_output_workers,
+                    attachment_max_byte_count=arguments.email_attachment_max_size)
+
+                break
+
+            # Send again the confirmation e-mails to the families already
+            # stored in the master list, using the most recent application of
+            # each family, without updating the index of the applications.
+            if arguments.resend_confirmations:
+                processed_registration_ids = set(master_list.fetch_registration_blocks().keys())
+
+                from_registration_id = arguments.resend_from_registration_id \
+                    and parse_registration_id(arguments.resend_from_registration_id)
+                to_registration_id = arguments.resend_to_registration_id \
+                    and parse_registration_id(arguments.resend_to_registration_id)
+
+                resent_registrations = sorted(
+                    [
+                        registration
+                        for registration, _ in index_registrations(registrations, RegistrationIndex()).values()
+                        if registration.registration_id in processed_registration_ids
+                           and (from_registration_id is None or registration.registration_id >= from_registration_id)
+                           and (to_registration_id is None or registration.registration_id <= to_registration_id)
+                    ],
+                    key=lambda registration: registration.registration_id)
+
+                resend_registration_confirmation_emails(
+                    resent_registrations,
+                    outbox,
+                    dispatcher,
+                    email_template_path,
+                    arguments.author_name,
+                    arguments.author_email_address,
+                    locale=arguments.resend_locale and Locale(arguments.resend_locale),
+                    tag=arguments.resend_tag)
+
+                break
+
+            # Find the families who live around a location, or within an area,
+            # using the most recent application of each family, and write them
+            # to the standard output.
+            if arguments.query_location or arguments.query_bounding_box:
+                spatial_index = SpatialIndex([
+                    registration
+                    for registration, _ in index_registrations(registrations, RegistrationIndex()).values()
+                ])
+
+                if arguments.query_bounding_box:
+                    south, west, north, east = arguments.query_bounding_box
+                    results = [
+                        (registration, location, None)
+                        for registration, location
+                        in spatial_index.find_within_bounding_box((south, west), (north, east))
+                    ]
+                elif arguments.query_radius:
+                    results = spatial_index.find_within_radius(arguments.query_location, arguments.query_radius)
+                else:
+                    results = spatial_index.find_nearest(arguments.query_location, arguments.query_nearest)
+
+                write_spatial_query_results(results, sys.stdout)
+
+                break
+
+            # Index the registrations and keep the most recent application of
+            # each family.  The index is saved only once the registrations have
+            # been successfully processed.
+            registration_index = RegistrationIndex.load(registration_index_file_path_name)
+            latest_registrations = index_registrations(registrations, registration_index)
+            registrations = [registration for registration, _ in latest_registrations.values()]
+
+            # Determine the applications that families submitted, or modified,
+            # since they were last indexed.
+            changed_registration_ids = set([
+                registration.registration_id
+                for registration, status in latest_registrations.values()
+                if status in (SubmissionStatus.new, SubmissionStatus.resubmitted_changed)
+            ])
+
+            if changed_registration_ids:
+                is_database_outdated = True
+
             # Process and store the registrations in the master list.
-            if output_google_spreadsheet_id:
-                # Retrieve the list of the registrations that have been already
-                # processed and stored in the master list (the output Google Sheets
-                # document).
-                processed_registration_ids = fetch_processed_registration_ids(
-                    spreadsheets_resource,
-                    output_google_spreadsheet_id)
+            if master_list:
+                # Retrieve the rows of the registrations that have been already
+                # processed and stored in the master list.
+                registration_blocks = master_list.fetch_registration_blocks()
 
                 # Determine the list of recent registrations not already processed.
-                new_registrations = [
+                new_registrations = sorted(
+                    [
+                        registration
+                        for registration in registrations
+                        if registration.registration_id not in registration_blocks
+                    ],
+                    key=lambda registration: registration.registration_time)
+
+                # Determine the list of registrations that families modified after
+                # they have been processed.
+                modified_registrations = [
                     registration
-                    for registration in registrations
-                    if registration.registration_id not in processed_registration_ids
+                    for registration, status in latest_registrations.values()
+                    if status == SubmissionStatus.resubmitted_changed
+                       and registration.registration_id in registration_blocks
                 ]
 
-                if new_registrations:
-                    # Determine the number of rows that are currently used in the master
-                    # list Google Sheets.  This number doesn't necessarily correspond to
-                    # the number of registrations as a application may contain several
-                    # children.
-                    row_count = get_sheet_used_row_count(
-                        spreadsheets_resource,
-                        output_google_spreadsheet_id)
-
-                    for registration in filter_duplicate_registrations(new_registrations):
-                        process_registration(
-                            registration,
-                            smtp_connection_properties,
-                            spreadsheets_resource,
-                            output_google_spreadsheet_id,
-                            f'A{row_count + 1}',
-                            author_email_address=arguments.author_email_address,
-                            author_name=arguments.author_name,
-                            no_email=arguments.no_email,
-                            template_path=email_template_path)
-
-                        row_count += len(registration.children)
+                if modified_registrations:
+                    if arguments.upsert:
+                        master_list.update_registrations(
+                            [
+                                (registration.registration_id, build_registration_rows(registration))
+                                for registration in modified_registrations
+                            ],
+                            registration_blocks=registration_blocks)
+                    else:
+                        for registration in modified_registrations:
+                            logging.warning(
+                                "The family has modified its application "
+                                f"{prettify_registration_id(registration.registration_id)}; "
+                                "the master list needs to be updated")
+
+                for registration in new_registrations:
+                    process_registration(
+                        registration,
+                        smtp_connection_properties,
+                        master_list,
+                        author_email_address=arguments.author_email_address,
+                        author_name=arguments.author_name,
+                        no_email=arguments.no_email,
+                        template_path=email_template_path,
+                        mailer=mailer,
+                        outbox=outbox)
+
+            registration_index.save(registration_index_file_path_name)
+
+            # Publish the local master list to the Google Sheets master list, if
+            # the publication interval has elapsed since the last publication.
+            if published_master_list \
+               and (last_publication_time is None
+                    or time.time() - last_publication_time >= arguments.master_list_sync_interval):
+                synchronize_master_lists(master_list, published_master_list)
+                last_publication_time = time.time()
+
+            # Import the applications of the families into the database of the
+            # school bus platform, only if some applications have been added or
+            # modified since the last import.
+            if database_loader and is_database_outdated:
+                database_loader.load(build_database_records(registrations))
+
+                # The export is written to a temporary file which is then renamed,
+                # so that a reader never sees a partially written file.
+                if upmd_database_file_path_name:
+                    temporary_file_path_name = f'{upmd_database_file_path_name}.tmp'
+                    with open(temporary_file_path_name, 'wt', newline='') as fd:
+                        database_loader.export_upmd_database(fd)
+
+                    os.replace(temporary_file_path_name, upmd_database_file_path_name)
+
+                is_database_outdated = False
 
             # Generate the KML file with children's homes.
-            if not arguments.no_kml and arguments.output_kml_file_path_name:
-                export_kml(registrations, arguments.output_kml_file_path_name)
+            if kml_exporter:
+                kml_exporter.update(registrations)
+                kml_exporter.export()
+
+            # Generate the GeoJSON file and tiles with children's homes.
+            if geojson_exporter:
+                geojson_exporter.export(registrations)
+
+            # Warn about the homes abnormally far from the school, whose address
+            # may have been wrongly entered or geocoded.  Only the applications
+            # new or modified since they were last indexed are warned about, so
+            # that the same warnings are not repeated on every pass.
+            if arguments.school_location:
+                warn_distant_homes(
+                    registrations,
+                    arguments.school_location,
+                    arguments.max_home_distance,
+                    registration_ids=changed_registration_ids)
+
+            # Generate the report of the clusters of the children's homes.
+            if arguments.map_cluster_report_file_path_name:
+                clusters = build_location_clusters(
+                    registrations,
+                    precision=arguments.map_cluster_precision or DEFAULT_GEOHASH_PRECISION)
+                logging.info(f"Grouped the children's homes in {len(clusters)} clusters")
+                write_location_cluster_report(
+                    clusters,
+                    os.path.realpath(os.path.expanduser(arguments.map_cluster_report_file_path_name)))
+
+            # Propose the bus stops closest to the children's homes.
+            if arguments.bus_stop_report_file_path_name:
+                plan = propose_bus_stops(
+                    registrations,
+                    arguments.bus_stop_count,
+                    max_walking_distance=arguments.bus_stop_max_walking_distance,
+                    max_stop_count=arguments.bus_stop_max_count,
+                    seed=0)
+                logging.info(plan.summarize())
+                write_bus_stop_report(
+                    plan,
+                    os.path.realpath(os.path.expanduser(arguments.bus_stop_report_file_path_name)))
+
+            # Assign the families to the buses.
+            if arguments.bus_assignment_report_file_path_name:
+                assignment = assign_families_to_buses(
+                    registrations,
+                    arguments.bus_capacities,
+                    arguments.bus_depot_location,
+                    arguments.school_location,
+                    seed=0)
+                logging.info(assignment.summarize())
+                write_bus_assignment_report(
+                    assignment,
+                    os.path.realpath(os.path.expanduser(arguments.bus_assignment_report_file_path_name)))
+
+            # Generate the report of the children possibly registered by several
+            # families.
+            if arguments.duplicate_children_report_file_path_name:
+                candidates = find_duplicate_children(registrations)
+                logging.info(f"Found {len(candidates)} possible duplicate children")
+                write_duplicate_children_report(
+                    candidates,
+                    os.path.realpath(os.path.expanduser(arguments.duplicate_children_report_file_path_name)))
 
             # Stop the script if the user didn't request it to run for ever.
             if not does_loop:
@@ -1087,22 +1398,28 @@ def run(arguments):
             traceback.print_exc()
             time.sleep(DEFAULT_IDLE_TIME_BETWEEN_CONSECUTIVE_EXECUTION)
 
+    # Stop the dispatcher and send the e-mails that remain in the outbox.
+    if dispatcher:
+        dispatcher.stop()
+
+    if mailer:
+        mailer.close()
+
+    if database_loader:
+        database_loader.close()
+
 
 def send_registration_confirmation_email(
         registration,
         smtp_connection_properties,
         email_template_path,
         author_name,
-        author_email_address):
+        author_email_address,
+        mailer=None):
     """
     Send a confirmation e-mail to the parents of a family who submitted a
-    application to the school bus transportation service.
-
-    The function optimizes the number of e-mail to be sent to the parents,
-    by grouping parents by their preferred languages.  If two parents (or
-    more) share the same preferred language, the function groups them in
-    a same list of recipients which one email, written in this language,
-    is sent to.
+    application to the school bus transportation service (cf. function
+    `build_registration_confirmation_emails`).
 
 
     :param registration: An object `Registration`.
@@ -1117,30 +1434,300 @@ def send_registration_confirmation_email(
 
     :param author_email_address: Address of the mailbox to which the author
         of the message suggests that replies be sent.
+
+    :param mailer: An object `Mailer` that keeps the connections to the SMTP
+        server open across messages.  If not passed, the function opens a
+        new connection to the SMTP server for each message.
     """
-    # Group the parents by their preferred languages. Well, they are
-    # supposed to be only 2 parents, but who knows in the future.
-    parents_locale_mapping = collections.defaultdict(list)
-    for parent in registration.parents:
-        parents_locale_mapping[parent.locale].append(parent)
+    for locale, parent_email_addresses, email_subject, email_content, attachment_file_path_name \
+            in build_registration_confirmation_emails(registration, email_template_path):
+        logging.info(f'Sending email in "{locale}" to {", ".join(parent_email_addresses)}...')
+        if mailer:
+            mailer.send(
+                author_name,
+                author_email_address,
+                parent_email_addresses,
+                email_subject,
+                email_content,
+                attachments=[attachment_file_path_name])
+        else:
+            email_util.send_email(
+                smtp_connection_properties.hostname,
+                smtp_connection_properties.username,
+                smtp_connection_properties.password,
+                author_name,
+                author_email_address,
+                parent_email_addresses,
+                email_subject,
+                email_content,
+                file_path_names=attachment_file_path_name,
+                port_number=smtp_connection_properties.port_number)
+
+
+def warn_distant_homes(registrations, school_location, max_distance=None, registration_ids=None):
+    """
+    Log a warning for each home abnormally far from the school.
 
-    for locale, parents in parents_locale_mapping.items():
-        email_subject, email_content = \
-            build_registration_confirmation_email_content(registration, locale, email_template_path)
 
-        parent_email_addresses = [parent.email_address for parent in parents]
+    :param registrations: A list of objects `Registration`.
 
-        logging.info(f'Sending email in "{locale}" to {", ".join(parent_email_addresses)}...')
-        email_util.send_email(
-            smtp_connection_properties.hostname,
-            smtp_connection_properties.username,
-            smtp_connection_properties.password,
+    :param school_location: A tuple `(latitude, longitude)` of the school.
+
+    :param max_distance: Distance in meters from the school beyond which a
+        home is abnormally far.  If not defined, a home is abnormally far
+        when its distance is an outlier among the distances of all the homes
+        (cf. function `flag_outliers`).
+
+    :param registration_ids: A set of the identifications of the
+        applications which homes are to be warned about, such as the
+        applications new or modified since the last check.  The homes of
+        the other applications still take part in the detection of the
+        outliers.  If not defined, all the homes are warned about.
+
+
+    :return: The number of homes abnormally far from the school, among the
+        homes warned about.
+    """
+    registration_indices, latitudes, longitudes = get_home_locations(registrations)
+    distances = calculate_distances_to_point(latitudes, longitudes, school_location)
+    is_outlier = flag_outliers(distances, max_distance=max_distance)
+
+    if registration_ids is not None:
+        is_outlier &= np.array(
+            [registrations[i].registration_id in registration_ids for i in registration_indices],
+            dtype=bool)
+
+    for i in np.flatnonzero(is_outlier):
+        logging.warning(
+            f"The home of the family {prettify_registration_id(registrations[registration_indices[i]].registration_id)} "
+            f"is {distances[i] / 1000:,.1f} km away from the school; check its address")
+
+    return int(is_outlier.sum())
+
+
+def write_bus_assignment_report(assignment, csv_file_path_name):
+    """
+    Write the assignment of the families to buses to a CSV file.
+
+    Each row corresponds to a family, in the order the bus picks up the
+    families.  The families that couldn't be assigned to a bus are written
+    at the end, without bus.
+
+
+    :param assignment: An object `BusAssignment`.
+
+    :param csv_file_path_name: Absolute path and name of the CSV file.
+    """
+    with open(csv_file_path_name, 'wt', newline='') as fd:
+        writer = csv.writer(fd)
+
+        writer.writerow(['bus', 'pickup_rank', 'registration_id', 'children_count', 'grade_levels'])
+
+        def write_row(bus, pickup_rank, registration):
+            writer.writerow([
+                bus,
+                pickup_rank,
+                prettify_registration_id(registration.registration_id),
+                len(registration.children),
+                ', '.join([get_grade_name(child.grade_level) or '' for child in registration.children])
+            ])
+
+        for route in assignment.routes:
+            for pickup_rank, registration in enumerate(route.registrations, start=1):
+                write_row(route.bus_index + 1, pickup_rank, registration)
+
+        for registration in assignment.unassigned_registrations:
+            write_row('', '', registration)
+
+
+def write_bus_stop_report(plan, csv_file_path_name):
+    """
+    Write the bus stops proposed to the families to a CSV file.
+
+
+    :param plan: An object `BusStopPlan`.
+
+    :param csv_file_path_name: Absolute path and name of the CSV file.
+    """
+    with open(csv_file_path_name, 'wt', newline='') as fd:
+        writer = csv.writer(fd)
+
+        writer.writerow([
+            'latitude',
+            'longitude',
+            'children_count',
+            'home_count',
+            'mean_walking_distance',
+            'max_walking_distance',
+            'registration_ids'
+        ])
+
+        for stop in plan.stops:
+            writer.writerow([
+                f'{stop.latitude:.6f}',
+                f'{stop.longitude:.6f}',
+                stop.children_count,
+                stop.home_count,
+                f'{stop.mean_walking_distance:.0f}',
+                f'{stop.max_walking_distance:.0f}',
+                ', '.join([prettify_registration_id(registration_id) for registration_id in stop.registration_ids])
+            ])
+
+
+def write_location_cluster_report(clusters, csv_file_path_name):
+    """
+    Write the report of the clusters of the families' home locations to a
+    CSV file.
+
+
+    :param clusters: A list of objects `LocationCluster`.
+
+    :param csv_file_path_name: Absolute path and name of the CSV file.
+    """
+    with open(csv_file_path_name, 'wt', newline='') as fd:
+        writer = csv.writer(fd)
+
+        writer.writerow(['geohash', 'latitude', 'longitude', 'children_count', 'family_count', 'registration_ids'])
+
+        for cluster in clusters:
+            latitude, longitude = cluster.centroid
+            writer.writerow([
+                cluster.key,
+                f'{latitude:.6f}',
+                f'{longitude:.6f}',
+                cluster.children_count,
+                cluster.family_count,
+                ', '.join([prettify_registration_id(registration_id) for registration_id in cluster.registration_ids])
+            ])
+
+
+def write_registration_confirmation_emails(
+        registrations,
+        output_path,
+        email_template_path,
+        author_name,
+        author_email_address,
+        output_format=EmailOutputFormat.eml,
+        max_workers=None,
+        attachment_max_byte_count=None):
+    """
+    Write the confirmation e-mails of applications to a folder, instead of
+    sending them.
+
+    The e-mails written by two runs can be compared to check the changes
+    of the e-mail templates: the name of the file of an e-mail, and the
+    bytes of this e-mail, only depend on the application and on the
+    templates.
+
+
+    :param registrations: A list of objects `Registration`.
+
+    :param output_path: The absolute path of the folder to write the
+        e-mails to.
+
+    :param email_template_path: The absolute path of the folder where
+        localized e-mail templates and files to attach are stored in.
+
+    :param author_name: Complete name of the originator of the message.
+
+    :param author_email_address: Address of the mailbox to which the author
+        of the message suggests that replies be sent.
+
+    :param output_format: An item of the enumeration `EmailOutputFormat`.
+
+    :param max_workers: Number of worker processes rendering the e-mails.
+
+    :param attachment_max_byte_count: Maximal size in bytes of an image
+        attachment (cf. class `AttachmentCache`).
+
+
+    :return: The number of e-mails written.
+    """
+    messages = [
+        (
+            build_email_file_name(registration.registration_id, locale),
+            message,
+            registration.registration_time.timestamp()
+        )
+        for registration in registrations
+        for locale, message in build_registration_confirmation_messages(
+            registration,
+            email_template_path,
             author_name,
-            author_email_address,
-            parent_email_addresses,
-            email_subject,
-            email_content,
-            file_path_names=get_registration_confirmation_email_attachment_file_path_name(
-                registration.locale,
-                email_template_path),
-            port_number=smtp_connection_properties.port_number)
+            author_email_address)
+    ]
+
+    start_time = time.time()
+    message_count, byte_count = write_email_messages(
+        messages,
+        output_path,
+        output_format=output_format,
+        max_workers=max_workers,
+        attachment_max_byte_count=attachment_max_byte_count)
+
+    logging.info(
+        f"Wrote {message_count} e-mails ({byte_count} bytes) to {output_path} "
+        f"in {time.time() - start_time:.2f}s")
+
+    return message_count
+
+
+def write_spatial_query_results(results, stream):
+    """
+    Write the homes of the families found around a location, or within an
+    area, in CSV format.
+
+
+    :param results: A list of tuples `(registration, location, distance)`
+        where `distance` is `None` when the homes have not been searched
+        around a location.
+
+    :param stream: A text stream to write the results to.
+    """
+    writer = csv.writer(stream)
+
+    writer.writerow(['registration_id', 'latitude', 'longitude', 'distance', 'children', 'parent_email_addresses'])
+
+    for registration, location, distance in results:
+        writer.writerow([
+            prettify_registration_id(registration.registration_id),
+            f'{location.latitude:.6f}',
+            f'{location.longitude:.6f}',
+            '' if distance is None else f'{distance:.0f}',
+            ', '.join([child.fullname for child in registration.children]),
+            ', '.join([parent.email_address for parent in registration.parents if parent.email_address])
+        ])
+
+
+def write_duplicate_children_report(candidates, csv_file_path_name):
+    """
+    Write the report of the children possibly registered by several
+    families to a CSV file, to be reviewed by the staff.
+
+
+    :param candidates: A list of objects `DuplicateChildCandidate`.
+
+    :param csv_file_path_name: Absolute path and name of the CSV file.
+    """
+    with open(csv_file_path_name, 'wt', newline='') as fd:
+        writer = csv.writer(fd)
+
+        writer.writerow([
+            'score',
+            'registration_id_1', 'child_full_name_1', 'child_dob_1', 'grade_level_1', 'parent_email_addresses_1',
+            'registration_id_2', 'child_full_name_2', 'child_dob_2', 'grade_level_2', 'parent_email_addresses_2',
+        ])
+
+        for candidate in candidates:
+            row = [f'{candidate.score:.2f}']
+
+            for registration, child in (candidate.first, candidate.second):
+                row.extend([
+                    prettify_registration_id(registration.registration_id),
+                    child.fullname,
+                    child.dob.strftime('%Y-%m-%d'),
+                    child.grade_level,
+                    ', '.join([parent.email_address for parent in registration.parents if parent.email_address])
+                ])
+
+            writer.writerow(row)
@@ -0,0 +1,387 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+from .model import get_grade_name
+from .model import prettify_registration_id
+
+
+# Number of characters the GeoJSON writer buffers before writing them to
+# the underlying stream.
+GEOJSON_WRITER_BUFFER_SIZE = 64 * 1024
+
+# Number of decimals of the coordinates of the features (about 10 cm).
+COORDINATE_DECIMAL_COUNT = 6
+
+# Default zoom levels of the tiles the features are split in.  A tile of
+# the zoom level 12 covers about 10 kilometers, and a tile of the zoom
+# level 16 covers about 600 meters.
+DEFAULT_TILE_MIN_ZOOM = 12
+DEFAULT_TILE_MAX_ZOOM = 16
+
+# Name of the file, stored in the folder of the tiles, that describes
+# these tiles.
+TILES_METADATA_FILE_NAME = 'metadata.json'
+
+
+class GeoJsonWriter:
+    """
+    Write a GeoJSON feature collection to a binary stream, feature by
+    feature, without building the collection in memory.
+    """
+    def __init__(self, stream):
+        """
+        Build a new object `GeoJsonWriter`, and write the header of the
+        feature collection.
+
+
+        :param stream: A binary file-like object to write the collection to.
+        """
+        self.__stream = stream
+        self.__buffer = []
+        self.__buffer_size = 0
+        self.__feature_count = 0
+
+        self.__write('{"type":"FeatureCollection","features":[')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+    def __write(self, text):
+        self.__buffer.append(text)
+        self.__buffer_size += len(text)
+        if self.__buffer_size >= GEOJSON_WRITER_BUFFER_SIZE:
+            self.flush()
+
+    def close(self):
+        """
+        Write the end of the feature collection.
+        """
+        self.__write('\n]}\n')
+        self.flush()
+
+    @property
+    def feature_count(self):
+        return self.__feature_count
+
+    def flush(self):
+        """
+        Write the buffered features to the underlying stream.
+        """
+        if self.__buffer:
+            self.__stream.write(''.join(self.__buffer).encode('utf-8'))
+            self.__buffer = []
+            self.__buffer_size = 0
+
+    def write_feature(self, longitude, latitude, properties):
+        """
+        Write a point feature.
+
+
+        :param longitude: Longitude of the point.
+
+        :param latitude: Latitude of the point.
+
+        :param properties: A JSON-serializable dictionary of the properties
+            of the feature.
+        """
+        self.__write(
+            (',\n' if self.__feature_count else '\n') +
+            '{"type":"Feature","geometry":{"type":"Point","coordinates":'
+            f'[{longitude:.{COORDINATE_DECIMAL_COUNT}f},{latitude:.{COORDINATE_DECIMAL_COUNT}f}]}},'
+            f'"properties":{json.dumps(properties, ensure_ascii=False, separators=(",", ":"))}}}')
+        self.__feature_count += 1
+
+
+class GeoJsonExporter:
+    """
+    Export the home locations of the families to a GeoJSON file, and/or to
+    a folder of GeoJSON tiles.
+
+    The tiles follow the `z/x/y` scheme of the web maps, so that a map
+    loads only the features of the tiles it displays.  The file and the
+    tiles are written again only when their features have changed.
+    """
+    def __init__(
+            self,
+            geojson_file_path_name=None,
+            tiles_path=None,
+            min_zoom=DEFAULT_TILE_MIN_ZOOM,
+            max_zoom=DEFAULT_TILE_MAX_ZOOM):
+        """
+        Build a new object `GeoJsonExporter`.
+
+
+        :param geojson_file_path_name: Absolute path and name of the GeoJSON
+            file to write all the features to.
+
+        :param tiles_path: Absolute path of the folder to write the tiles to.
+
+        :param min_zoom: Smallest zoom level of the tiles.
+
+        :param max_zoom: Largest zoom level of the tiles.
+        """
+        if min_zoom > max_zoom:
+            raise ValueError("the smallest zoom level of the tiles must not exceed the largest zoom level")
+
+        self.__geojson_file_path_name = geojson_file_path_name
+        self.__tiles_path = tiles_path
+        self.__min_zoom = min_zoom
+        self.__max_zoom = max_zoom
+        self.__content_digest = None
+
+    def export(self, registrations):
+        """
+        Write the features of the home locations of the families if they
+        have changed since the last export.
+
+        The file and the tiles are written to temporary locations which are
+        then renamed, so that a reader never sees partially written data.
+
+
+        :param registrations: A list of objects `Registration` of the most
+            recent application of each family.
+
+
+        :return: `True` if the features have been written; `False` otherwise.
+        """
+        features = build_features(registrations)
+
+        content_digest = calculate_features_digest(features)
+        if content_digest == self.__content_digest:
+            return False
+
+        if self.__geojson_file_path_name:
+            temporary_file_path_name = f'{self.__geojson_file_path_name}.tmp'
+            with open(temporary_file_path_name, 'wb') as stream:
+                write_features(stream, features)
+
+            os.replace(temporary_file_path_name, self.__geojson_file_path_name)
+            logging.info(f"Wrote {len(features)} features to the GeoJSON file {self.__geojson_file_path_name}")
+
+        if self.__tiles_path:
+            tile_count = write_tiles(self.__tiles_path, features, self.__min_zoom, self.__max_zoom)
+            logging.info(f"Wrote {len(features)} features to {tile_count} GeoJSON tiles in {self.__tiles_path}")
+
+        self.__content_digest = content_digest
+
+        return True
+
+
+def build_features(registrations):
+    """
+    Return the features of the home locations of the families, sorted by
+    application ID and by location, so that the same applications produce
+    the same list.
+
+
+    :param registrations: A list of objects `Registration`.
+
+
+    :return: A list of tuples `(longitude, latitude, properties)`.
+    """
+    features = []
+
+    for registration in sorted(registrations, key=lambda registration: registration.registration_id):
+        locations = sorted(
+            set([(parent.location.longitude, parent.location.latitude)
+                 for parent in registration.parents if parent.location]))
+
+        if not locations:
+            continue
+
+        properties = {
+            'registration_id': prettify_registration_id(registration.registration_id),
+            'children_count': len(registration.children),
+            'grades': [get_grade_name(child.grade_level) for child in registration.children],
+            'locale': str(registration.locale),
+            'is_ape_member': registration.is_ape_member,
+        }
+
+        for longitude, latitude in locations:
+            features.append((longitude, latitude, properties))
+
+    return features
+
+
+def calculate_features_digest(features):
+    """
+    Return a digest of features, updated feature by feature.
+
+    The features of a same family share the same properties, which are
+    serialized once per family.
+
+
+    :param features: A list of tuples `(longitude, latitude, properties)`.
+
+
+    :return: A hexadecimal string of the MD5 digest of the features.
+    """
+    digest = hashlib.md5()
+    last_properties = None
+
+    for longitude, latitude, properties in features:
+        if properties is not last_properties:
+            digest.update(json.dumps(properties, sort_keys=True).encode())
+            last_properties = properties
+
+        digest.update(f'\x1f{longitude}\x1f{latitude}\x1e'.encode())
+
+    return digest.hexdigest()
+
+
+def calculate_tile_coordinates(longitudes, latitudes, zoom):
+    """
+    Return the tiles of the Web Mercator projection that contain points.
+
+
+    :param longitudes: An array of the longitudes of the points.
+
+    :param latitudes: An array of the latitudes of the points.
+
+    :param zoom: Zoom level of the tiles.
+
+
+    :return: A tuple `(xs, ys)` of arrays of the column and the row of the
+        tile of each point, the tile `(0, 0)` being at the north-west.
+    """
+    tile_count = 2 ** zoom
+    latitudes = np.radians(np.clip(latitudes, -85.0511, 85.0511))
+
+    xs = np.floor((np.asarray(longitudes) + 180.0) / 360.0 * tile_count).astype(int)
+    ys = np.floor((1.0 - np.arcsinh(np.tan(latitudes)) / np.pi) / 2.0 * tile_count).astype(int)
+
+    return np.clip(xs, 0, tile_count - 1), np.clip(ys, 0, tile_count - 1)
+
+
+def write_features(stream, features):
+    """
+    Write features to a GeoJSON feature collection.
+
+
+    :param stream: A binary file-like object to write the collection to.
+
+    :param features: A list of tuples `(longitude, latitude, properties)`.
+    """
+    with GeoJsonWriter(stream) as writer:
+        for longitude, latitude, properties in features:
+            writer.write_feature(longitude, latitude, properties)
+
+
+def write_tiles(tiles_path, features, min_zoom=DEFAULT_TILE_MIN_ZOOM, max_zoom=DEFAULT_TILE_MAX_ZOOM):
+    """
+    Write features to GeoJSON tiles, one file `z/x/y.geojson` per tile that
+    contains at least one feature, and a file that describes these tiles.
+
+    The tiles are written to a new folder, named after the path of the
+    tiles followed by a version number, and the path of the tiles is a
+    symbolic link atomically replaced to point to this new folder, so that
+    a reader always finds a complete set of tiles.  The folder of the
+    previous version is then deleted.
+
+
+    :param tiles_path: Absolute path of the folder to write the tiles to.
+
+    :param features: A list of tuples `(longitude, latitude, properties)`.
+
+    :param min_zoom: Smallest zoom level of the tiles.
+
+    :param max_zoom: Largest zoom level of the tiles.
+
+
+    :return: The number of tiles written.
+    """
+    version_path = f'{tiles_path}.{int(time.time() * 1000000)}'
+    os.makedirs(version_path)
+
+    longitudes = np.array([longitude for longitude, _, _ in features], dtype=float)
+    latitudes = np.array([latitude for _, latitude, _ in features], dtype=float)
+
+    tile_count = 0
+
+    for zoom in range(min_zoom, max_zoom + 1):
+        xs, ys = calculate_tile_coordinates(longitudes, latitudes, zoom)
+
+        # Group the features by tile, keeping the order of the features in
+        # each tile.
+        order = np.lexsort((np.arange(len(features)), ys, xs))
+        boundaries = np.flatnonzero(np.diff(xs[order]) | np.diff(ys[order])) + 1
+
+        for indices in np.split(order, boundaries) if len(order) else []:
+            x, y = int(xs[indices[0]]), int(ys[indices[0]])
+
+            path = os.path.join(version_path, str(zoom), str(x))
+            os.makedirs(path, exist_ok=True)
+
+            with open(os.path.join(path, f'{y}.geojson'), 'wb') as stream:
+                write_features(stream, [features[i] for i in indices])
+
+            tile_count += 1
+
+    with open(os.path.join(version_path, TILES_METADATA_FILE_NAME), 'wt') as fd:
+        json.dump(
+            {
+                'min_zoom': min_zoom,
+                'max_zoom': max_zoom,
+                'bounds': [
+                    float(longitudes.min()), float(latitudes.min()),
+                    float(longitudes.max()), float(latitudes.max())
+                ] if len(features) else None,
+                'feature_count': len(features),
+                'tile_count': tile_count
+            },
+            fd)
+
+    # Point the path of the tiles to the new version of the tiles, with a
+    # symbolic link created aside then renamed over the previous link.  A
+    # folder written by a former version of this function, which is not a
+    # link, is moved aside first.
+    previous_path = None
+    if os.path.islink(tiles_path):
+        previous_path = os.path.realpath(tiles_path)
+    elif os.path.exists(tiles_path):
+        previous_path = f'{tiles_path}.old'
+        shutil.rmtree(previous_path, ignore_errors=True)
+        os.rename(tiles_path, previous_path)
+
+    link_path = f'{tiles_path}.link'
+    if os.path.lexists(link_path):
+        os.remove(link_path)
+
+    os.symlink(os.path.basename(version_path), link_path)
+    os.replace(link_path, tiles_path)
+
+    if previous_path:
+        shutil.rmtree(previous_path, ignore_errors=True)
+
+    return tile_count
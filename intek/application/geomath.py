@@ -0,0 +1,333 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy as np
+
+
+# Mean radius of the Earth in meters.
+EARTH_RADIUS = 6371008.8
+
+# Default maximal size in bytes of a block of a distance matrix calculated
+# at once.  The calculation of a block requires a few temporary arrays of
+# the same size.
+DEFAULT_CHUNK_BYTE_COUNT = 32 * 1024 * 1024
+
+# Default number of median absolute deviations beyond the median distance
+# from which a location is considered as an outlier.
+DEFAULT_OUTLIER_DEVIATION_FACTOR = 10
+
+
+def calculate_distance_matrix(latitudes1, longitudes1, latitudes2=None, longitudes2=None, dtype=np.float64):
+    """
+    Return the great-circle distances between all the pairs of points.
+
+    The whole matrix is returned at once; use the function
+    `iterate_distance_matrix` when the matrix doesn't fit in memory.
+
+
+    :param latitudes1: An array of shape `(n,)` of the latitudes in degrees
+        of the first points.
+
+    :param longitudes1: An array of shape `(n,)` of the longitudes in
+        degrees of the first points.
+
+    :param latitudes2: An array of shape `(m,)` of the latitudes in degrees
+        of the second points.  Defaults to the first points.
+
+    :param longitudes2: An array of shape `(m,)` of the longitudes in
+        degrees of the second points.  Defaults to the first points.
+
+    :param dtype: Type of the items of the matrix.  `numpy.float32` halves
+        the memory used, with an accuracy better than a meter.
+
+
+    :return: An array of shape `(n, m)` of the distances in meters.
+    """
+    if latitudes2 is None:
+        latitudes2, longitudes2 = latitudes1, longitudes1
+
+    matrix = np.empty((len(latitudes1), len(latitudes2)), dtype=dtype)
+    for start, block in iterate_distance_matrix(latitudes1, longitudes1, latitudes2, longitudes2):
+        matrix[start:start + len(block)] = block
+
+    return matrix
+
+
+def calculate_distances_to_point(latitudes, longitudes, location):
+    """
+    Return the great-circle distances between points and a location.
+
+
+    :param latitudes: An array of the latitudes in degrees of the points.
+
+    :param longitudes: An array of the longitudes in degrees of the points.
+
+    :param location: A tuple `(latitude, longitude)` in degrees.
+
+
+    :return: An array of the distances in meters.
+    """
+    latitude, longitude = location
+    return haversine_distance(latitudes, longitudes, latitude, longitude)
+
+
+def find_nearest_points(latitudes1, longitudes1, latitudes2, longitudes2, max_byte_count=DEFAULT_CHUNK_BYTE_COUNT):
+    """
+    Return the nearest second point of each first point, without building
+    the whole distance matrix.
+
+
+    :param latitudes1: An array of shape `(n,)` of the latitudes in degrees
+        of the first points.
+
+    :param longitudes1: An array of shape `(n,)` of the longitudes in
+        degrees of the first points.
+
+    :param latitudes2: An array of shape `(m,)` of the latitudes in degrees
+        of the second points.
+
+    :param longitudes2: An array of shape `(m,)` of the longitudes in
+        degrees of the second points.
+
+    :param max_byte_count: Maximal size in bytes of a block of the distance
+        matrix calculated at once.
+
+
+    :return: A tuple `(indices, distances)` of arrays of shape `(n,)` of the
+        index of the nearest second point of each first point, and of the
+        distance in meters to this point.
+    """
+    indices = np.empty(len(latitudes1), dtype=int)
+    distances = np.empty(len(latitudes1))
+
+    for start, block in iterate_distance_matrix(latitudes1, longitudes1, latitudes2, longitudes2, max_byte_count):
+        end = start + len(block)
+        indices[start:end] = block.argmin(axis=1)
+        distances[start:end] = block[np.arange(len(block)), indices[start:end]]
+
+    return indices, distances
+
+
+def flag_outliers(distances, max_distance=None, deviation_factor=DEFAULT_OUTLIER_DEVIATION_FACTOR):
+    """
+    Flag the distances that are abnormally large, such as the distance from
+    the school of a home whose address has been wrongly geocoded.
+
+
+    :param distances: An array of distances in meters.
+
+    :param max_distance: Distance in meters beyond which a distance is an
+        outlier.  If not defined, a distance is an outlier when it is more
+        than `deviation_factor` median absolute deviations beyond the median
+        distance.  When this deviation is zero, as when more than half of
+        the distances are identical, no distance is flagged, since any
+        distance beyond the median would be.
+
+    :param deviation_factor: Number of median absolute deviations beyond
+        the median distance from which a distance is an outlier.
+
+
+    :return: An array of booleans of the same shape as `distances`.
+    """
+    distances = np.asarray(distances, dtype=float)
+    if max_distance is None:
+        if distances.size == 0:
+            return np.zeros(distances.shape, dtype=bool)
+
+        median = np.median(distances)
+        deviation = np.median(np.abs(distances - median))
+        if deviation == 0:
+            return np.zeros(distances.shape, dtype=bool)
+
+        max_distance = median + deviation_factor * deviation
+
+    return distances > max_distance
+
+
+def get_home_locations(registrations):
+    """
+    Return the distinct home locations of the families as arrays.
+
+
+    :param registrations: A list of objects `Registration`.  The homes of
+        the parents that have not been geocoded are ignored.
+
+
+    :return: A tuple `(registration_indices, latitudes, longitudes)` of
+        arrays, one item per home, where `registration_indices` are the
+        indices of the applications of the homes in `registrations`.
+    """
+    registration_indices = []
+    latitudes = []
+    longitudes = []
+
+    for i, registration in enumerate(registrations):
+        for location in set([parent.location for parent in registration.parents if parent.location]):
+            registration_indices.append(i)
+            latitudes.append(location.latitude)
+            longitudes.append(location.longitude)
+
+    return (
+        np.array(registration_indices, dtype=int),
+        np.array(latitudes, dtype=float),
+        np.array(longitudes, dtype=float)
+    )
+
+
+def haversine_distance(latitudes1, longitudes1, latitudes2, longitudes2):
+    """
+    Return the great-circle distances between points, using the haversine
+    formula.
+
+    The arguments are arrays, or scalars, broadcast against each other.
+
+
+    :param latitudes1: Latitudes in degrees of the first points.
+
+    :param longitudes1: Longitudes in degrees of the first points.
+
+    :param latitudes2: Latitudes in degrees of the second points.
+
+    :param longitudes2: Longitudes in degrees of the second points.
+
+
+    :return: An array of the distances in meters.
+    """
+    latitudes1 = np.radians(latitudes1)
+    latitudes2 = np.radians(latitudes2)
+    latitude_deltas = latitudes2 - latitudes1
+    longitude_deltas = np.radians(longitudes2) - np.radians(longitudes1)
+
+    a = np.sin(latitude_deltas / 2) ** 2 \
+        + np.cos(latitudes1) * np.cos(latitudes2) * np.sin(longitude_deltas / 2) ** 2
+
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def iterate_distance_matrix(
+        latitudes1,
+        longitudes1,
+        latitudes2,
+        longitudes2,
+        max_byte_count=DEFAULT_CHUNK_BYTE_COUNT):
+    """
+    Calculate the great-circle distances between all the pairs of points,
+    by blocks of rows, so that a matrix too large to fit in memory can be
+    reduced block by block.
+
+
+    :param latitudes1: An array of shape `(n,)` of the latitudes in degrees
+        of the first points, the rows of the matrix.
+
+    :param longitudes1: An array of shape `(n,)` of the longitudes in
+        degrees of the first points.
+
+    :param latitudes2: An array of shape `(m,)` of the latitudes in degrees
+        of the second points, the columns of the matrix.
+
+    :param longitudes2: An array of shape `(m,)` of the longitudes in
+        degrees of the second points.
+
+    :param max_byte_count: Maximal size in bytes of a block.
+
+
+    :return: An iterator of tuples `(start, block)` where `block` is an
+        array of shape `(k, m)` of the distances in meters from the first
+        points `start` to `start + k - 1` to the second points.
+    """
+    latitudes1 = np.radians(np.asarray(latitudes1, dtype=float))
+    longitudes1 = np.radians(np.asarray(longitudes1, dtype=float))
+    latitudes2 = np.radians(np.asarray(latitudes2, dtype=float))
+    longitudes2 = np.radians(np.asarray(longitudes2, dtype=float))
+
+    # The cosines of the latitudes are calculated once for all the blocks.
+    cosines1 = np.cos(latitudes1)
+    cosines2 = np.cos(latitudes2)
+
+    row_count = max(1, max_byte_count // (8 * max(1, len(latitudes2))))
+
+    for start in range(0, len(latitudes1), row_count):
+        end = start + row_count
+
+        a = np.sin((latitudes2[np.newaxis, :] - latitudes1[start:end, np.newaxis]) / 2) ** 2
+        a += cosines1[start:end, np.newaxis] * cosines2[np.newaxis, :] \
+            * np.sin((longitudes2[np.newaxis, :] - longitudes1[start:end, np.newaxis]) / 2) ** 2
+
+        np.clip(a, 0.0, 1.0, out=a)
+        np.sqrt(a, out=a)
+        np.arcsin(a, out=a)
+        a *= 2 * EARTH_RADIUS
+
+        yield start, a
+
+
+def project(latitudes, longitudes, reference_latitude=None):
+    """
+    Project geographical coordinates on a plane, using an equirectangular
+    projection centered on a reference latitude.
+
+    The projection is accurate enough at the scale of a city to calculate
+    Euclidean distances between the projected points.
+
+
+    :param latitudes: An array of latitudes in degrees.
+
+    :param longitudes: An array of longitudes in degrees.
+
+    :param reference_latitude: Latitude in degrees where the scale of the
+        projection is exact.  Defaults to the mean of the latitudes.
+
+
+    :return: A tuple `(points, reference_latitude)` where `points` is an
+        array of shape `(n, 2)` of the coordinates `(x, y)` in meters.
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+
+    if reference_latitude is None:
+        reference_latitude = float(latitudes.mean())
+
+    x = EARTH_RADIUS * np.radians(longitudes) * np.cos(np.radians(reference_latitude))
+    y = EARTH_RADIUS * np.radians(latitudes)
+
+    return np.column_stack((x, y)), reference_latitude
+
+
+def unproject(points, reference_latitude):
+    """
+    Convert points projected on a plane back to geographical coordinates
+    (cf. function `project`).
+
+
+    :param points: An array of shape `(n, 2)` of the coordinates `(x, y)`
+        in meters.
+
+    :param reference_latitude: Latitude in degrees of the projection.
+
+
+    :return: A tuple `(latitudes, longitudes)` of arrays in degrees.
+    """
+    points = np.asarray(points, dtype=float)
+
+    latitudes = np.degrees(points[:, 1] / EARTH_RADIUS)
+    longitudes = np.degrees(points[:, 0] / (EARTH_RADIUS * np.cos(np.radians(reference_latitude))))
+
+    return latitudes, longitudes
@@ -0,0 +1,444 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from xml.sax.saxutils import escape
+import collections
+import hashlib
+import logging
+import os
+import zipfile
+
+from .clustering import LocationCluster
+from .clustering import encode_geohash
+from .model import get_grade_name
+from .model import prettify_registration_id
+
+
+# Name of the KML document stored in a KMZ archive.
+KMZ_DOCUMENT_NAME = 'doc.kml'
+
+# Number of characters the KML writer buffers before writing them to the
+# underlying stream.
+KML_WRITER_BUFFER_SIZE = 64 * 1024
+
+# Icon of the placemarks of the children's homes.
+PLACEMARK_ICON_HREF = 'http://maps.google.com/mapfiles/kml/shapes/homegardenbusiness.png'
+
+# Styles of the placemarks, shared by the placemarks of the families that
+# are members of the parents association, and of the other families.
+# The key corresponds to whether the families are members, and the value
+# corresponds to a tuple `(style_id, color)` where `color` is expressed in
+# the KML hexadecimal notation `aabbggrr`.
+PLACEMARK_STYLES = {
+    True: ('ape-member', 'ff00b400'),
+    False: ('ape-non-member', 'ff0080ff'),
+}
+
+
+class KmlWriter:
+    """
+    Write a KML document to a binary stream, element by element, without
+    building the document in memory.
+    """
+    def __init__(self, stream, name=None):
+        """
+        Build a new object `KmlWriter`, and write the header of the KML
+        document.
+
+
+        :param stream: A binary file-like object to write the document to.
+
+        :param name: Name of the document.
+        """
+        self.__stream = stream
+        self.__buffer = []
+        self.__buffer_size = 0
+        self.__folder_depth = 0
+
+        self.__write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<kml xmlns="http://www.opengis.net/kml/2.2">\n'
+            '<Document>\n')
+
+        if name:
+            self.__write(f'<name>{escape(name)}</name>\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+
+    def __write(self, text):
+        self.__buffer.append(text)
+        self.__buffer_size += len(text)
+        if self.__buffer_size >= KML_WRITER_BUFFER_SIZE:
+            self.flush()
+
+    def begin_folder(self, name):
+        """
+        Open a folder, in which the next placemarks are written until the
+        folder is closed.
+
+
+        :param name: Name of the folder.
+        """
+        self.__write(f'<Folder>\n<name>{escape(name)}</name>\n')
+        self.__folder_depth += 1
+
+    def close(self):
+        """
+        Close the folders still open, and write the end of the KML document.
+        """
+        while self.__folder_depth:
+            self.end_folder()
+
+        self.__write('</Document>\n</kml>\n')
+        self.flush()
+
+    def end_folder(self):
+        """
+        Close the last folder opened.
+        """
+        self.__write('</Folder>\n')
+        self.__folder_depth -= 1
+
+    def flush(self):
+        """
+        Write the buffered elements to the underlying stream.
+        """
+        if self.__buffer:
+            self.__stream.write(''.join(self.__buffer).encode('utf-8'))
+            self.__buffer = []
+            self.__buffer_size = 0
+
+    def write_placemark(self, name, description, longitude, latitude, style_id=None):
+        """
+        Write a point placemark.
+
+
+        :param name: Name of the placemark.
+
+        :param description: Description of the placemark.
+
+        :param longitude: Longitude of the point.
+
+        :param latitude: Latitude of the point.
+
+        :param style_id: Identification of a shared style of the document.
+        """
+        self.__write(
+            '<Placemark>'
+            f'<name>{escape(name)}</name>'
+            f'<description>{escape(description)}</description>'
+            + (f'<styleUrl>#{escape(style_id)}</styleUrl>' if style_id else '') +
+            f'<Point><coordinates>{longitude},{latitude},0</coordinates></Point>'
+            '</Placemark>\n')
+
+    def write_style(self, style_id, color, icon_href=PLACEMARK_ICON_HREF, scale=1.0):
+        """
+        Write a style shared by the placemarks that refer to it.
+
+
+        :param style_id: Identification of the style.
+
+        :param color: Color of the icon in the KML hexadecimal notation
+            `aabbggrr`.
+
+        :param icon_href: URL of the icon.
+
+        :param scale: Scale of the icon.
+        """
+        self.__write(
+            f'<Style id="{escape(style_id)}">'
+            f'<IconStyle><color>{color}</color><scale>{scale}</scale>'
+            f'<Icon><href>{escape(icon_href)}</href></Icon></IconStyle>'
+            '</Style>\n')
+
+
+class KmlExporter:
+    """
+    Export the home locations of the families to a KML file, updated
+    incrementally as the applications are processed.
+
+    The placemarks are organized in folders by grade level, by language of
+    the application form, and by membership to the parents association.
+    The exporter keeps, for each folder and location, the number of
+    children of each family living there.  The locations can be grouped
+    in the cells of a geohash grid, so that the families who live in the
+    same building are represented by a single placemark at the centroid
+    of their homes.  Only the applications that are
+    new or that have been modified since the last update are taken into
+    account, so that the parents' home of the other applications are not
+    located again.  The file is written again only when its placemarks
+    have changed.
+    """
+    def __init__(self, kml_file_path_name, compressed=None, precision=None):
+        """
+        Build a new object `KmlExporter`.
+
+
+        :param kml_file_path_name: Absolute path and name of the KML file to
+            write.
+
+        :param compressed: Indicate whether to write a compressed KMZ file.
+            Defaults to `True` when the file name ends with `.kmz`.
+
+        :param precision: Number of characters of the geohash of the cells
+            the locations are grouped in.  If not defined, only the identical
+            locations are grouped together.
+        """
+        self.__kml_file_path_name = kml_file_path_name
+        self.__compressed = kml_file_path_name.lower().endswith('.kmz') if compressed is None else compressed
+        self.__precision = precision
+
+        # The key corresponds to a registration ID, and the value corresponds
+        # to a tuple `(content_hash, placemark_keys)` of the registration last
+        # taken into account.
+        self.__registrations = dict()
+
+        # The key corresponds to a tuple `(grade_level, locale, is_ape_member,
+        # cell)`, where `cell` is the geohash of the location, or the location
+        # itself, and the value corresponds to an object `LocationCluster` of
+        # the children, in this grade, living there.
+        self.__placemarks = dict()
+
+        self.__is_modified = True
+        self.__content_digest = None
+
+    def __add_registration(self, registration):
+        locations = set([
+            parent.location
+            for parent in registration.parents
+            if parent.location
+        ])
+
+        grade_levels_children_counts = collections.Counter([child.grade_level for child in registration.children])
+
+        placemark_keys = set()
+        for location in locations:
+            cell = location if self.__precision is None \
+                else encode_geohash(location.latitude, location.longitude, self.__precision)
+
+            for grade_level, children_count in grade_levels_children_counts.items():
+                placemark_key = (grade_level or 0, str(registration.locale), registration.is_ape_member, cell)
+
+                cluster = self.__placemarks.get(placemark_key)
+                if cluster is None:
+                    cluster = self.__placemarks[placemark_key] = LocationCluster(placemark_key)
+
+                cluster.add(registration.registration_id, children_count, location)
+                placemark_keys.add(placemark_key)
+
+        self.__registrations[registration.registration_id] = (registration.content_hash, placemark_keys)
+
+    def __remove_registration(self, registration_id):
+        _, placemark_keys = self.__registrations.pop(registration_id)
+
+        for placemark_key in placemark_keys:
+            cluster = self.__placemarks[placemark_key]
+            cluster.remove(registration_id)
+            if not cluster:
+                del self.__placemarks[placemark_key]
+
+    def export(self):
+        """
+        Write the KML file if its placemarks have changed.
+
+        The file is written to a temporary file which is then renamed, so
+        that a reader never sees a partially written file.
+
+
+        :return: `True` if the file has been written; `False` otherwise.
+        """
+        if not self.__is_modified:
+            return False
+
+        placemarks = self.get_placemarks()
+        content_digest = calculate_placemarks_digest(placemarks)
+        self.__is_modified = False
+
+        if content_digest == self.__content_digest:
+            return False
+
+        temporary_file_path_name = f'{self.__kml_file_path_name}.tmp'
+
+        if self.__compressed:
+            with zipfile.ZipFile(temporary_file_path_name, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+                with zip_file.open(KMZ_DOCUMENT_NAME, 'w') as stream:
+                    write_placemarks(stream, placemarks)
+        else:
+            with open(temporary_file_path_name, 'wb') as stream:
+                write_placemarks(stream, placemarks)
+
+        os.replace(temporary_file_path_name, self.__kml_file_path_name)
+        self.__content_digest = content_digest
+
+        logging.info(f"Wrote {len(placemarks)} placemarks to the KML file {self.__kml_file_path_name}")
+
+        return True
+
+    def get_placemarks(self):
+        """
+        Return the placemarks of the home locations of the families, sorted
+        by folder and by location, so that the same locations produce the
+        same list.
+
+
+        :return: A list of tuples `(folder_key, name, description, longitude,
+            latitude)` where `folder_key` is a tuple `(grade_level, locale,
+            is_ape_member)`, `name` indicates the number of children and the
+            number of families living at this location, and `description` is
+            the list of the application IDs of these families.
+        """
+        placemarks = []
+
+        for (grade_level, locale, is_ape_member, _), cluster in self.__placemarks.items():
+            latitude, longitude = cluster.centroid
+            placemarks.append((
+                (grade_level, locale, is_ape_member),
+                f"{cluster.children_count} ({cluster.family_count})",
+                ', '.join([prettify_registration_id(registration_id) for registration_id in cluster.registration_ids]),
+                longitude,
+                latitude
+            ))
+
+        return sorted(
+            placemarks,
+            key=lambda placemark: (placemark[0][0], placemark[0][1], not placemark[0][2], placemark[4], placemark[3]))
+
+    @property
+    def placemark_count(self):
+        return len(self.__placemarks)
+
+    def update(self, registrations):
+        """
+        Update the placemarks with the most recent applications of the
+        families.
+
+
+        :param registrations: A list of objects `Registration` of the most
+            recent application of each family.  The applications that are not
+            in this list anymore are removed from the placemarks.
+
+
+        :return: The number of applications added, modified, or removed.
+        """
+        change_count = 0
+        registration_ids = set()
+
+        for registration in registrations:
+            registration_ids.add(registration.registration_id)
+
+            content_hash, _ = self.__registrations.get(registration.registration_id, (None, None))
+            if content_hash == registration.content_hash:
+                continue
+
+            if content_hash is not None:
+                self.__remove_registration(registration.registration_id)
+
+            self.__add_registration(registration)
+            change_count += 1
+
+        for registration_id in set(self.__registrations).difference(registration_ids):
+            self.__remove_registration(registration_id)
+            change_count += 1
+
+        if change_count:
+            self.__is_modified = True
+
+        return change_count
+
+
+def calculate_placemarks_digest(placemarks):
+    """
+    Return a digest of placemarks, updated placemark by placemark rather
+    than from a copy of the whole list.
+
+
+    :param placemarks: A list of tuples `(folder_key, name, description,
+        longitude, latitude)` (cf. method `KmlExporter.get_placemarks`).
+
+
+    :return: A hexadecimal string of the MD5 digest of the placemarks.
+    """
+    digest = hashlib.md5()
+
+    for (grade_level, locale, is_ape_member), name, description, longitude, latitude in placemarks:
+        digest.update(f'{grade_level}\x1f{locale}\x1f{is_ape_member}\x1f{name}\x1f{description}'
+                      f'\x1f{longitude}\x1f{latitude}\x1e'.encode())
+
+    return digest.hexdigest()
+
+
+def write_placemarks(stream, placemarks):
+    """
+    Write placemarks to a KML document, organized in folders by grade
+    level, by language of the application form, and by membership to the
+    parents association.
+
+
+    :param stream: A binary file-like object to write the KML document to.
+
+    :param placemarks: A list of tuples `(folder_key, name, description,
+        longitude, latitude)` sorted by folder (cf. method
+        `KmlExporter.get_placemarks`).
+    """
+    with KmlWriter(stream, name="Children's homes") as writer:
+        for style_id, color in PLACEMARK_STYLES.values():
+            writer.write_style(style_id, color)
+
+        current_folder_key = (None, None, None)
+
+        for (grade_level, locale, is_ape_member), name, description, longitude, latitude in placemarks:
+            current_grade_level, current_locale, current_is_ape_member = current_folder_key
+
+            # Close the folders that differ from the folders of the placemark,
+            # from the innermost folder, and open the folders of the placemark.
+            if grade_level != current_grade_level:
+                if current_grade_level is not None:
+                    writer.end_folder()
+                    writer.end_folder()
+                    writer.end_folder()
+                writer.begin_folder(get_grade_name(grade_level) or 'Unknown grade')
+                current_locale = current_is_ape_member = None
+
+            if locale != current_locale:
+                if current_locale is not None:
+                    writer.end_folder()
+                    writer.end_folder()
+                writer.begin_folder(locale)
+                current_is_ape_member = None
+
+            if is_ape_member != current_is_ape_member:
+                if current_is_ape_member is not None:
+                    writer.end_folder()
+                writer.begin_folder('APE members' if is_ape_member else 'Non APE members')
+
+            current_folder_key = (grade_level, locale, is_ape_member)
+
+            writer.write_placemark(
+                name,
+                description,
+                longitude,
+                latitude,
+                style_id=PLACEMARK_STYLES[is_ape_member][0])
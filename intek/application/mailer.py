@@ -0,0 +1,519 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+from email.header import Header
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formataddr
+from email.utils import formatdate
+from email.utils import make_msgid
+import contextlib
+import logging
+import smtplib
+import ssl
+import threading
+import time
+
+from .attachment import AttachmentCache
+
+
+# Default number of authenticated connections to the Simple Mail
+# Transfer Protocol (SMTP) server that a mailer keeps open.
+DEFAULT_SMTP_POOL_SIZE = 1
+
+# Default number of times a mailer retries to send a message when the
+# connection to the SMTP server has been lost.
+DEFAULT_SMTP_MAX_RETRIES = 2
+
+# Default timeout in seconds of the blocking operations with the SMTP
+# server.
+DEFAULT_SMTP_TIMEOUT = 30
+
+# Port number of the SMTP server that requires a connection encrypted
+# with SSL from the beginning (SMTPS), instead of using the STARTTLS
+# command.
+SMTPS_PORT = 465
+
+# Exceptions raised when the connection to the SMTP server has been lost
+# or cannot be established.  A new connection is opened when one of
+# these exceptions is raised before the data of the message have been
+# sent to the server.
+SMTP_CONNECTION_EXCEPTIONS = (
+    smtplib.SMTPServerDisconnected,
+    smtplib.SMTPConnectError,
+    ConnectionError,
+    TimeoutError,
+    ssl.SSLError,
+)
+
+
+class SmtpDeliveryUncertainError(Exception):
+    """
+    Raised when the connection to the SMTP server has been lost after the
+    data of a message have been sent to the server, which may then have
+    accepted and delivered the message.  Such a message must not be sent
+    again automatically.
+    """
+
+
+class SmtpConnectionPool:
+    """
+    Pool of authenticated connections to a Simple Mail Transfer Protocol
+    (SMTP) server.
+
+    Opening a connection to a SMTP server requires several round trips,
+    a TLS handshake, and an authentication.  The pool keeps these
+    connections open to reuse them across messages.  Connections are
+    opened on demand, up to the size of the pool.
+    """
+    def __init__(
+            self,
+            smtp_connection_properties,
+            pool_size=DEFAULT_SMTP_POOL_SIZE,
+            timeout=DEFAULT_SMTP_TIMEOUT):
+        """
+        Build a new object `SmtpConnectionPool`.
+
+
+        :param smtp_connection_properties: Properties to connect to the Simple
+            Mail Transfer Protocol (SMTP) server.
+
+        :param pool_size: Maximal number of connections to keep open.
+
+        :param timeout: Timeout in seconds of the blocking operations with the
+            SMTP server.
+        """
+        if pool_size < 1:
+            raise ValueError("the size of the pool of SMTP connections must be at least 1")
+
+        self.__smtp_connection_properties = smtp_connection_properties
+        self.__pool_size = pool_size
+        self.__timeout = timeout
+
+        # Connections open and not in use, the most recently returned last,
+        # as it is the first to be reused.
+        self.__idle_connections = []
+        self.__connection_count = 0
+
+        # Condition notified when a connection is returned to the pool, or
+        # when a connection is closed, so that a thread waiting for a
+        # connection can reuse it, or open a new one.
+        self.__condition = threading.Condition()
+
+    def __connect(self):
+        """
+        Open and authenticate a new connection to the SMTP server.
+
+
+        :return: An object `smtplib.SMTP`.
+        """
+        properties = self.__smtp_connection_properties
+        logging.info(f"Connecting to the SMTP server {properties.hostname}:{properties.port_number}...")
+
+        if properties.port_number == SMTPS_PORT:
+            connection = smtplib.SMTP_SSL(
+                properties.hostname,
+                properties.port_number,
+                timeout=self.__timeout,
+                context=ssl.create_default_context())
+        else:
+            connection = smtplib.SMTP(properties.hostname, properties.port_number, timeout=self.__timeout)
+            connection.ehlo()
+            if connection.has_extn('starttls'):
+                connection.starttls(context=ssl.create_default_context())
+                connection.ehlo()
+
+        if properties.username and connection.has_extn('auth'):
+            connection.login(properties.username, properties.password)
+
+        return connection
+
+    @staticmethod
+    def __disconnect(connection):
+        """
+        Close a connection to the SMTP server, ignoring any error as this
+        connection may have been already lost.
+
+
+        :param connection: An object `smtplib.SMTP`.
+        """
+        try:
+            connection.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.close()
+
+    def __release(self, connection):
+        """
+        Return a connection to the pool, or account for a connection that
+        has been closed, and wake up a thread waiting for a connection.
+
+
+        :param connection: An object `smtplib.SMTP` to reuse, or `None` if
+            the connection has been closed.
+        """
+        with self.__condition:
+            if connection is None:
+                self.__connection_count -= 1
+            else:
+                self.__idle_connections.append(connection)
+
+            self.__condition.notify()
+
+    def close(self):
+        """
+        Close the idle connections to the SMTP server.
+        """
+        with self.__condition:
+            idle_connections = self.__idle_connections
+            self.__idle_connections = []
+            self.__connection_count -= len(idle_connections)
+            self.__condition.notify_all()
+
+        for connection in idle_connections:
+            self.__disconnect(connection)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Return a connection to the SMTP server for the duration of a `with`
+        block.
+
+        The connection is returned to the pool at the end of the block,
+        unless an exception has been raised, in which case the connection is
+        closed, as its state is unknown.
+
+
+        :return: An object `smtplib.SMTP`.
+        """
+        connection = None
+
+        # Reuse an idle connection, or open a new one if the pool is not full,
+        # otherwise wait for a connection to be returned to the pool, or to be
+        # closed.
+        with self.__condition:
+            while not self.__idle_connections and self.__connection_count >= self.__pool_size:
+                self.__condition.wait()
+
+            if self.__idle_connections:
+                connection = self.__idle_connections.pop()
+            else:
+                self.__connection_count += 1
+
+        if connection is None:
+            try:
+                connection = self.__connect()
+            except:
+                self.__release(None)
+                raise
+
+        try:
+            yield connection
+        except:
+            self.__disconnect(connection)
+            self.__release(None)
+            raise
+
+        self.__release(connection)
+
+    @property
+    def pool_size(self):
+        return self.__pool_size
+
+
+class Mailer:
+    """
+    Send e-mails through a pool of connections to a Simple Mail Transfer
+    Protocol (SMTP) server, reconnecting to this server when a connection
+    has been lost.
+
+    The mailer measures the number of messages it sends per second.
+    """
+    def __init__(
+            self,
+            smtp_connection_properties,
+            pool_size=DEFAULT_SMTP_POOL_SIZE,
+            max_retries=DEFAULT_SMTP_MAX_RETRIES,
+            attachment_cache=None):
+        """
+        Build a new object `Mailer`.
+
+
+        :param smtp_connection_properties: Properties to connect to the Simple
+            Mail Transfer Protocol (SMTP) server.
+
+        :param pool_size: Maximal number of connections to the SMTP server to
+            keep open.
+
+        :param max_retries: Number of times the mailer retries to send a
+            message when the connection to the SMTP server has been lost.
+
+        :param attachment_cache: An object `AttachmentCache` of the files
+            attached to the e-mails.
+        """
+        self.__connection_pool = SmtpConnectionPool(smtp_connection_properties, pool_size=pool_size)
+        self.__max_retries = max_retries
+        self.__attachment_cache = attachment_cache or AttachmentCache()
+
+        self.__lock = threading.Lock()
+        self.__message_count = 0
+        self.__byte_count = 0
+        self.__first_send_time = None
+        self.__last_send_time = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def attachment_cache(self):
+        return self.__attachment_cache
+
+    @property
+    def byte_count(self):
+        return self.__byte_count
+
+    def close(self):
+        """
+        Close the connections to the SMTP server.
+        """
+        self.__connection_pool.close()
+
+    @property
+    def message_count(self):
+        return self.__message_count
+
+    @property
+    def messages_per_second(self):
+        """
+        Return the rate at which the mailer sent messages, from the start of
+        the first message to the end of the last message.
+
+
+        :return: The number of messages sent per second.
+        """
+        if not self.__message_count:
+            return 0.0
+
+        elapsed_time = self.__last_send_time - self.__first_send_time
+        return self.__message_count / elapsed_time if elapsed_time > 0 else float(self.__message_count)
+
+    def reset_statistics(self):
+        """
+        Reset the number of messages and bytes sent by the mailer.
+        """
+        with self.__lock:
+            self.__message_count = 0
+            self.__byte_count = 0
+            self.__first_send_time = None
+            self.__last_send_time = None
+
+    def send(
+            self,
+            author_name,
+            author_email_address,
+            recipient_email_addresses,
+            subject,
+            content,
+            attachments=None):
+        """
+        Send a HTML e-mail.
+
+
+        :param author_name: Complete name of the originator of the message.
+
+        :param author_email_address: Address of the mailbox to which the author
+            of the message suggests that replies be sent.
+
+        :param recipient_email_addresses: A list of the e-mail addresses of
+            the recipients of the message.
+
+        :param subject: Subject of the message.
+
+        :param content: HTML content of the message.
+
+        :param attachments: A list of absolute path and name of the files to
+            attach to the message.  The files are read and encoded once, and
+            reused across messages.
+        """
+        message = build_email_message(
+            author_name,
+            author_email_address,
+            recipient_email_addresses,
+            subject,
+            content,
+            attachments=[self.__attachment_cache.get(file_path_name) for file_path_name in attachments or []])
+
+        self.send_message(message, author_email_address, recipient_email_addresses)
+
+    def send_message(self, message, author_email_address, recipient_email_addresses):
+        """
+        Send a message already built.
+
+
+        :param message: An object `email.message.Message`.
+
+        :param author_email_address: Address of the mailbox of the originator
+            of the message.
+
+        :param recipient_email_addresses: A list of the e-mail addresses of
+            the recipients of the message.
+
+
+        :raise SmtpDeliveryUncertainError: If the connection to the SMTP
+            server has been lost after the data of the message were sent.
+        """
+        data = message.as_bytes()
+
+        start_time = time.time()
+
+        # The message is sent again only when the connection has been lost
+        # before its data were handed to the SMTP server.  Once the `DATA`
+        # command has been issued, the server may have accepted the message
+        # even if its reply has never been received (e.g., timeout), and
+        # sending the message again could deliver it twice.
+        for attempt in range(self.__max_retries + 1):
+            is_data_sent = False
+            try:
+                with self.__connection_pool.connection() as connection:
+                    connection.ehlo_or_helo_if_needed()
+                    send_envelope(connection, author_email_address, recipient_email_addresses)
+                    is_data_sent = True
+                    (code, response) = connection.data(data)
+                    if code != 250:
+                        raise smtplib.SMTPDataError(code, response)
+                break
+            except SMTP_CONNECTION_EXCEPTIONS as exception:
+                if is_data_sent:
+                    raise SmtpDeliveryUncertainError(
+                        f"the connection to the SMTP server has been lost after the data "
+                        f"of the message were sent ({exception})") from exception
+                if attempt == self.__max_retries:
+                    raise
+                logging.warning(f"The connection to the SMTP server has been lost ({exception}); reconnecting...")
+
+        end_time = time.time()
+
+        with self.__lock:
+            self.__message_count += 1
+            self.__byte_count += len(data)
+            if self.__first_send_time is None:
+                self.__first_send_time = start_time
+            self.__last_send_time = end_time
+
+
+def build_email_message(
+        author_name,
+        author_email_address,
+        recipient_email_addresses,
+        subject,
+        content,
+        attachments=None,
+        message_id=None,
+        date=None):
+    """
+    Build a Multipurpose Internet Mail Extensions (MIME) message with a
+    HTML content and possibly some attachments.
+
+
+    :param author_name: Complete name of the originator of the message.
+
+    :param author_email_address: Address of the mailbox to which the author
+        of the message suggests that replies be sent.
+
+    :param recipient_email_addresses: A list of the e-mail addresses of the
+        recipients of the message.
+
+    :param subject: Subject of the message.
+
+    :param content: HTML content of the message.
+
+    :param attachments: A list of objects `MIMEBase` of the files to attach
+        to the message (cf. class `AttachmentCache`).
+
+    :param message_id: Unique identifier of the message, enclosed in angle
+        brackets.  If not defined, a new identifier is generated.
+
+    :param date: Time, in seconds since the epoch, when the message has
+        been written.  If not defined, the current time is used.
+
+
+    :return: An object `MIMEMultipart`.
+    """
+    message = MIMEMultipart()
+    message['From'] = formataddr((str(Header(author_name, 'utf-8')), author_email_address))
+    message['Reply-To'] = author_email_address
+    message['To'] = ', '.join(recipient_email_addresses)
+    message['Subject'] = Header(subject, 'utf-8')
+    message['Date'] = formatdate(date, localtime=True)
+    message['Message-ID'] = message_id or make_msgid()
+
+    message.attach(MIMEText(content, 'html', 'utf-8'))
+
+    for attachment in attachments or []:
+        message.attach(attachment)
+
+    return message
+
+
+def send_envelope(connection, author_email_address, recipient_email_addresses):
+    """
+    Send the envelope of a message to the SMTP server, i.e., the `MAIL`
+    command with the address of the originator, and a `RCPT` command per
+    recipient, before the data of the message are sent with the `DATA`
+    command.
+
+
+    :param connection: An object `smtplib.SMTP`.
+
+    :param author_email_address: Address of the mailbox of the originator
+        of the message.
+
+    :param recipient_email_addresses: A list of the e-mail addresses of
+        the recipients of the message.
+
+
+    :return: A dictionary of the recipients refused by the server, with
+        their e-mail address as the key, and the code and the response
+        sent by the server as the value.
+
+
+    :raise SMTPSenderRefused: If the server refused the originator of the
+        message.
+
+    :raise SMTPRecipientsRefused: If the server refused all the recipients
+        of the message.
+    """
+    (code, response) = connection.mail(author_email_address)
+    if code != 250:
+        raise smtplib.SMTPSenderRefused(code, response, author_email_address)
+
+    refused_recipients = {}
+    for recipient_email_address in recipient_email_addresses:
+        (code, response) = connection.rcpt(recipient_email_address)
+        if code not in (250, 251):
+            refused_recipients[recipient_email_address] = (code, response)
+
+    if len(refused_recipients) == len(recipient_email_addresses):
+        raise smtplib.SMTPRecipientsRefused(refused_recipients)
+
+    return refused_recipients
@@ -0,0 +1,707 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+import collections
+import contextlib
+import itertools
+import logging
+import sqlite3
+
+from .model import Registration
+from .model import parse_registration_id
+from .model import prettify_registration_id
+from .sheets import get_column_name
+from .sheets import get_sheet_id
+from .sheets import get_sheet_names
+from .sheets import read_google_sheet_values
+
+
+# Number of the first row of the master list where the registrations
+# are stored in, the first rows corresponding to the header of the sheet.
+MASTER_LIST_FIRST_ROW_NUMBER = 3
+
+# Names of the columns of the master list filled with the information of
+# a registration (cf. function `build_registration_rows`): the
+# information of the application and of a child, followed by the
+# information of each parent.
+MASTER_LIST_COLUMN_NAMES = [
+    'registration_id',
+    'registration_time',
+    'child_first_name',
+    'child_last_name',
+    'child_full_name',
+    'child_dob',
+    'grade_level'
+] + [
+    f'parent{i + 1}_{field_name}'
+    for i in range(len(Registration.PARENTS_FIELDS))
+    for field_name in (
+        'first_name',
+        'last_name',
+        'full_name',
+        'locale',
+        'email_address',
+        'phone_number',
+        'home_formatted_address',
+        'home_geocoded_address',
+        'home_location'
+    )
+]
+
+# Number of columns of the master list filled with the information of a
+# registration.
+MASTER_LIST_COLUMN_COUNT = len(MASTER_LIST_COLUMN_NAMES)
+
+
+class GoogleSheetsMasterList:
+    """
+    Master list of the registrations of the families, stored in the unique
+    sheet of a Google Sheets document.
+
+    Each request to the Google Sheets API is a remote call subject to a
+    quota.  The master list reads the sheet once to list the registrations
+    it stores, and writes the rows of several registrations in one request.
+    """
+    def __init__(self, spreadsheets_resource, spreadsheet_id):
+        """
+        Build a new object `GoogleSheetsMasterList`.
+
+
+        :param spreadsheets_resource: An object `googleapiclient.discovery.Resource`
+            returned by the Google API client library.
+
+        :param spreadsheet_id: Identification of the Google Sheets document
+            used as the master list of the registrations of all the families
+            to the school bus transportation service.
+        """
+        self.__spreadsheets_resource = spreadsheets_resource
+        self.__spreadsheet_id = spreadsheet_id
+
+        self.__sheet_name = None
+        self.__used_row_count = None
+
+    def __get_sheet_name(self):
+        """
+        Return the name of the unique sheet of the master list.
+
+
+        :return: The name of the sheet.
+
+
+        :raise ValueError: If the Google Sheets document contains more than
+            one sheet.
+        """
+        if self.__sheet_name is None:
+            sheet_names = get_sheet_names(self.__spreadsheets_resource, self.__spreadsheet_id)
+            if len(sheet_names) > 1:
+                raise ValueError(
+                    f"the output Google spreadsheet must contain one sheet only: {', '.join(sheet_names)}")
+            self.__sheet_name = sheet_names[0]
+
+        return self.__sheet_name
+
+    def __get_used_row_count(self):
+        """
+        Return the number of rows already used in the sheet of the master
+        list.
+
+        A row is used when at least one of its columns is not empty.  The
+        number of rows is refreshed each time the registrations are fetched
+        (cf. method `fetch_registration_blocks`), as staff may add or remove
+        rows by hand, and it is maintained as rows are written in between.
+        It is counted here only if the registrations haven't been fetched.
+
+
+        :return: The number of rows already used.
+        """
+        if self.__used_row_count is None:
+            sheet_name = self.__get_sheet_name()
+
+            # @patch: Reading each individual row of a sheet is time consuming as
+            #    this sends one request per row to fetch.  For optimization purpose,
+            #    we consider that the first column of each row of a sheet always
+            #    contains a value when the row is not empty.  Therefore, we fetch
+            #    the range composed of the first column of the sheet.  Google Sheets
+            #    return the values of the first columns of every non-empty row.  The
+            #    number of rows returned corresponds to the index of the last row
+            #    that is not empty.
+            row_index = len(read_google_sheet_values(
+                self.__spreadsheets_resource,
+                self.__spreadsheet_id,
+                sheet_name,
+                'A1:A')) + 1
+
+            # Read the column values of each consecutive row until a row is empty.
+            while True:
+                values = read_google_sheet_values(
+                    self.__spreadsheets_resource,
+                    self.__spreadsheet_id,
+                    sheet_name,
+                    f'A{row_index}:M{row_index}')
+                if not values:
+                    break
+                row_index += 1
+
+            self.__used_row_count = row_index - 1
+
+        return self.__used_row_count
+
+    def append_registrations(self, registration_rows):
+        """
+        Append registrations after the last row used in the master list, in
+        one request.
+
+
+        :param registration_rows: A list of the rows of values of each
+            registration, as returned by the function `build_registration_rows`.
+        """
+        rows = list(itertools.chain.from_iterable(registration_rows))
+        if not rows:
+            return
+
+        sheet_name = self.__get_sheet_name()
+        used_row_count = self.__get_used_row_count()
+
+        self.__spreadsheets_resource.values().update(
+            spreadsheetId=self.__spreadsheet_id,
+            range=f'{sheet_name}!A{used_row_count + 1}',
+            valueInputOption='RAW',
+            body={
+                'values': rows
+            }) \
+            .execute()
+
+        self.__used_row_count = used_row_count + len(rows)
+
+    def fetch_registration_blocks(self):
+        """
+        Return the rows of the registrations stored in the master list.
+
+        The first row of a registration contains the identification of this
+        registration, while the following rows, one for each other child of
+        the family, have their first column empty.
+
+
+        :return: An ordered dictionary where the key corresponds to the
+            identification of a registration, and the value corresponds to a
+            tuple `(row_number, rows)` where `row_number` is the number of the
+            first row of this registration in the master list, and `rows` is
+            the list of rows of values of this registration.
+
+
+        :raise ValueError: if the Google Sheets has more than one sheet.
+        """
+        rows = read_google_sheet_values(
+            self.__spreadsheets_resource,
+            self.__spreadsheet_id,
+            self.__get_sheet_name(),
+            f'A{MASTER_LIST_FIRST_ROW_NUMBER}:{get_column_name(MASTER_LIST_COLUMN_COUNT - 1)}')
+
+        # Google Sheets doesn't return the empty rows at the end of the range,
+        # so the last row returned is the last row used in the sheet.
+        self.__used_row_count = MASTER_LIST_FIRST_ROW_NUMBER - 1 + len(rows)
+
+        registration_blocks = collections.OrderedDict()
+        registration_rows = None
+
+        for i, values in enumerate(rows):
+            if values and values[0]:
+                registration_id = parse_registration_id(values[0])
+                registration_rows = [values]
+                registration_blocks[registration_id] = (MASTER_LIST_FIRST_ROW_NUMBER + i, registration_rows)
+            elif values and registration_rows is not None:
+                registration_rows.append(values)
+            else:
+                registration_rows = None
+
+        return registration_blocks
+
+    def update_registrations(self, registration_rows, registration_blocks=None):
+        """
+        Update registrations already stored in the master list.
+
+        The function only writes the cells whose values have been modified,
+        in one batch request.  When a family adds or removes a child from its
+        application, the function inserts or deletes the corresponding rows in
+        the master list before writing the modified cells.
+
+
+        :param registration_rows: A list of tuples `(registration_id, rows)`
+            of the identification of a registration stored in the master
+            list, and the new rows of values of this registration.
+
+        :param registration_blocks: An ordered dictionary of the rows of the
+            registrations stored in the master list, as returned by the
+            method `fetch_registration_blocks`, or `None` to read them from
+            the master list.
+
+
+        :return: The number of registrations updated.
+
+
+        :raise ValueError: If the Google Sheets document contains more than
+            one sheet.
+        """
+        if not registration_rows:
+            return 0
+
+        if registration_blocks is None:
+            registration_blocks = self.fetch_registration_blocks()
+
+        sheet_name = self.__get_sheet_name()
+
+        # Sort the registrations by the position of their rows in the master
+        # list.
+        upserts = sorted(
+            [
+                (*registration_blocks[registration_id], registration_id, new_rows)
+                for registration_id, new_rows in registration_rows
+            ],
+            key=lambda upsert: upsert[0])
+
+        # Insert or delete the rows of the children that have been added to or
+        # removed from the applications.  The requests are ordered from the
+        # bottom to the top of the sheet so that the rows of a registration are
+        # not shifted by the rows inserted or deleted for another registration.
+        dimension_requests = []
+        sheet_id = None
+
+        for row_number, rows, _, new_rows in reversed(upserts):
+            old_row_count, new_row_count = len(rows), len(new_rows)
+            if old_row_count == new_row_count:
+                continue
+
+            if sheet_id is None:
+                sheet_id = get_sheet_id(self.__spreadsheets_resource, self.__spreadsheet_id, sheet_name)
+
+            dimension_range = {
+                'sheetId': sheet_id,
+                'dimension': 'ROWS',
+                'startIndex': row_number - 1 + min(old_row_count, new_row_count),
+                'endIndex': row_number - 1 + max(old_row_count, new_row_count)
+            }
+
+            dimension_requests.append(
+                {'insertDimension': {'range': dimension_range, 'inheritFromBefore': True}}
+                if new_row_count > old_row_count
+                else {'deleteDimension': {'range': dimension_range}})
+
+        if dimension_requests:
+            self.__spreadsheets_resource.batchUpdate(
+                spreadsheetId=self.__spreadsheet_id,
+                body={'requests': dimension_requests}) \
+                .execute()
+
+        # Determine the cells that have been modified, taking into account the
+        # rows that have been inserted or deleted above each registration.
+        cell_updates = []
+        row_shift = 0
+
+        for row_number, rows, registration_id, new_rows in upserts:
+            logging.info(f"Updating the application {prettify_registration_id(registration_id)}...")
+            cell_updates.extend(build_master_list_cell_updates(sheet_name, row_number + row_shift, rows, new_rows))
+            row_shift += len(new_rows) - len(rows)
+
+        if cell_updates:
+            self.__spreadsheets_resource.values().batchUpdate(
+                spreadsheetId=self.__spreadsheet_id,
+                body={
+                    'valueInputOption': 'RAW',
+                    'data': cell_updates
+                }) \
+                .execute()
+
+        if self.__used_row_count is not None:
+            self.__used_row_count += row_shift
+
+        logging.info(f"Updated {sum([len(cell_update['values'][0]) for cell_update in cell_updates])} cells "
+                     "of the master list")
+
+        return len(upserts)
+
+
+class SqliteMasterList:
+    """
+    Master list of the registrations of the families, stored in a local
+    SQLite database.
+
+    The rows of the registrations are stored with the same columns as the
+    master list in Google Sheets, indexed by the identification of the
+    registration, the name of the child, and the grade level of the child,
+    so that the script processes the applications at the speed of the local
+    disk, and queries the registrations locally.  The Google Sheets master
+    list is then a view published from time to time (cf. function
+    `synchronize_master_lists`).
+    """
+    def __init__(self, database_file_path_name):
+        """
+        Build a new object `SqliteMasterList`, creating the database if it
+        doesn't exist.
+
+
+        :param database_file_path_name: Absolute path and name of the SQLite
+            database file.
+        """
+        self.__database_file_path_name = database_file_path_name
+
+        column_definitions = ',\n'.join([
+            f'  {column_name} {"integer" if column_name == "grade_level" else "text"} NULL'
+            for column_name in MASTER_LIST_COLUMN_NAMES[1:]
+        ])
+
+        with self.__transaction() as connection:
+            connection.executescript(
+                f"""
+                CREATE TABLE IF NOT EXISTS master_list_row (
+                  family_registration_id integer NOT NULL,
+                  registration_rank integer NOT NULL,
+                  child_index integer NOT NULL,
+                  registration_id integer NULL,
+                {column_definitions},
+                  PRIMARY KEY (family_registration_id, child_index)
+                );
+
+                CREATE INDEX IF NOT EXISTS master_list_row_registration_rank_idx
+                  ON master_list_row (registration_rank, child_index);
+
+                CREATE INDEX IF NOT EXISTS master_list_row_child_full_name_idx
+                  ON master_list_row (child_full_name COLLATE NOCASE);
+
+                CREATE INDEX IF NOT EXISTS master_list_row_grade_level_idx
+                  ON master_list_row (grade_level);
+                """)
+
+    @contextlib.contextmanager
+    def __transaction(self):
+        """
+        Return a connection to the database for the duration of a `with`
+        block, committing the transaction at the end of the block, or
+        rolling it back if an exception has been raised.
+
+
+        :return: An object `sqlite3.Connection`.
+        """
+        connection = sqlite3.connect(self.__database_file_path_name, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def __insert_rows(connection, registration_id, registration_rank, rows):
+        """
+        Insert the rows of a registration.
+
+
+        :param connection: An object `sqlite3.Connection`.
+
+        :param registration_id: Identification of the registration.
+
+        :param registration_rank: Position of the registration in the master
+            list.
+
+        :param rows: A list of rows of values of this registration.
+        """
+        connection.executemany(
+            f"""
+            INSERT INTO master_list_row(
+                family_registration_id,
+                registration_rank,
+                child_index,
+                {', '.join(MASTER_LIST_COLUMN_NAMES)})
+              VALUES
+                (?, ?, ?, {', '.join(['?'] * MASTER_LIST_COLUMN_COUNT)})
+            """,
+            [
+                (
+                    registration_id,
+                    registration_rank,
+                    child_index,
+                    *(list(row[:MASTER_LIST_COLUMN_COUNT])
+                      + [''] * (MASTER_LIST_COLUMN_COUNT - len(row)))
+                )
+                for child_index, row in enumerate(rows)
+            ])
+
+    def append_registrations(self, registration_rows):
+        """
+        Append registrations at the end of the master list, in one
+        transaction.
+
+
+        :param registration_rows: A list of the rows of values of each
+            registration, as returned by the function `build_registration_rows`.
+            The first row of a registration starts with the identification
+            of this registration.
+        """
+        with self.__transaction() as connection:
+            (registration_rank,) = connection.execute(
+                'SELECT COALESCE(max(registration_rank), 0) FROM master_list_row').fetchone()
+
+            for rows in registration_rows:
+                registration_rank += 1
+                self.__insert_rows(connection, parse_registration_id(str(rows[0][0])), registration_rank, rows)
+
+    def fetch_registration_blocks(self):
+        """
+        Return the rows of the registrations stored in the master list.
+
+
+        :return: An ordered dictionary where the key corresponds to the
+            identification of a registration, and the value corresponds to a
+            tuple `(row_number, rows)` where `row_number` is the number the
+            first row of this registration would have in the Google Sheets
+            master list, and `rows` is the list of rows of values of this
+            registration.
+        """
+        with self.__transaction() as connection:
+            records = connection.execute(
+                f"""
+                SELECT
+                    family_registration_id,
+                    {', '.join(MASTER_LIST_COLUMN_NAMES)}
+                  FROM
+                    master_list_row
+                  ORDER BY
+                    registration_rank,
+                    child_index
+                """).fetchall()
+
+        registration_blocks = collections.OrderedDict()
+        row_number = MASTER_LIST_FIRST_ROW_NUMBER
+
+        for registration_id, records in itertools.groupby(records, key=lambda record: record[0]):
+            rows = [list(record[1:]) for record in records]
+            registration_blocks[registration_id] = (row_number, rows)
+            row_number += len(rows)
+
+        return registration_blocks
+
+    def find_registration_rows(self, child_full_name=None, grade_level=None):
+        """
+        Return the rows of the children registered with the specified name
+        and/or in the specified grade level.
+
+
+        :param child_full_name: Full name of a child, compared
+            case-insensitively.
+
+        :param grade_level: Grade level of a child.
+
+
+        :return: A list of tuples `(registration_id, row)` sorted by their
+            position in the master list.
+        """
+        conditions, parameters = [], []
+
+        if child_full_name is not None:
+            conditions.append('child_full_name = ? COLLATE NOCASE')
+            parameters.append(child_full_name)
+
+        if grade_level is not None:
+            conditions.append('grade_level = ?')
+            parameters.append(grade_level)
+
+        with self.__transaction() as connection:
+            records = connection.execute(
+                f"""
+                SELECT
+                    family_registration_id,
+                    {', '.join(MASTER_LIST_COLUMN_NAMES)}
+                  FROM
+                    master_list_row
+                  {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+                  ORDER BY
+                    registration_rank,
+                    child_index
+                """,
+                parameters).fetchall()
+
+        return [(record[0], list(record[1:])) for record in records]
+
+    def update_registrations(self, registration_rows, registration_blocks=None):
+        """
+        Replace the rows of registrations already stored in the master list,
+        keeping their position, in one transaction.
+
+
+        :param registration_rows: A list of tuples `(registration_id, rows)`
+            of the identification of a registration stored in the master
+            list, and the new rows of values of this registration.
+
+        :param registration_blocks: Ignored; the rows of the registrations
+            are replaced wherever they are stored.
+
+
+        :return: The number of registrations updated.
+        """
+        update_count = 0
+
+        with self.__transaction() as connection:
+            for registration_id, rows in registration_rows:
+                record = connection.execute(
+                    'SELECT registration_rank FROM master_list_row WHERE family_registration_id = ? LIMIT 1',
+                    (registration_id,)).fetchone()
+                if record is None:
+                    continue
+
+                (registration_rank,) = record
+                connection.execute(
+                    'DELETE FROM master_list_row WHERE family_registration_id = ?',
+                    (registration_id,))
+                self.__insert_rows(connection, registration_id, registration_rank, rows)
+                update_count += 1
+
+        return update_count
+
+
+def build_master_list_cell_updates(sheet_name, row_number, old_rows, new_rows):
+    """
+    Return the ranges of the cells of the master list whose values differ
+    between the rows currently stored for a registration and the new rows
+    of this registration.
+
+    The adjacent cells of a same row that have been modified are grouped in
+    a same range.
+
+
+    :param sheet_name: Name of the sheet of the master list.
+
+    :param row_number: Number of the first row of the registration in the
+        master list.
+
+    :param old_rows: A list of rows of values currently stored in the
+        master list for this registration.  Google Sheets truncates a row to
+        the last column containing a value not empty.
+
+    :param new_rows: A list of rows of values of this registration as
+        returned by the function `build_registration_rows`.
+
+
+    :return: A list of dictionaries `{'range': string, 'values': list}`
+        compliant with the Google Sheets API method `values.batchUpdate`.
+    """
+    cell_updates = []
+
+    for i, new_row in enumerate(new_rows):
+        old_row = old_rows[i] if i < len(old_rows) else []
+
+        modified_cells = []  # List of `(column_index, value)`
+        for j, value in enumerate(new_row):
+            old_value = old_row[j] if j < len(old_row) else ''
+            if ('' if value is None else str(value)) != old_value:
+                modified_cells.append((j, value))
+
+        # Group adjacent modified cells of this row into ranges.
+        while modified_cells:
+            first_column_index, _ = modified_cells[0]
+            k = 1
+            while k < len(modified_cells) and modified_cells[k][0] == first_column_index + k:
+                k += 1
+
+            cell_updates.append({
+                'range': f'{sheet_name}!{get_column_name(first_column_index)}{row_number + i}:'
+                         f'{get_column_name(first_column_index + k - 1)}{row_number + i}',
+                'values': [[value for _, value in modified_cells[:k]]]
+            })
+
+            modified_cells = modified_cells[k:]
+
+    return cell_updates
+
+
+def normalize_master_list_rows(rows):
+    """
+    Return the rows of a registration as they are read back from Google
+    Sheets, to compare the rows stored in different master lists.
+
+    Google Sheets returns the values as strings, and truncates a row to
+    the last column containing a value not empty.
+
+
+    :param rows: A list of rows of values of a registration.
+
+
+    :return: A list of lists of strings.
+    """
+    normalized_rows = []
+
+    for row in rows:
+        values = ['' if value is None else str(value) for value in row]
+        while values and not values[-1]:
+            values.pop()
+        normalized_rows.append(values)
+
+    return normalized_rows
+
+
+def synchronize_master_lists(source_master_list, target_master_list):
+    """
+    Publish the registrations of a master list to another master list.
+
+    The registrations missing from the target master list are appended in
+    one request, and the registrations whose rows differ are updated in one
+    batch, so that the cost of a synchronization depends on the number of
+    registrations added or modified since the previous one.
+
+
+    :param source_master_list: The master list to read the registrations
+        from, such as an object `SqliteMasterList`.
+
+    :param target_master_list: The master list to publish the
+        registrations to, such as an object `GoogleSheetsMasterList`.
+
+
+    :return: A tuple `(appended_count, updated_count)` of the number of
+        registrations appended to and updated in the target master list.
+    """
+    source_registration_blocks = source_master_list.fetch_registration_blocks()
+    target_registration_blocks = target_master_list.fetch_registration_blocks()
+
+    modified_registration_rows = [
+        (registration_id, rows)
+        for registration_id, (_, rows) in source_registration_blocks.items()
+        if registration_id in target_registration_blocks
+           and normalize_master_list_rows(rows)
+               != normalize_master_list_rows(target_registration_blocks[registration_id][1])
+    ]
+
+    new_registration_rows = [
+        rows
+        for registration_id, (_, rows) in source_registration_blocks.items()
+        if registration_id not in target_registration_blocks
+    ]
+
+    if modified_registration_rows:
+        target_master_list.update_registrations(
+            modified_registration_rows,
+            registration_blocks=target_registration_blocks)
+
+    if new_registration_rows:
+        target_master_list.append_registrations(new_registration_rows)
+
+    logging.info(
+        f"Synchronized the master list: {len(new_registration_rows)} registrations appended, "
+        f"{len(modified_registration_rows)} updated")
+
+    return len(new_registration_rows), len(modified_registration_rows)
@@ -0,0 +1,262 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import collections
+import difflib
+import logging
+
+from unidecode import unidecode
+
+
+# Default minimal score of a pair of children to be reported as a
+# possible duplicate.
+DEFAULT_DUPLICATE_CHILD_MIN_SCORE = 0.85
+
+# Default maximal number of children in a block of candidates.  Blocks
+# larger than this number are not compared, as the number of pairs of
+# children to score grows quadratically with the size of a block.
+DEFAULT_MAX_BLOCK_SIZE = 200
+
+# Weights of the similarity of the names and of the dates of birth of two
+# children in the score of this pair of children.
+NAME_SIMILARITY_WEIGHT = 0.7
+DOB_SIMILARITY_WEIGHT = 0.3
+
+# Mapping between the letters and their Soundex digit.  Vowels and the
+# letters `H`, `W`, and `Y` are not coded.
+SOUNDEX_CODES = {
+    letter: str(digit)
+    for digit, letters in enumerate(['', 'BFPV', 'CGJKQSXZ', 'DT', 'L', 'MN', 'R'])
+    for letter in letters
+}
+
+
+class DuplicateChildCandidate:
+    """
+    A pair of children registered by two different families, who are
+    possibly the same child.
+    """
+    def __init__(self, score, first, second):
+        """
+        Build a new object `DuplicateChildCandidate`.
+
+
+        :param score: A number between `0.0` and `1.0` representing the
+            likelihood that the two children are the same child.
+
+        :param first: A tuple `(registration, child)` of the first child and
+            the application of the family who registered this child.
+
+        :param second: A tuple `(registration, child)` of the second child
+            and the application of the family who registered this child.
+        """
+        self.__score = score
+        self.__first = first
+        self.__second = second
+
+    @property
+    def first(self):
+        return self.__first
+
+    @property
+    def score(self):
+        return self.__score
+
+    @property
+    def second(self):
+        return self.__second
+
+
+def build_name_key(fullname):
+    """
+    Return a key of the full name of a person that doesn't depend on
+    diacritics, letter case, punctuation, nor on the order of the name
+    components.
+
+    The order of the first name and the last name of a child depends on
+    the locale of the application form the family filled in (cf. method
+    `Person.format_fullname`).
+
+
+    :param fullname: The full name of a person.
+
+
+    :return: A string composed of the sorted ASCII name components.
+    """
+    ascii_fullname = unidecode(fullname).lower()
+    components = ''.join([c if c.isalnum() else ' ' for c in ascii_fullname]).split()
+    return ' '.join(sorted(components))
+
+
+def build_phonetic_key(fullname):
+    """
+    Return a phonetic key of the full name of a person.
+
+    The key is composed of the sorted Soundex codes of the name components,
+    so that two names that sound the same, or that differ by a minor typo,
+    have the same key.
+
+
+    :param fullname: The full name of a person.
+
+
+    :return: A string composed of the sorted Soundex codes of the name
+        components.
+    """
+    return ' '.join(sorted([soundex(component) for component in build_name_key(fullname).split()]))
+
+
+def calculate_dob_similarity(dob1, dob2):
+    """
+    Return the similarity of two dates of birth.
+
+
+    :param dob1: The date of birth of a child.
+
+    :param dob2: The date of birth of another child.
+
+
+    :return: `1.0` if the two dates are the same, `0.8` if their day and
+        month are swapped, `0.6` if only one of their components differs,
+        `0.0` otherwise.
+    """
+    if dob1 == dob2:
+        return 1.0
+
+    if dob1.year == dob2.year and dob1.day == dob2.month and dob1.month == dob2.day:
+        return 0.8
+
+    different_component_count = \
+        (dob1.year != dob2.year) + (dob1.month != dob2.month) + (dob1.day != dob2.day)
+
+    return 0.6 if different_component_count == 1 else 0.0
+
+
+def find_duplicate_children(
+        registrations,
+        min_score=DEFAULT_DUPLICATE_CHILD_MIN_SCORE,
+        max_block_size=DEFAULT_MAX_BLOCK_SIZE):
+    """
+    Return the children registered by different families who are possibly
+    the same child.
+
+    Separated parents may register their child with two different
+    application forms, each parent with his own e-mail address, which
+    results in two different applications.
+
+    The function doesn't compare every pair of children.  It groups the
+    children in blocks of candidates sharing the same date of birth, or
+    the same phonetic key of their name, and it scores the pairs of
+    children inside each block only.
+
+
+    :param registrations: A list of objects `Registration`.
+
+    :param min_score: Minimal score of a pair of children to be returned.
+
+    :param max_block_size: Maximal number of children in a block of
+        candidates to compare.
+
+
+    :return: A list of objects `DuplicateChildCandidate` sorted by
+        descending score.
+    """
+    entries = []  # List of `(registration, child, name_key)`
+    blocks = collections.defaultdict(list)
+
+    for registration in registrations:
+        for child in registration.children:
+            entry_index = len(entries)
+            entries.append((registration, child, build_name_key(child.fullname)))
+            blocks[('dob', child.dob.date())].append(entry_index)
+            blocks[('name', build_phonetic_key(child.fullname))].append(entry_index)
+
+    # Collect the pairs of children of different families that share at
+    # least one block.
+    candidate_pairs = set()
+
+    for block_key, entry_indices in blocks.items():
+        if len(entry_indices) > max_block_size:
+            logging.warning(f"Skipping the block of candidates {block_key} of {len(entry_indices)} children")
+            continue
+
+        for i, entry_index1 in enumerate(entry_indices):
+            registration1 = entries[entry_index1][0]
+            for entry_index2 in entry_indices[i + 1:]:
+                if entries[entry_index2][0].registration_id != registration1.registration_id:
+                    candidate_pairs.add((entry_index1, entry_index2))
+
+    # Score the candidate pairs.  The similarity of the dates of birth is
+    # cheaper to calculate than the similarity of the names; it determines
+    # the minimal name similarity that the pair needs to reach, which
+    # SequenceMatcher can reject using its fast upper bounds.
+    candidates = []
+
+    for entry_index1, entry_index2 in candidate_pairs:
+        registration1, child1, name_key1 = entries[entry_index1]
+        registration2, child2, name_key2 = entries[entry_index2]
+
+        dob_similarity = calculate_dob_similarity(child1.dob, child2.dob)
+        min_name_similarity = (min_score - DOB_SIMILARITY_WEIGHT * dob_similarity) / NAME_SIMILARITY_WEIGHT
+        if min_name_similarity > 1.0:
+            continue
+
+        sequence_matcher = difflib.SequenceMatcher(None, name_key1, name_key2)
+        if sequence_matcher.real_quick_ratio() < min_name_similarity \
+           or sequence_matcher.quick_ratio() < min_name_similarity:
+            continue
+
+        score = NAME_SIMILARITY_WEIGHT * sequence_matcher.ratio() + DOB_SIMILARITY_WEIGHT * dob_similarity
+        if score >= min_score:
+            candidates.append(DuplicateChildCandidate(score, (registration1, child1), (registration2, child2)))
+
+    return sorted(candidates, key=lambda candidate: candidate.score, reverse=True)
+
+
+def soundex(word):
+    """
+    Return the Soundex code of a word.
+
+
+    :param word: An ASCII word.
+
+
+    :return: A string composed of the first letter of the word followed by
+        three digits.
+    """
+    word = ''.join([c for c in word.upper() if c.isalpha()])
+    if not word:
+        return ''
+
+    codes = [word[0]]
+    previous_code = SOUNDEX_CODES.get(word[0], '')
+
+    for letter in word[1:]:
+        code = SOUNDEX_CODES.get(letter, '')
+        if code and code != previous_code:
+            codes.append(code)
+
+        # The letters `H` and `W` don't separate two consonants with the same
+        # code, while vowels do.
+        if letter not in 'HW':
+            previous_code = code
+
+    return ''.join(codes)[:4].ljust(4, '0')
@@ -612,6 +612,7 @@ class Registration:
         self.__is_ape_member = is_ape_member
         self.__locale = locale or ENGLISH_LOCALE
         self.__geocoder = geocoder
+        self.__content_hash = None  # Evaluated with lazy loading technique (cf. property `content_hash`)
 
     @classmethod
     def __generate_registration_id(
@@ -762,6 +763,45 @@ class Registration:
     def children(self):
         return self.__children
 
+    @property
+    def content_hash(self):
+        """
+        Return a digest of the information that the family entered in its
+        application form.
+
+        Two submissions of the same family have the same digest when the
+        family didn't modify any information.  The date and time of the
+        submission is not part of this digest, neither are the geocoded data
+        of the parents' home, as geocoding consumes time and credits.
+
+
+        :return: A hexadecimal string of the MD5 digest of the application.
+        """
+        if self.__content_hash is None:
+            values = [str(self.__is_ape_member)]
+
+            for child in self.__children:
+                values.extend([
+                    child.first_name,
+                    child.last_name,
+                    child.dob.strftime('%Y-%m-%d'),
+                    str(child.grade_level)
+                ])
+
+            for parent in self.__parents:
+                values.extend([
+                    parent.first_name,
+                    parent.last_name,
+                    str(parent.locale),
+                    parent.email_address or '',
+                    parent.phone_number or '',
+                    parent.formatted_address or ''
+                ])
+
+            self.__content_hash = hashlib.md5('\x1f'.join(values).encode()).hexdigest()
+
+        return self.__content_hash
+
     @classmethod
     def from_row(cls, row, locale, geocoder=None):
         """
@@ -864,3 +904,52 @@ def detect_locale(text):
         return Locale.from_string(langdetect.detect(text), strict=False)
     except langdetect.lang_detect_exception.LangDetectException:
         return DEFAULT_LOCALE
+
+
+def get_grade_name(grade_level):
+    """
+    Return the name of an education grade.
+
+
+    :param grade_level: Level of the education grade to return the name.
+
+
+    :return: Name of the specified education grade.
+    """
+    for grade_name, grade_level_ in GRADE_NAMES.items():
+        if grade_level_ == grade_level:
+            return grade_name
+
+
+def parse_registration_id(value):
+    """
+    Convert the human-readable string of an application ID to an integer.
+
+
+    :param value: A string representation of an application ID, possibly
+        decomposed in groups of digits (cf. function
+        `prettify_registration_id`).
+
+
+    :return: An integer corresponding to the application ID.
+    """
+    return int(''.join([c for c in value if c.isdigit()]))
+
+
+def prettify_registration_id(id_):
+    """
+    Convert a application ID to human-readable string.
+
+
+    :param id_: Identification of a application.
+
+
+    :return: A string version of the application ID decomposed in groups
+        of 3 digits separated with a dash character.
+    """
+    segments = []
+    while id_ > 0:
+        segments.append(str(id_ % 1000).zfill(3))
+        id_ //= 1000
+
+    return '-'.join(reversed(segments))
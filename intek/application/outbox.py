@@ -0,0 +1,649 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import contextlib
+import enum
+import hashlib
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from .dispatcher import ConcurrentDispatcher
+from .dispatcher import DEFAULT_CONCURRENCY
+from .mailer import SmtpDeliveryUncertainError
+from .mailer import build_email_message
+
+
+# Default maximal number of attempts to send a message before it is
+# considered as failed.
+DEFAULT_MAX_ATTEMPTS = 5
+
+# Default delay in seconds before the first retry to send a message.
+# This delay doubles after each failed attempt.
+DEFAULT_RETRY_DELAY = 60
+
+# Default time in seconds the dispatcher waits for new messages when the
+# outbox has no message to send.
+DEFAULT_DISPATCHER_IDLE_TIME = 5
+
+# Status of a message stored in the outbox:
+#
+# - `pending`: the message is waiting to be sent, possibly after a failed
+#   attempt;
+#
+# - `sent`: the message has been sent;
+#
+# - `failed`: the message couldn't be sent after the maximal number of
+#   attempts;
+#
+# - `uncertain`: the connection to the SMTP server has been lost after
+#   the data of the message were sent, and the message may have been
+#   delivered.  The message is not sent again, unless its status is
+#   manually set back to `pending` after checking it hasn't been
+#   delivered.
+MessageStatus = enum.Enum(
+    'MessageStatus',
+    """
+    pending
+    sent
+    failed
+    uncertain
+    """
+)
+
+
+class OutboxMessage:
+    """
+    An e-mail stored in the outbox, waiting to be sent.
+    """
+    def __init__(
+            self,
+            message_key,
+            registration_id,
+            author_name,
+            author_email_address,
+            recipient_email_addresses,
+            subject,
+            content,
+            attachment_file_path_names=None,
+            attempt_count=0):
+        """
+        Build a new object `OutboxMessage`.
+
+
+        :param message_key: Idempotency key of the message.  Two messages with
+            the same key are the same message, which is sent only once.
+
+        :param registration_id: Identification of the application the message
+            is related to.
+
+        :param author_name: Complete name of the originator of the message.
+
+        :param author_email_address: Address of the mailbox to which the author
+            of the message suggests that replies be sent.
+
+        :param recipient_email_addresses: A list of the e-mail addresses of
+            the recipients of the message.
+
+        :param subject: Subject of the message.
+
+        :param content: HTML content of the message.
+
+        :param attachment_file_path_names: A list of absolute path and name of
+            the files to attach to the message.
+
+        :param attempt_count: Number of attempts already made to send this
+            message.
+        """
+        self.__message_key = message_key
+        self.__registration_id = registration_id
+        self.__author_name = author_name
+        self.__author_email_address = author_email_address
+        self.__recipient_email_addresses = recipient_email_addresses
+        self.__subject = subject
+        self.__content = content
+        self.__attachment_file_path_names = attachment_file_path_names or []
+        self.__attempt_count = attempt_count
+
+    @property
+    def attachment_file_path_names(self):
+        return self.__attachment_file_path_names
+
+    @property
+    def attempt_count(self):
+        return self.__attempt_count
+
+    @property
+    def author_email_address(self):
+        return self.__author_email_address
+
+    @property
+    def author_name(self):
+        return self.__author_name
+
+    @property
+    def content(self):
+        return self.__content
+
+    @staticmethod
+    def generate_message_key(registration_id, recipient_email_addresses, subject, content, tag=None):
+        """
+        Return the idempotency key of a message.
+
+        The key depends on the content of the message, so that a message is
+        sent again only if its content has been modified.
+
+
+        :param registration_id: Identification of the application the message
+            is related to.
+
+        :param recipient_email_addresses: A list of the e-mail addresses of
+            the recipients of the message.
+
+        :param subject: Subject of the message.
+
+        :param content: HTML content of the message.
+
+        :param tag: A string that distinguishes this message from the same
+            message sent with another tag, or without tag, so that it is sent
+            again even if its content has not been modified.
+
+
+        :return: A hexadecimal string of the SHA-256 digest of the message.
+        """
+        return hashlib.sha256('\x1f'.join([
+            str(registration_id),
+            ', '.join(sorted(recipient_email_addresses)),
+            subject,
+            content
+        ] + ([tag] if tag else [])).encode()).hexdigest()
+
+    @property
+    def message_key(self):
+        return self.__message_key
+
+    @property
+    def message_id(self):
+        """
+        Return the unique identifier of the message, derived from its
+        idempotency key, so that the same message sent twice has the same
+        identifier.
+
+
+        :return: A string corresponding to the header `Message-ID`.
+        """
+        return f'<{self.__message_key}@{self.__author_email_address.split("@")[-1]}>'
+
+    @property
+    def recipient_email_addresses(self):
+        return self.__recipient_email_addresses
+
+    @property
+    def registration_id(self):
+        return self.__registration_id
+
+    @property
+    def subject(self):
+        return self.__subject
+
+
+class EmailOutbox:
+    """
+    Durable queue of the e-mails to send, stored in a SQLite database.
+
+    The e-mails of an application are enqueued in one transaction once
+    this application has been stored in the master list.  A dispatcher
+    sends them independently from the processing of the applications.
+    """
+    def __init__(self, database_file_path_name):
+        """
+        Build a new object `EmailOutbox`, creating the database if it
+        doesn't exist.
+
+
+        :param database_file_path_name: Absolute path and name of the SQLite
+            database file.
+        """
+        self.__database_file_path_name = database_file_path_name
+
+        with self.__transaction() as connection:
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS outbox_message (
+                  message_key text PRIMARY KEY,
+                  registration_id integer NOT NULL,
+                  author_name text NULL,
+                  author_email_address text NOT NULL,
+                  recipient_email_addresses text NOT NULL,
+                  subject text NOT NULL,
+                  content text NOT NULL,
+                  attachment_file_path_names text NOT NULL,
+                  status text NOT NULL,
+                  attempt_count integer NOT NULL DEFAULT 0,
+                  next_attempt_time real NOT NULL,
+                  last_error text NULL,
+                  creation_time real NOT NULL,
+                  sent_time real NULL
+                );
+
+                CREATE INDEX IF NOT EXISTS outbox_message_status_next_attempt_time_idx
+                  ON outbox_message (status, next_attempt_time);
+                """)
+
+    @contextlib.contextmanager
+    def __transaction(self):
+        """
+        Return a connection to the database for the duration of a `with`
+        block, committing the transaction at the end of the block, or
+        rolling it back if an exception has been raised.
+
+
+        :return: An object `sqlite3.Connection`.
+        """
+        connection = sqlite3.connect(self.__database_file_path_name, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def count_messages(self, status):
+        """
+        Return the number of messages with the specified status.
+
+
+        :param status: An item of the enumeration `MessageStatus`.
+
+
+        :return: The number of messages.
+        """
+        with self.__transaction() as connection:
+            (count,) = connection.execute(
+                'SELECT count(*) FROM outbox_message WHERE status = ?',
+                (status.name,)).fetchone()
+
+        return count
+
+    def enqueue(self, messages):
+        """
+        Add messages to the outbox, in one transaction.
+
+        A message whose idempotency key is already stored in the outbox is
+        ignored.
+
+
+        :param messages: A list of objects `OutboxMessage`.
+
+
+        :return: The number of messages added to the outbox.
+        """
+        now = time.time()
+
+        with self.__transaction() as connection:
+            cursor = connection.executemany(
+                """
+                INSERT OR IGNORE INTO outbox_message(
+                    message_key,
+                    registration_id,
+                    author_name,
+                    author_email_address,
+                    recipient_email_addresses,
+                    subject,
+                    content,
+                    attachment_file_path_names,
+                    status,
+                    next_attempt_time,
+                    creation_time)
+                  VALUES
+                    (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        message.message_key,
+                        message.registration_id,
+                        message.author_name,
+                        message.author_email_address,
+                        json.dumps(message.recipient_email_addresses),
+                        message.subject,
+                        message.content,
+                        json.dumps(message.attachment_file_path_names),
+                        MessageStatus.pending.name,
+                        now,
+                        now
+                    )
+                    for message in messages
+                ])
+
+            return cursor.rowcount
+
+    def fetch_due_messages(self, limit=None):
+        """
+        Return the pending messages that are due to be sent.
+
+
+        :param limit: Maximal number of messages to return.
+
+
+        :return: A list of objects `OutboxMessage` sorted by the time they have
+            been enqueued.
+        """
+        with self.__transaction() as connection:
+            rows = connection.execute(
+                """
+                SELECT
+                    message_key,
+                    registration_id,
+                    author_name,
+                    author_email_address,
+                    recipient_email_addresses,
+                    subject,
+                    content,
+                    attachment_file_path_names,
+                    attempt_count
+                  FROM
+                    outbox_message
+                  WHERE
+                    status = ?
+                    AND next_attempt_time <= ?
+                  ORDER BY
+                    creation_time
+                  LIMIT ?
+                """,
+                (MessageStatus.pending.name, time.time(), -1 if limit is None else limit)).fetchall()
+
+        return [
+            OutboxMessage(
+                message_key,
+                registration_id,
+                author_name,
+                author_email_address,
+                json.loads(recipient_email_addresses),
+                subject,
+                content,
+                attachment_file_path_names=json.loads(attachment_file_path_names),
+                attempt_count=attempt_count)
+            for (message_key,
+                 registration_id,
+                 author_name,
+                 author_email_address,
+                 recipient_email_addresses,
+                 subject,
+                 content,
+                 attachment_file_path_names,
+                 attempt_count) in rows
+        ]
+
+    def mark_failed(
+            self,
+            message,
+            error,
+            max_attempts=DEFAULT_MAX_ATTEMPTS,
+            retry_delay=DEFAULT_RETRY_DELAY):
+        """
+        Record a failed attempt to send a message, and schedule the next
+        attempt with an exponential backoff.
+
+
+        :param message: An object `OutboxMessage`.
+
+        :param error: A string describing the error.
+
+        :param max_attempts: Maximal number of attempts to send a message
+            before it is considered as failed.
+
+        :param retry_delay: Delay in seconds before the first retry.
+
+
+        :return: An item of the enumeration `MessageStatus` of the message.
+        """
+        attempt_count = message.attempt_count + 1
+        status = MessageStatus.failed if attempt_count >= max_attempts else MessageStatus.pending
+
+        with self.__transaction() as connection:
+            connection.execute(
+                """
+                UPDATE outbox_message
+                  SET
+                    status = ?,
+                    attempt_count = ?,
+                    next_attempt_time = ?,
+                    last_error = ?
+                  WHERE
+                    message_key = ?
+                """,
+                (
+                    status.name,
+                    attempt_count,
+                    time.time() + retry_delay * 2 ** (attempt_count - 1),
+                    error,
+                    message.message_key
+                ))
+
+        return status
+
+    def mark_sent(self, message):
+        """
+        Record that a message has been sent.
+
+
+        :param message: An object `OutboxMessage`.
+        """
+        with self.__transaction() as connection:
+            connection.execute(
+                """
+                UPDATE outbox_message
+                  SET
+                    status = ?,
+                    attempt_count = attempt_count + 1,
+                    sent_time = ?
+                  WHERE
+                    message_key = ?
+                """,
+                (MessageStatus.sent.name, time.time(), message.message_key))
+
+    def mark_uncertain(self, message, error):
+        """
+        Record that a message may have been delivered, although the SMTP
+        server has not confirmed it, so that this message is not sent again.
+
+
+        :param message: An object `OutboxMessage`.
+
+        :param error: A string describing the error.
+        """
+        with self.__transaction() as connection:
+            connection.execute(
+                """
+                UPDATE outbox_message
+                  SET
+                    status = ?,
+                    attempt_count = attempt_count + 1,
+                    last_error = ?
+                  WHERE
+                    message_key = ?
+                """,
+                (MessageStatus.uncertain.name, error, message.message_key))
+
+
+class OutboxDispatcher(threading.Thread):
+    """
+    Thread that sends the messages of an outbox, retrying the messages
+    that failed to be sent.
+
+    The messages are sent concurrently by a pool of workers, which size
+    should match the size of the pool of connections of the mailer, at a
+    rate that can be limited to the quota of the SMTP server.
+    """
+    def __init__(
+            self,
+            outbox,
+            mailer,
+            idle_time=DEFAULT_DISPATCHER_IDLE_TIME,
+            max_attempts=DEFAULT_MAX_ATTEMPTS,
+            retry_delay=DEFAULT_RETRY_DELAY,
+            concurrency=DEFAULT_CONCURRENCY,
+            rate_limit=None):
+        """
+        Build a new object `OutboxDispatcher`.
+
+
+        :param outbox: An object `EmailOutbox`.
+
+        :param mailer: An object `Mailer` to send the messages with.
+
+        :param idle_time: Time in seconds the dispatcher waits for new
+            messages when the outbox has no message due to be sent.
+
+        :param max_attempts: Maximal number of attempts to send a message
+            before it is considered as failed.
+
+        :param retry_delay: Delay in seconds before the first retry to send
+            a message.
+
+        :param concurrency: Number of messages sent concurrently.
+
+        :param rate_limit: Maximal number of messages sent per second.  If
+            not defined, the rate is not limited.
+        """
+        super().__init__(name='OutboxDispatcher', daemon=True)
+        self.__outbox = outbox
+        self.__mailer = mailer
+        self.__idle_time = idle_time
+        self.__max_attempts = max_attempts
+        self.__retry_delay = retry_delay
+        self.__stop_event = threading.Event()
+
+        self.__workers = ConcurrentDispatcher(self.send, concurrency=concurrency, rate_limit=rate_limit)
+        self.__workers.start()
+
+    def dispatch(self):
+        """
+        Send the messages of the outbox that are due to be sent.
+
+
+        :return: The number of messages sent.
+        """
+        messages = self.__outbox.fetch_due_messages()
+        if not messages:
+            return 0
+
+        metrics = self.__workers.metrics
+        metrics.reset()
+
+        # Stop submitting the messages when the workers cannot keep up with
+        # them; the messages not submitted are still due to be sent, and
+        # they will be fetched again by the next dispatch.
+        for (i, message) in enumerate(messages):
+            try:
+                self.__workers.submit(message)
+            except queue.Full:
+                logging.warning(
+                    f"The workers cannot keep up with the messages of the outbox; "
+                    f"{len(messages) - i} messages are deferred to the next dispatch")
+                break
+
+        self.__workers.join()
+
+        logging.info(f"Dispatched the messages of the outbox: {metrics.summarize()}")
+
+        return metrics.message_count
+
+    @property
+    def metrics(self):
+        return self.__workers.metrics
+
+    def run(self):
+        while not self.__stop_event.is_set():
+            try:
+                self.dispatch()
+            except Exception:
+                logging.exception("Failed to dispatch the messages of the outbox")
+
+            self.__stop_event.wait(self.__idle_time)
+
+    def send(self, message):
+        """
+        Send a message of the outbox, and record the result of this attempt.
+
+
+        :param message: An object `OutboxMessage`.
+
+
+        :return: `True` if the message has been sent; `False` otherwise.
+        """
+        logging.info(f'Sending email to {", ".join(message.recipient_email_addresses)}...')
+
+        try:
+            self.__mailer.send_message(
+                build_email_message(
+                    message.author_name,
+                    message.author_email_address,
+                    message.recipient_email_addresses,
+                    message.subject,
+                    message.content,
+                    attachments=[
+                        self.__mailer.attachment_cache.get(file_path_name)
+                        for file_path_name in message.attachment_file_path_names
+                    ],
+                    message_id=message.message_id),
+                message.author_email_address,
+                message.recipient_email_addresses)
+
+        except SmtpDeliveryUncertainError as exception:
+            self.__outbox.mark_uncertain(message, str(exception))
+
+            logging.warning(
+                f'Failed to confirm the email to {", ".join(message.recipient_email_addresses)} '
+                f'has been sent ({exception}); the message is not sent again')
+
+            return False
+
+        except Exception as exception:
+            status = self.__outbox.mark_failed(
+                message,
+                str(exception),
+                max_attempts=self.__max_attempts,
+                retry_delay=self.__retry_delay)
+
+            logging.warning(
+                f'Failed to send email to {", ".join(message.recipient_email_addresses)} '
+                f'({exception}); the message is {status.name}')
+
+            return False
+
+        self.__outbox.mark_sent(message)
+
+        return True
+
+    def stop(self):
+        """
+        Request the dispatcher to stop, wait for the thread to terminate,
+        and send the messages that are still due to be sent.
+        """
+        self.__stop_event.set()
+        if self.is_alive():
+            self.join()
+
+        self.dispatch()
+        self.__workers.stop()
@@ -0,0 +1,193 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import concurrent.futures
+import enum
+import os
+
+from .attachment import AttachmentCache
+from .mailer import build_email_message
+
+
+# Number of messages handed at once to a worker process.
+DEFAULT_CHUNK_SIZE = 16
+
+# Format of the folder where the e-mails are written to:
+#
+# - `eml`: one file per e-mail, directly in the folder;
+#
+# - `maildir`: a Maildir, where the e-mails are written to the subfolder
+#   `tmp` and then moved to the subfolder `new`.
+EmailOutputFormat = enum.Enum(
+    'EmailOutputFormat',
+    """
+    eml
+    maildir
+    """
+)
+
+# Cache of the files attached to the e-mails, one per worker process.
+# The key corresponds to the maximal size in bytes of an image attachment,
+# and the value corresponds to an object `AttachmentCache`.
+ATTACHMENT_CACHES = dict()
+
+
+def build_file_name(registration_id, locale):
+    """
+    Return the name of the file of an e-mail.
+
+    The name only depends on the application and on the language of the
+    e-mail, so that the e-mails written by two runs can be compared.
+
+
+    :param registration_id: Identification of an application.
+
+    :param locale: An object `Locale` of the language of the e-mail.
+
+
+    :return: The name of the file.
+    """
+    return f'{registration_id}_{locale}.eml'
+
+
+def render_email_message(message, date, attachment_max_byte_count=None):
+    """
+    Return the binary representation of a message.
+
+    The headers and the MIME boundaries of the message only depend on the
+    content of the message, so that rendering the same message twice
+    produces the same bytes.
+
+
+    :param message: An object `OutboxMessage`.
+
+    :param date: Time, in seconds since the epoch, when the message has
+        been written.
+
+    :param attachment_max_byte_count: Maximal size in bytes of an image
+        attachment (cf. class `AttachmentCache`).
+
+
+    :return: The bytes of the message.
+    """
+    attachment_cache = ATTACHMENT_CACHES.get(attachment_max_byte_count)
+    if attachment_cache is None:
+        attachment_cache = ATTACHMENT_CACHES[attachment_max_byte_count] = \
+            AttachmentCache(max_byte_count=attachment_max_byte_count)
+
+    email_message = build_email_message(
+        message.author_name,
+        message.author_email_address,
+        message.recipient_email_addresses,
+        message.subject,
+        message.content,
+        attachments=[attachment_cache.get(file_path_name) for file_path_name in message.attachment_file_path_names],
+        message_id=message.message_id,
+        date=date)
+
+    email_message.set_boundary(f'==============={message.message_key[:32]}==')
+
+    return email_message.as_bytes()
+
+
+def write_email_message(job):
+    """
+    Render a message and write it to a file, in one buffered write.
+
+    The message is written to a temporary file which is then renamed, so
+    that a reader never sees a partially written message.
+
+
+    :param job: A tuple `(temporary_file_path_name, file_path_name,
+        message, date, attachment_max_byte_count)`.
+
+
+    :return: The number of bytes written.
+    """
+    temporary_file_path_name, file_path_name, message, date, attachment_max_byte_count = job
+
+    data = render_email_message(message, date, attachment_max_byte_count=attachment_max_byte_count)
+
+    with open(temporary_file_path_name, 'wb') as fd:
+        fd.write(data)
+
+    os.replace(temporary_file_path_name, file_path_name)
+
+    return len(data)
+
+
+def write_email_messages(
+        messages,
+        output_path,
+        output_format=EmailOutputFormat.eml,
+        max_workers=None,
+        attachment_max_byte_count=None):
+    """
+    Render messages and write them to a folder, instead of sending them.
+
+    The messages are rendered in parallel by a pool of worker processes.
+
+
+    :param messages: A list of tuples `(file_name, message, date)` where
+        `file_name` is the name of the file to write the message to,
+        `message` is an object `OutboxMessage`, and `date` is the time, in
+        seconds since the epoch, when the message has been written.
+
+    :param output_path: The absolute path of the folder to write the
+        messages to.
+
+    :param output_format: An item of the enumeration `EmailOutputFormat`.
+
+    :param max_workers: Number of worker processes.  Defaults to the
+        number of processors of the machine.
+
+    :param attachment_max_byte_count: Maximal size in bytes of an image
+        attachment (cf. class `AttachmentCache`).
+
+
+    :return: A tuple `(message_count, byte_count)` of the number of
+        messages and the number of bytes written.
+    """
+    if output_format == EmailOutputFormat.maildir:
+        temporary_path = os.path.join(output_path, 'tmp')
+        final_path = os.path.join(output_path, 'new')
+        os.makedirs(os.path.join(output_path, 'cur'), exist_ok=True)
+    else:
+        temporary_path = final_path = output_path
+
+    os.makedirs(temporary_path, exist_ok=True)
+    os.makedirs(final_path, exist_ok=True)
+
+    jobs = [
+        (
+            os.path.join(temporary_path, f'.{file_name}.tmp'),
+            os.path.join(final_path, file_name),
+            message,
+            date,
+            attachment_max_byte_count
+        )
+        for file_name, message, date in messages
+    ]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        byte_counts = list(executor.map(write_email_message, jobs, chunksize=DEFAULT_CHUNK_SIZE))
+
+    return len(byte_counts), sum(byte_counts)
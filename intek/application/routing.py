@@ -0,0 +1,423 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy as np
+
+from .geomath import calculate_distance_matrix
+from .geomath import haversine_distance
+from .geomath import project
+from .geomath import unproject
+from .stops import run_kmeans
+from .stops import select_initial_centroids
+
+
+# Maximal number of passes of the improvement of an assignment, where
+# families are moved to a cheaper bus that still has enough seats.
+DEFAULT_MAX_IMPROVEMENT_PASSES = 10
+
+
+class BusRoute:
+    """
+    Families assigned to a bus, in the order the bus picks them up, from
+    the depot to the school.
+    """
+    def __init__(self, bus_index, capacity, registrations, distance):
+        """
+        Build a new object `BusRoute`.
+
+
+        :param bus_index: Index of the bus in the list of bus capacities.
+
+        :param capacity: Number of children that the bus can transport.
+
+        :param registrations: A list of objects `Registration` of the
+            families in the order the bus picks them up.
+
+        :param distance: Length in meters of the route from the depot to the
+            school, as the crow flies between two consecutive stops.
+        """
+        self.__bus_index = bus_index
+        self.__capacity = capacity
+        self.__registrations = registrations
+        self.__distance = distance
+
+    @property
+    def bus_index(self):
+        return self.__bus_index
+
+    @property
+    def capacity(self):
+        return self.__capacity
+
+    @property
+    def children_count(self):
+        return sum([len(registration.children) for registration in self.__registrations])
+
+    @property
+    def distance(self):
+        return self.__distance
+
+    @property
+    def registrations(self):
+        return self.__registrations
+
+
+class BusAssignment:
+    """
+    Assignment of the families to the buses.
+    """
+    def __init__(self, routes, unassigned_registrations):
+        """
+        Build a new object `BusAssignment`.
+
+
+        :param routes: A list of objects `BusRoute`, one per bus.
+
+        :param unassigned_registrations: A list of objects `Registration` of
+            the families that couldn't be assigned to a bus, either because
+            their home has not been geocoded, or because no bus has enough
+            seats left for all their children.
+        """
+        self.__routes = routes
+        self.__unassigned_registrations = unassigned_registrations
+
+    @property
+    def routes(self):
+        return self.__routes
+
+    def summarize(self):
+        """
+        Return a human-readable summary of the assignment.
+
+
+        :return: A string.
+        """
+        children_count = sum([route.children_count for route in self.__routes])
+        capacity = sum([route.capacity for route in self.__routes])
+        return f"{len(self.__routes)} buses transport {children_count} children " \
+               f"({children_count / capacity if capacity else 0.0:.1%} of the seats) " \
+               f"over {self.total_distance / 1000:,.1f} km; " \
+               f"{len(self.__unassigned_registrations)} families unassigned"
+
+    @property
+    def total_distance(self):
+        return sum([route.distance for route in self.__routes])
+
+    @property
+    def unassigned_registrations(self):
+        return self.__unassigned_registrations
+
+
+def assign_families_to_buses(
+        registrations,
+        bus_capacities,
+        depot_location,
+        school_location,
+        max_improvement_passes=DEFAULT_MAX_IMPROVEMENT_PASSES,
+        seed=None):
+    """
+    Assign the families to buses, keeping the siblings in the same bus.
+
+    The homes of the families are first grouped around as many seed points
+    as buses, with a k-means algorithm weighted by the number of children.
+    The cost of assigning a family to a bus is the detour of the route from
+    the depot to the school, via the seed point of the bus, to pick up this
+    family.  The families are assigned by a regret heuristic: the families
+    that would lose the most to not be assigned to their cheapest bus are
+    assigned first, to the cheapest bus that still has enough seats for
+    all their children.  Families are then moved to a cheaper bus while
+    some seats are left.  Finally, the order the bus picks up the families
+    is determined by the nearest neighbour heuristic.
+
+
+    :param registrations: A list of objects `Registration`.
+
+    :param bus_capacities: A list of the number of children that each bus
+        can transport.
+
+    :param depot_location: A tuple `(latitude, longitude)` of the depot
+        where the buses start from.
+
+    :param school_location: A tuple `(latitude, longitude)` of the school.
+
+    :param max_improvement_passes: Maximal number of passes of the
+        improvement of the assignment.
+
+    :param seed: Seed of the random generator, to assign the families the
+        same way from the same applications.
+
+
+    :return: An object `BusAssignment`.
+    """
+    located_registrations = []
+    unassigned_registrations = []
+    locations = []
+
+    # The family is picked up at the home of the primary parent, or at the
+    # home of the secondary parent when the former has not been geocoded.
+    for registration in registrations:
+        location = next((parent.location for parent in registration.parents if parent.location), None)
+        if location:
+            located_registrations.append(registration)
+            locations.append((location.latitude, location.longitude))
+        else:
+            unassigned_registrations.append(registration)
+
+    capacities = np.array(bus_capacities, dtype=int)
+    if not located_registrations or len(capacities) == 0:
+        routes = [BusRoute(i, int(capacity), [], 0.0) for i, capacity in enumerate(capacities)]
+        return BusAssignment(routes, unassigned_registrations + located_registrations)
+
+    latitudes, longitudes = np.array(locations, dtype=float).T
+    demands = np.array([len(registration.children) for registration in located_registrations], dtype=int)
+
+    cost_matrix = calculate_detour_costs(
+        latitudes,
+        longitudes,
+        demands,
+        len(capacities),
+        depot_location,
+        school_location,
+        np.random.RandomState(seed))
+
+    labels = assign_by_regret(cost_matrix, demands, capacities)
+    improve_assignment(labels, cost_matrix, demands, capacities, max_improvement_passes)
+
+    routes = []
+    for bus_index, capacity in enumerate(capacities):
+        family_indices = np.flatnonzero(labels == bus_index)
+        order, distance = order_route(
+            latitudes[family_indices],
+            longitudes[family_indices],
+            depot_location,
+            school_location)
+        routes.append(BusRoute(
+            bus_index,
+            int(capacity),
+            [located_registrations[i] for i in family_indices[order]],
+            distance))
+
+    unassigned_registrations.extend([located_registrations[i] for i in np.flatnonzero(labels < 0)])
+
+    return BusAssignment(routes, unassigned_registrations)
+
+
+def assign_by_regret(cost_matrix, demands, capacities):
+    """
+    Assign items to bins of limited capacity, with a regret heuristic.
+
+    The regret of an item is the difference between its cost in the second
+    cheapest bin and its cost in the cheapest bin, among the bins that have
+    enough capacity left.  Items are assigned by decreasing regret to their
+    cheapest bin.  The regrets are calculated again each time a bin doesn't
+    have enough capacity left for the next item.
+
+
+    :param cost_matrix: An array of shape `(n, k)` of the cost of assigning
+        each item to each bin.
+
+    :param demands: An array of shape `(n,)` of the capacity that each item
+        takes.
+
+    :param capacities: An array of shape `(k,)` of the capacity of each bin.
+
+
+    :return: An array of shape `(n,)` of the index of the bin of each item,
+        or `-1` if the item couldn't be assigned.
+    """
+    labels = np.full(len(demands), -1, dtype=int)
+    remaining_capacities = np.array(capacities, dtype=int)
+
+    while True:
+        unassigned_indices = np.flatnonzero(labels < 0)
+        is_feasible = remaining_capacities[np.newaxis, :] >= demands[unassigned_indices, np.newaxis]
+        costs = np.where(is_feasible, cost_matrix[unassigned_indices], np.inf)
+
+        has_feasible_bin = is_feasible.any(axis=1)
+        if not has_feasible_bin.any():
+            break
+
+        unassigned_indices = unassigned_indices[has_feasible_bin]
+        costs = costs[has_feasible_bin]
+        best_bins = costs.argmin(axis=1)
+
+        # An item that fits in one bin only has an infinite regret.
+        if costs.shape[1] > 1:
+            sorted_costs = np.partition(costs, 1, axis=1)
+            with np.errstate(invalid='ignore'):
+                regrets = sorted_costs[:, 1] - sorted_costs[:, 0]
+        else:
+            regrets = np.zeros(len(costs))
+
+        for i in np.argsort(-regrets, kind='stable'):
+            bin_index = best_bins[i]
+            if remaining_capacities[bin_index] < demands[unassigned_indices[i]]:
+                break
+
+            labels[unassigned_indices[i]] = bin_index
+            remaining_capacities[bin_index] -= demands[unassigned_indices[i]]
+
+    return labels
+
+
+def calculate_detour_costs(latitudes, longitudes, weights, bus_count, depot_location, school_location, random_state):
+    """
+    Calculate the cost of assigning each home to each bus.
+
+    The homes are grouped around one seed point per bus.  The cost of a home
+    for a bus is the smallest detour to pick up this home on the way from
+    the depot to the seed point of this bus, or on the way from this seed
+    point to the school.
+
+
+    :param latitudes: An array of shape `(n,)` of the latitudes of the homes.
+
+    :param longitudes: An array of shape `(n,)` of the longitudes of the
+        homes.
+
+    :param weights: An array of shape `(n,)` of the number of children at
+        each home.
+
+    :param bus_count: Number of buses.
+
+    :param depot_location: A tuple `(latitude, longitude)` of the depot.
+
+    :param school_location: A tuple `(latitude, longitude)` of the school.
+
+    :param random_state: An object `numpy.random.RandomState`.
+
+
+    :return: An array of shape `(n, bus_count)` of distances in meters.
+    """
+    points, reference_latitude = project(latitudes, longitudes)
+    weights = weights.astype(float)
+
+    centroids = select_initial_centroids(points, weights, min(bus_count, len(points)), random_state)
+    centroids, _, _ = run_kmeans(points, weights, centroids)
+
+    # Buses beyond the number of homes share the seed points of the first
+    # buses.
+    centroids = centroids[np.arange(bus_count) % len(centroids)]
+    seed_latitudes, seed_longitudes = unproject(centroids, reference_latitude)
+
+    depot_latitude, depot_longitude = depot_location
+    school_latitude, school_longitude = school_location
+
+    home_to_seed = calculate_distance_matrix(latitudes, longitudes, seed_latitudes, seed_longitudes)
+    home_to_depot = haversine_distance(latitudes, longitudes, depot_latitude, depot_longitude)
+    home_to_school = haversine_distance(latitudes, longitudes, school_latitude, school_longitude)
+    depot_to_seed = haversine_distance(depot_latitude, depot_longitude, seed_latitudes, seed_longitudes)
+    seed_to_school = haversine_distance(seed_latitudes, seed_longitudes, school_latitude, school_longitude)
+
+    return np.minimum(
+        home_to_depot[:, np.newaxis] + home_to_seed - depot_to_seed[np.newaxis, :],
+        home_to_seed + home_to_school[:, np.newaxis] - seed_to_school[np.newaxis, :])
+
+
+def improve_assignment(labels, cost_matrix, demands, capacities, max_passes=DEFAULT_MAX_IMPROVEMENT_PASSES):
+    """
+    Move assigned items to a cheaper bin that has enough capacity left,
+    until no item can be moved anymore.
+
+
+    :param labels: An array of shape `(n,)` of the index of the bin of each
+        item, or `-1` if the item is not assigned.  The array is updated in
+        place.
+
+    :param cost_matrix: An array of shape `(n, k)` of the cost of assigning
+        each item to each bin.
+
+    :param demands: An array of shape `(n,)` of the capacity that each item
+        takes.
+
+    :param capacities: An array of shape `(k,)` of the capacity of each bin.
+
+    :param max_passes: Maximal number of passes over the items.
+    """
+    assigned_indices = np.flatnonzero(labels >= 0)
+    remaining_capacities = np.array(capacities, dtype=int) \
+        - np.bincount(labels[assigned_indices], weights=demands[assigned_indices], minlength=len(capacities)).astype(int)
+
+    for _ in range(max_passes):
+        # Consider the items with the largest savings first.
+        savings = cost_matrix[assigned_indices, labels[assigned_indices]] - cost_matrix[assigned_indices].min(axis=1)
+        candidate_indices = assigned_indices[savings > 0]
+        candidate_indices = candidate_indices[np.argsort(-savings[savings > 0], kind='stable')]
+
+        move_count = 0
+        for i in candidate_indices:
+            current_bin = labels[i]
+            costs = np.where(remaining_capacities >= demands[i], cost_matrix[i], np.inf)
+            best_bin = costs.argmin()
+            if costs[best_bin] < cost_matrix[i, current_bin]:
+                labels[i] = best_bin
+                remaining_capacities[best_bin] -= demands[i]
+                remaining_capacities[current_bin] += demands[i]
+                move_count += 1
+
+        if move_count == 0:
+            break
+
+
+def order_route(latitudes, longitudes, depot_location, school_location):
+    """
+    Order the homes that a bus picks up, from the depot to the school, with
+    the nearest neighbour heuristic.
+
+
+    :param latitudes: An array of the latitudes of the homes.
+
+    :param longitudes: An array of the longitudes of the homes.
+
+    :param depot_location: A tuple `(latitude, longitude)` of the depot.
+
+    :param school_location: A tuple `(latitude, longitude)` of the school.
+
+
+    :return: A tuple `(order, distance)` where `order` is an array of the
+        indices of the homes in the order they are picked up, and `distance`
+        is the length in meters of the route.
+    """
+    depot_latitude, depot_longitude = depot_location
+    school_latitude, school_longitude = school_location
+
+    if len(latitudes) == 0:
+        return np.zeros(0, dtype=int), float(haversine_distance(
+            depot_latitude, depot_longitude, school_latitude, school_longitude))
+
+    distance_matrix = calculate_distance_matrix(latitudes, longitudes)
+    np.fill_diagonal(distance_matrix, np.inf)
+
+    distances = haversine_distance(depot_latitude, depot_longitude, latitudes, longitudes)
+    index = int(distances.argmin())
+    distance = float(distances[index])
+    order = [index]
+
+    for _ in range(1, len(latitudes)):
+        distance_matrix[:, index] = np.inf
+        next_index = int(distance_matrix[index].argmin())
+        distance += float(distance_matrix[index, next_index])
+        order.append(next_index)
+        index = next_index
+
+    distance += float(haversine_distance(latitudes[index], longitudes[index], school_latitude, school_longitude))
+
+    return np.array(order, dtype=int), distance
@@ -0,0 +1,118 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+
+def get_column_name(column_index):
+    """
+    Return the name of a column of a sheet as referenced in the A1
+    notation.
+
+
+    :param column_index: Index of the column, starting with `0`.
+
+
+    :return: The name of the column (e.g., `A`, `Z`, `AA`).
+    """
+    column_name = ''
+    column_index += 1
+    while column_index > 0:
+        column_index, remainder = divmod(column_index - 1, 26)
+        column_name = chr(ord('A') + remainder) + column_name
+
+    return column_name
+
+
+def get_sheet_id(spreadsheets_resource, spreadsheet_id, sheet_name):
+    """
+    Return the identification of a sheet of a Google Sheets document.
+
+
+    :param spreadsheets_resource: An object `googleapiclient.discovery.Resource`
+        returned by the Google API client library.
+
+    :param spreadsheet_id: Identification of a Google Sheet document.
+
+    :param sheet_name: Name of a sheet in this Google Sheet document.
+
+
+    :return: An integer representing the identification of the sheet.
+
+
+    :raise ValueError: If the Google Sheets document doesn't contain a
+        sheet with the specified name.
+    """
+    spreadsheet_metadata = spreadsheets_resource.get(spreadsheetId=spreadsheet_id).execute()
+    for sheet in spreadsheet_metadata['sheets']:
+        properties = sheet.get('properties', {})
+        if properties['title'] == sheet_name:
+            return properties['sheetId']
+
+    raise ValueError(f"the Google Sheets doesn't contain the sheet {sheet_name}")
+
+
+def get_sheet_names(spreadsheets_resource, spreadsheet_id):
+    """
+    Return the names of all the sheets of a Google Sheets document.
+
+
+    :param spreadsheets_resource: An object `googleapiclient.discovery.Resource`
+        returned by the Google API client library.
+
+    :param spreadsheet_id: Identification of a Google Sheet document.
+
+
+    :return: A list of the names of the sheets that this Google Sheets
+        document contains.
+    """
+    spreadsheet_metadata = spreadsheets_resource.get(spreadsheetId=spreadsheet_id).execute()
+    sheets = spreadsheet_metadata['sheets']
+    return [sheet.get('properties', {})['title'] for sheet in sheets]
+
+
+def read_google_sheet_values(
+        spreadsheets_resource,
+        spreadsheet_id,
+        sheet_name,
+        sheet_range):
+    """
+    Return the values of the ranges of the sheet of a Google Sheets document.
+
+
+    :param spreadsheets_resource: An object `googleapiclient.discovery.Resource`
+        returned by the Google API client library.
+
+    :param spreadsheet_id: Identification of a Google Sheet document.
+
+    :param sheet_name: Name of a sheet in this Google Sheet document.
+
+    :param sheet_range: String representation of the range to return
+        values.
+
+
+    :return: A list of a arrays (lists) of values.
+    """
+    sheet_range_values = spreadsheets_resource.values().get(
+        spreadsheetId=spreadsheet_id,
+        range=f'{sheet_name}!{sheet_range}').execute()
+
+    range_values = sheet_range_values.get('values', [])
+
+    return range_values
@@ -0,0 +1,315 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import heapq
+
+import numpy as np
+
+from .geomath import EARTH_RADIUS
+from .geomath import haversine_distance
+from .geomath import project
+
+
+# Maximal number of homes stored in a leaf of the k-d tree.  The homes of
+# a leaf are compared to a query all at once.
+DEFAULT_LEAF_SIZE = 16
+
+# Relative margin added to the radius of a search on the projected homes,
+# to absorb the difference between the Euclidean distance on the plane
+# and the great-circle distance that the homes are finally filtered by.
+SEARCH_RADIUS_MARGIN = 0.01
+
+
+class SpatialIndex:
+    """
+    Index of the homes of the families, to find the families who live
+    around a location.
+
+    The homes are projected on a plane and stored in a k-d tree: each node
+    of the tree splits its homes in two halves along the axis where they
+    spread the most.  The homes of a node are stored contiguously, so that
+    the homes of a leaf are compared to a query with a single vectorized
+    operation.
+    """
+    def __init__(self, registrations, leaf_size=DEFAULT_LEAF_SIZE):
+        """
+        Build a new object `SpatialIndex`.
+
+
+        :param registrations: A list of objects `Registration`.  The homes of
+            the parents that have not been geocoded are ignored.
+
+        :param leaf_size: Maximal number of homes stored in a leaf of the tree.
+        """
+        self.__leaf_size = leaf_size
+
+        self.__registrations = []
+        self.__locations = []
+
+        for registration in registrations:
+            for location in set([parent.location for parent in registration.parents if parent.location]):
+                self.__registrations.append(registration)
+                self.__locations.append(location)
+
+        latitudes = np.array([location.latitude for location in self.__locations], dtype=float)
+        longitudes = np.array([location.longitude for location in self.__locations], dtype=float)
+
+        self.__reference_latitude = float(latitudes.mean()) if len(latitudes) else 0.0
+        points, _ = project(latitudes, longitudes, self.__reference_latitude)
+
+        # Nodes of the tree: bounding box `(x_min, y_min, x_max, y_max)` of the
+        # homes of a node, range `[start, end)` of these homes in the sorted
+        # arrays, and indices of the child nodes (`-1` for a leaf).
+        self.__boxes = []
+        self.__ranges = []
+        self.__children = []
+
+        self.__order = np.arange(len(points))
+        if len(points):
+            self.__build_node(points, 0, len(points))
+
+        self.__points = points[self.__order]
+        self.__latitudes = latitudes[self.__order]
+        self.__longitudes = longitudes[self.__order]
+
+    def __len__(self):
+        return len(self.__registrations)
+
+    def __build_node(self, points, start, end):
+        """
+        Build the node of the tree of a range of homes, and its child nodes.
+
+
+        :param points: An array of shape `(n, 2)` of the projected homes.
+
+        :param start: Index of the first home of the node in the order of the
+            tree.
+
+        :param end: Index after the last home of the node.
+
+
+        :return: Index of the node.
+        """
+        node_points = points[self.__order[start:end]]
+        low, high = node_points.min(axis=0), node_points.max(axis=0)
+
+        node = len(self.__boxes)
+        self.__boxes.append((float(low[0]), float(low[1]), float(high[0]), float(high[1])))
+        self.__ranges.append((start, end))
+        self.__children.append(None)
+
+        if end - start > self.__leaf_size:
+            axis = int((high - low).argmax())
+            middle = (start + end) // 2
+
+            indices = self.__order[start:end]
+            self.__order[start:end] = indices[np.argpartition(points[indices, axis], middle - start)]
+
+            left = self.__build_node(points, start, middle)
+            right = self.__build_node(points, middle, end)
+            self.__children[node] = (left, right)
+
+        return node
+
+    def __build_results(self, indices):
+        """
+        Return the homes of the given positions in the tree with their
+        distances to the query location.
+
+
+        :param indices: An array of positions of homes in the tree.
+
+
+        :return: A list of tuples `(registration, location)`.
+        """
+        return [
+            (self.__registrations[self.__order[i]], self.__locations[self.__order[i]])
+            for i in indices
+        ]
+
+    def __get_squared_distance_to_box(self, node, x, y):
+        x_min, y_min, x_max, y_max = self.__boxes[node]
+        dx = x_min - x if x < x_min else x - x_max if x > x_max else 0.0
+        dy = y_min - y if y < y_min else y - y_max if y > y_max else 0.0
+        return dx * dx + dy * dy
+
+    def __project(self, location):
+        points, _ = project([location[0]], [location[1]], self.__reference_latitude)
+        return float(points[0, 0]), float(points[0, 1])
+
+    def __sort_by_distance(self, indices, location):
+        """
+        Return homes sorted by their great-circle distance to a location.
+
+
+        :param indices: An array of positions of homes in the tree.
+
+        :param location: A tuple `(latitude, longitude)`.
+
+
+        :return: A list of tuples `(registration, location, distance)`.
+        """
+        distances = haversine_distance(self.__latitudes[indices], self.__longitudes[indices], location[0], location[1])
+        order = np.argsort(distances, kind='stable')
+
+        return [
+            (registration, location_, float(distance))
+            for (registration, location_), distance in zip(self.__build_results(indices[order]), distances[order])
+        ]
+
+    def find_nearest(self, location, count=1):
+        """
+        Return the homes nearest to a location.
+
+
+        :param location: A tuple `(latitude, longitude)`.
+
+        :param count: Maximal number of homes to return.
+
+
+        :return: A list of tuples `(registration, location, distance)` of the
+            homes sorted by increasing distance in meters.
+        """
+        if not self.__boxes or count <= 0:
+            return []
+
+        x, y = self.__project(location)
+
+        best_indices = np.zeros(0, dtype=int)
+        best_squared_distances = np.zeros(0)
+
+        # Visit the nodes by increasing distance to the location, until the
+        # nearest node is farther than the farthest home found so far.
+        heap = [(0.0, 0)]
+        while heap:
+            squared_distance, node = heapq.heappop(heap)
+            if len(best_indices) == count and squared_distance > best_squared_distances[-1]:
+                break
+
+            children = self.__children[node]
+            if children:
+                for child in children:
+                    heapq.heappush(heap, (self.__get_squared_distance_to_box(child, x, y), child))
+            else:
+                start, end = self.__ranges[node]
+                squared_distances = ((self.__points[start:end] - (x, y)) ** 2).sum(axis=1)
+
+                best_indices = np.concatenate((best_indices, np.arange(start, end)))
+                best_squared_distances = np.concatenate((best_squared_distances, squared_distances))
+                order = np.argsort(best_squared_distances, kind='stable')[:count]
+                best_indices, best_squared_distances = best_indices[order], best_squared_distances[order]
+
+        return self.__sort_by_distance(best_indices, location)
+
+    def find_within_bounding_box(self, south_west, north_east):
+        """
+        Return the homes within a bounding box.
+
+
+        :param south_west: A tuple `(latitude, longitude)` of the south-west
+            corner of the bounding box.
+
+        :param north_east: A tuple `(latitude, longitude)` of the north-east
+            corner of the bounding box.
+
+
+        :return: A list of tuples `(registration, location)` of the homes.
+        """
+        if not self.__boxes:
+            return []
+
+        # The projection is linear in latitude and longitude, so the bounding
+        # box remains a rectangle aligned with the axes.
+        x_min, y_min = self.__project(south_west)
+        x_max, y_max = self.__project(north_east)
+
+        indices = []
+        nodes = [0]
+        while nodes:
+            node = nodes.pop()
+            box_x_min, box_y_min, box_x_max, box_y_max = self.__boxes[node]
+            if box_x_min > x_max or box_x_max < x_min or box_y_min > y_max or box_y_max < y_min:
+                continue
+
+            start, end = self.__ranges[node]
+            if x_min <= box_x_min and box_x_max <= x_max and y_min <= box_y_min and box_y_max <= y_max:
+                indices.append(np.arange(start, end))
+            elif self.__children[node]:
+                nodes.extend(self.__children[node])
+            else:
+                points = self.__points[start:end]
+                is_inside = (points[:, 0] >= x_min) & (points[:, 0] <= x_max) \
+                    & (points[:, 1] >= y_min) & (points[:, 1] <= y_max)
+                indices.append(start + np.flatnonzero(is_inside))
+
+        return self.__build_results(np.sort(np.concatenate(indices)) if indices else [])
+
+    def find_within_radius(self, location, radius):
+        """
+        Return the homes within a distance of a location.
+
+
+        :param location: A tuple `(latitude, longitude)`.
+
+        :param radius: Distance in meters.
+
+
+        :return: A list of tuples `(registration, location, distance)` of the
+            homes sorted by increasing distance in meters.
+        """
+        if not self.__boxes:
+            return []
+
+        # The scale of the projection along the longitudes is exact only at
+        # the reference latitude: the projected distance of a home can exceed
+        # its great-circle distance by the ratio of the cosine of the
+        # reference latitude to the cosine of the latitude of this home.  The
+        # tree is searched with a radius enlarged by this ratio, and the homes
+        # found are then filtered by their great-circle distance.
+        farthest_latitude = min(89.0, abs(location[0]) + np.degrees(radius / EARTH_RADIUS))
+        scale_ratio = max(1.0, np.cos(np.radians(self.__reference_latitude)) / np.cos(np.radians(farthest_latitude)))
+        search_radius = radius * scale_ratio * (1 + SEARCH_RADIUS_MARGIN)
+
+        x, y = self.__project(location)
+        squared_radius = search_radius * search_radius
+
+        indices = []
+        nodes = [0]
+        while nodes:
+            node = nodes.pop()
+            if self.__get_squared_distance_to_box(node, x, y) > squared_radius:
+                continue
+
+            children = self.__children[node]
+            if children:
+                nodes.extend(children)
+            else:
+                start, end = self.__ranges[node]
+                squared_distances = ((self.__points[start:end] - (x, y)) ** 2).sum(axis=1)
+                indices.append(start + np.flatnonzero(squared_distances <= squared_radius))
+
+        return [
+            (registration, location_, distance)
+            for registration, location_, distance in self.__sort_by_distance(
+                np.concatenate(indices) if indices else np.zeros(0, dtype=int),
+                location)
+            if distance <= radius
+        ]
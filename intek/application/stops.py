@@ -0,0 +1,399 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import numpy as np
+
+from .geomath import get_home_locations
+from .geomath import haversine_distance
+from .geomath import project
+from .geomath import unproject
+
+
+# Default maximal distance in meters that a child walks from home to a
+# bus stop.
+DEFAULT_MAX_WALKING_DISTANCE = 500
+
+# Default maximal number of iterations of the k-means algorithm.
+DEFAULT_MAX_ITERATIONS = 100
+
+# Distance in meters below which the bus stops are considered as not
+# moving anymore between two iterations of the k-means algorithm.
+CONVERGENCE_TOLERANCE = 1.0
+
+
+class BusStop:
+    """
+    A bus stop proposed to the families living around.
+    """
+    def __init__(self, latitude, longitude, registration_ids, children_count, walking_distances):
+        """
+        Build a new object `BusStop`.
+
+
+        :param latitude: Latitude of the bus stop.
+
+        :param longitude: Longitude of the bus stop.
+
+        :param registration_ids: A list of the IDs of the applications of the
+            families assigned to this bus stop.
+
+        :param children_count: Number of children assigned to this bus stop.
+
+        :param walking_distances: An array of the distances in meters between
+            the homes assigned to this bus stop and the bus stop.
+        """
+        self.__latitude = latitude
+        self.__longitude = longitude
+        self.__registration_ids = registration_ids
+        self.__children_count = children_count
+        self.__walking_distances = walking_distances
+
+    @property
+    def children_count(self):
+        return self.__children_count
+
+    @property
+    def home_count(self):
+        return len(self.__walking_distances)
+
+    @property
+    def latitude(self):
+        return self.__latitude
+
+    @property
+    def longitude(self):
+        return self.__longitude
+
+    @property
+    def max_walking_distance(self):
+        return float(self.__walking_distances.max()) if len(self.__walking_distances) else 0.0
+
+    @property
+    def mean_walking_distance(self):
+        return float(self.__walking_distances.mean()) if len(self.__walking_distances) else 0.0
+
+    @property
+    def registration_ids(self):
+        return self.__registration_ids
+
+
+class BusStopPlan:
+    """
+    Bus stops proposed for the homes of the families, with the coverage of
+    these homes within a maximal walking distance.
+    """
+    def __init__(self, stops, walking_distances, children_counts, max_walking_distance):
+        """
+        Build a new object `BusStopPlan`.
+
+
+        :param stops: A list of objects `BusStop`.
+
+        :param walking_distances: An array of the distances in meters between
+            each home and its bus stop.
+
+        :param children_counts: An array of the number of children living at
+            each home.
+
+        :param max_walking_distance: Maximal distance in meters that a child
+            walks from home to a bus stop.
+        """
+        self.__stops = stops
+        self.__walking_distances = walking_distances
+        self.__children_counts = children_counts
+        self.__max_walking_distance = max_walking_distance
+
+    @property
+    def children_count(self):
+        return int(self.__children_counts.sum())
+
+    @property
+    def covered_children_count(self):
+        return int(self.__children_counts[self.__walking_distances <= self.__max_walking_distance].sum())
+
+    @property
+    def covered_home_count(self):
+        return int((self.__walking_distances <= self.__max_walking_distance).sum())
+
+    @property
+    def coverage(self):
+        """
+        Return the ratio of the homes within the maximal walking distance of
+        their bus stop.
+
+
+        :return: A number between `0.0` and `1.0`.
+        """
+        return self.covered_home_count / self.home_count if self.home_count else 1.0
+
+    def get_walking_distance_percentile(self, percentile):
+        """
+        Return a percentile of the distances between the homes and their bus
+        stop.
+
+
+        :param percentile: A number between `0` and `100`.
+
+
+        :return: The distance in meters.
+        """
+        return float(np.percentile(self.__walking_distances, percentile)) if self.home_count else 0.0
+
+    @property
+    def home_count(self):
+        return len(self.__walking_distances)
+
+    @property
+    def max_walking_distance(self):
+        return self.__max_walking_distance
+
+    @property
+    def stops(self):
+        return self.__stops
+
+    def summarize(self):
+        """
+        Return a human-readable summary of the coverage of the homes.
+
+
+        :return: A string.
+        """
+        return f"{len(self.__stops)} bus stops cover {self.covered_home_count}/{self.home_count} homes " \
+               f"({self.coverage:.1%}) and {self.covered_children_count}/{self.children_count} children " \
+               f"within {self.__max_walking_distance} m; walking distance " \
+               f"p50 {self.get_walking_distance_percentile(50):.0f} m, " \
+               f"p90 {self.get_walking_distance_percentile(90):.0f} m, " \
+               f"max {self.get_walking_distance_percentile(100):.0f} m"
+
+
+def assign_points(points, centroids):
+    """
+    Assign each point to its nearest centroid.
+
+
+    :param points: An array of shape `(n, 2)`.
+
+    :param centroids: An array of shape `(k, 2)`.
+
+
+    :return: A tuple `(labels, squared_distances)` of arrays of shape `(n,)`
+        of the index of the nearest centroid of each point, and of the
+        squared distance to this centroid.
+    """
+    # |p - c|² = |p|² - 2 p·c + |c|², which avoids building an array of
+    # shape `(n, k, 2)`.
+    squared_distances = (points ** 2).sum(axis=1)[:, np.newaxis] \
+        - 2 * points @ centroids.T \
+        + (centroids ** 2).sum(axis=1)[np.newaxis, :]
+
+    labels = squared_distances.argmin(axis=1)
+    return labels, np.maximum(squared_distances[np.arange(len(points)), labels], 0.0)
+
+
+def find_farthest_points(labels, squared_distances):
+    """
+    Return the point the farthest from its centroid in each cluster.
+
+
+    :param labels: An array of shape `(n,)` of the index of the centroid of
+        each point.
+
+    :param squared_distances: An array of shape `(n,)` of the squared
+        distance of each point to its centroid.
+
+
+    :return: An array of the indices of the farthest points, sorted by
+        decreasing distance.
+    """
+    # Sort the points by centroid, then by decreasing distance, and keep
+    # the first point of each centroid.
+    order = np.lexsort((-squared_distances, labels))
+    first_positions = np.concatenate(([0], np.flatnonzero(np.diff(labels[order])) + 1))
+    indices = order[first_positions]
+
+    return indices[np.argsort(-squared_distances[indices], kind='stable')]
+
+
+def propose_bus_stops(
+        registrations,
+        stop_count,
+        max_walking_distance=DEFAULT_MAX_WALKING_DISTANCE,
+        max_stop_count=None,
+        max_iterations=DEFAULT_MAX_ITERATIONS,
+        seed=None):
+    """
+    Propose bus stops for the homes of the families.
+
+    The homes are projected on a plane and grouped with a weighted k-means
+    algorithm, initialized with k-means++, where the weight of a home is
+    the number of children living there.  When some homes are farther from
+    their bus stop than the maximal walking distance, bus stops are added
+    at the farthest homes, up to the maximal number of bus stops, and the
+    bus stops are moved again.
+
+
+    :param registrations: A list of objects `Registration`.
+
+    :param stop_count: Number of bus stops to propose.
+
+    :param max_walking_distance: Maximal distance in meters that a child
+        walks from home to a bus stop.
+
+    :param max_stop_count: Maximal number of bus stops that can be proposed
+        to cover all the homes within the maximal walking distance.
+        Defaults to `stop_count`.
+
+    :param max_iterations: Maximal number of iterations of the k-means
+        algorithm.
+
+    :param seed: Seed of the random generator, to propose the same bus stops
+        from the same homes.
+
+
+    :return: An object `BusStopPlan`.
+    """
+    registration_indices, latitudes, longitudes = get_home_locations(registrations)
+    registration_ids = np.array([registration.registration_id for registration in registrations], dtype=np.int64)
+    registration_ids = registration_ids[registration_indices]
+    children_counts = np.array([len(registration.children) for registration in registrations], dtype=float)
+    children_counts = children_counts[registration_indices]
+    if len(registration_ids) == 0:
+        return BusStopPlan([], np.zeros(0), np.zeros(0), max_walking_distance)
+
+    points, reference_latitude = project(latitudes, longitudes)
+    random_state = np.random.RandomState(seed)
+
+    stop_count = min(stop_count, len(points))
+    max_stop_count = min(max(max_stop_count or stop_count, stop_count), len(points))
+
+    centroids = select_initial_centroids(points, children_counts, stop_count, random_state)
+    centroids, labels, squared_distances = run_kmeans(points, children_counts, centroids, max_iterations)
+
+    # Add a bus stop at the farthest home of each bus stop that doesn't
+    # cover all its homes, rather than one bus stop at a time, to converge
+    # in a few rounds.
+    while len(centroids) < max_stop_count and squared_distances.max() > max_walking_distance ** 2:
+        farthest_point_indices = find_farthest_points(labels, squared_distances)
+        is_uncovered = squared_distances[farthest_point_indices] > max_walking_distance ** 2
+        farthest_point_indices = farthest_point_indices[is_uncovered][:max_stop_count - len(centroids)]
+
+        centroids = np.vstack((centroids, points[farthest_point_indices]))
+        centroids, labels, squared_distances = run_kmeans(points, children_counts, centroids, max_iterations)
+
+    stop_latitudes, stop_longitudes = unproject(centroids, reference_latitude)
+    walking_distances = haversine_distance(latitudes, longitudes, stop_latitudes[labels], stop_longitudes[labels])
+
+    stops = []
+    for i in range(len(centroids)):
+        is_assigned = labels == i
+        stops.append(BusStop(
+            float(stop_latitudes[i]),
+            float(stop_longitudes[i]),
+            sorted(set(registration_ids[is_assigned].tolist())),
+            int(children_counts[is_assigned].sum()),
+            walking_distances[is_assigned]))
+
+    return BusStopPlan(stops, walking_distances, children_counts, max_walking_distance)
+
+
+def run_kmeans(points, weights, centroids, max_iterations=DEFAULT_MAX_ITERATIONS):
+    """
+    Move centroids to the weighted means of the points assigned to them,
+    until they don't move anymore (Lloyd's algorithm).
+
+    A centroid that has no point assigned is moved to the point that is
+    the farthest from its centroid.
+
+
+    :param points: An array of shape `(n, 2)`.
+
+    :param weights: An array of shape `(n,)` of the weights of the points.
+
+    :param centroids: An array of shape `(k, 2)` of the initial centroids.
+
+    :param max_iterations: Maximal number of iterations.
+
+
+    :return: A tuple `(centroids, labels, squared_distances)` of the final
+        centroids, of the index of the centroid of each point, and of the
+        squared distance of each point to its centroid.
+    """
+    centroids = np.array(centroids, dtype=float)
+    centroid_count = len(centroids)
+
+    for _ in range(max_iterations):
+        labels, squared_distances = assign_points(points, centroids)
+
+        total_weights = np.bincount(labels, weights=weights, minlength=centroid_count)
+        new_centroids = np.column_stack((
+            np.bincount(labels, weights=weights * points[:, 0], minlength=centroid_count),
+            np.bincount(labels, weights=weights * points[:, 1], minlength=centroid_count)))
+
+        is_empty = total_weights == 0
+        new_centroids[~is_empty] /= total_weights[~is_empty, np.newaxis]
+
+        for i in np.flatnonzero(is_empty):
+            farthest_point_index = squared_distances.argmax()
+            new_centroids[i] = points[farthest_point_index]
+            squared_distances[farthest_point_index] = 0.0
+
+        shift = np.sqrt(((new_centroids - centroids) ** 2).sum(axis=1)).max()
+        centroids = new_centroids
+        if shift < CONVERGENCE_TOLERANCE:
+            break
+
+    labels, squared_distances = assign_points(points, centroids)
+    return centroids, labels, squared_distances
+
+
+def select_initial_centroids(points, weights, count, random_state):
+    """
+    Select the initial centroids of the k-means algorithm among the points
+    (k-means++): each new centroid is drawn with a probability proportional
+    to the weight of a point and to its squared distance to the nearest
+    centroid already selected.
+
+
+    :param points: An array of shape `(n, 2)`.
+
+    :param weights: An array of shape `(n,)` of the weights of the points.
+
+    :param count: Number of centroids to select.
+
+    :param random_state: An object `numpy.random.RandomState`.
+
+
+    :return: An array of shape `(count, 2)`.
+    """
+    probabilities = weights / weights.sum()
+    centroids = [points[random_state.choice(len(points), p=probabilities)]]
+    squared_distances = ((points - centroids[0]) ** 2).sum(axis=1)
+
+    for _ in range(1, count):
+        scores = weights * squared_distances
+        total_score = scores.sum()
+        index = random_state.choice(len(points), p=scores / total_score) if total_score > 0 \
+            else random_state.randint(len(points))
+
+        centroids.append(points[index])
+        squared_distances = np.minimum(squared_distances, ((points - points[index]) ** 2).sum(axis=1))
+
+    return np.array(centroids)
@@ -0,0 +1,165 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import enum
+import os
+import pickle
+
+
+# Status of an application form submitted by a family, compared to the
+# application forms that this family has previously submitted:
+#
+# - `new`: the family submits its application for the first time;
+#
+# - `resubmitted_changed`: the family submits again its application with
+#   some information that has been modified;
+#
+# - `resubmitted_identical`: the family submits again its application
+#   with the exact same information, or the same submission is read again;
+#
+# - `outdated`: the submission is older than the most recent submission
+#   of the family already indexed, or submitted at the same time with a
+#   smaller digest, and it needs to be ignored.
+SubmissionStatus = enum.Enum(
+    'SubmissionStatus',
+    """
+    new
+    resubmitted_changed
+    resubmitted_identical
+    outdated
+    """
+)
+
+
+class RegistrationIndex:
+    """
+    Index of the application forms submitted by the families.
+
+    The index keeps, for each registration ID, the date and time of the
+    most recent application form that the family submitted, and the digest
+    of the information entered in this form.  The index is updated as the
+    applications are read, in constant time per application, and it is
+    persisted between two executions of the script so that a family who
+    submits a corrected application after its first application has been
+    processed is detected.
+    """
+    def __init__(self, entries=None):
+        """
+        Build a new object `RegistrationIndex`.
+
+
+        :param entries: A dictionary where the key corresponds to a
+            registration ID, and the value corresponds to a tuple
+            `(registration_time, content_hash)` of the most recent application
+            submitted by the family.
+        """
+        self.__entries = entries or dict()
+
+    def __contains__(self, registration_id):
+        return registration_id in self.__entries
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get_content_hash(self, registration_id):
+        """
+        Return the digest of the most recent application of a family.
+
+
+        :param registration_id: Identification of the application of a
+            family.
+
+
+        :return: A hexadecimal string of the digest, or `None` if no
+            application of this family has been indexed.
+        """
+        entry = self.__entries.get(registration_id)
+        return entry and entry[1]
+
+    @classmethod
+    def load(cls, file_path_name):
+        """
+        Load an index from the file it has been previously saved in.
+
+
+        :param file_path_name: The absolute path and name of the file where
+            the index is stored in.
+
+
+        :return: An object `RegistrationIndex`, which is empty if the file
+            doesn't exist.
+        """
+        if not os.path.exists(file_path_name):
+            return RegistrationIndex()
+
+        with open(file_path_name, 'rb') as fd:
+            return RegistrationIndex(pickle.load(fd))
+
+    def save(self, file_path_name):
+        """
+        Save the index to a file.
+
+        The index is written to a temporary file which is then renamed, so
+        that an interrupted execution doesn't corrupt the index previously
+        saved.
+
+
+        :param file_path_name: The absolute path and name of the file where
+            to store the index in.
+        """
+        temporary_file_path_name = f'{file_path_name}.tmp'
+        with open(temporary_file_path_name, 'wb') as fd:
+            pickle.dump(self.__entries, fd)
+
+        os.replace(temporary_file_path_name, file_path_name)
+
+    def update(self, registration):
+        """
+        Index an application submitted by a family.
+
+
+        :param registration: An object `Registration`.
+
+
+        :return: An item of the enumeration `SubmissionStatus` that indicates
+            how this application compares with the most recent application of
+            the family already indexed.
+        """
+        entry = self.__entries.get(registration.registration_id)
+
+        if entry is None:
+            self.__entries[registration.registration_id] = \
+                (registration.registration_time, registration.content_hash)
+            return SubmissionStatus.new
+
+        registration_time, content_hash = entry
+
+        # Two applications submitted at the same time are ordered by their
+        # digest, so that the same application is kept whatever the order in
+        # which they are read.
+        if (registration.registration_time, registration.content_hash) < (registration_time, content_hash):
+            return SubmissionStatus.outdated
+
+        self.__entries[registration.registration_id] = \
+            (registration.registration_time, registration.content_hash)
+
+        return SubmissionStatus.resubmitted_identical if registration.content_hash == content_hash \
+            else SubmissionStatus.resubmitted_changed
@@ -0,0 +1,259 @@
+# Copyright (C) 2020 Intek Institute.  All rights reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+import os
+import re
+
+
+# Regular expression matching the pattern of a placeholder where its
+# name needs to be replaced by its corresponding value.
+#
+# Placeholder names are surrounded by "::" and "::".  Placeholder names
+# must consist of any letter (A-Z), any digit (0-9), an underscore, or
+# a dot.  Placeholder names must start with a letter.
+REGEX_PLACEHOLDER_NAME = re.compile(r'::([a-z][a-z0-9_.]*)::', re.IGNORECASE)
+
+
+class EmailTemplate:
+    """
+    HTML e-mail template compiled into a sequence of literal segments and
+    placeholders.
+
+    Rendering a compiled template consists in joining its literal segments
+    with the values of its placeholders, without scanning the template
+    again.  The subject of the e-mail, taken from the title of the HTML
+    template, is compiled as well.
+    """
+    # Cache of the templates already compiled.  The key corresponds to the
+    # absolute path and name of a template file, and the value corresponds
+    # to a tuple `(modification_time, template)`.
+    __templates_cache = dict()
+
+    def __init__(self, content):
+        """
+        Build a new object `EmailTemplate`.
+
+
+        :param content: The content of a HTML e-mail template with
+            placeholders to be replaced with their corresponding values.
+
+
+        :raise AssertError: If this HTML template has no title defined.
+        """
+        self.__content = content
+        self.__segments, self.__placeholder_positions = self.__compile(content)
+        self.__placeholder_names = set([name for _, name in self.__placeholder_positions])
+
+        subject = get_email_subject(content)
+        self.__subject_segments, self.__subject_placeholder_positions = self.__compile(subject)
+
+    @staticmethod
+    def __compile(content):
+        """
+        Split a content into literal segments and placeholders.
+
+
+        :param content: A content with placeholders.
+
+
+        :return: A tuple `(segments, placeholder_positions)` where `segments`
+            is the list of the literal segments of the content, interleaved
+            with the names of the placeholders, and `placeholder_positions` is
+            a list of tuples `(index, name)` of the placeholders in `segments`.
+        """
+        segments = []
+        placeholder_positions = []
+        offset = 0
+
+        for match in REGEX_PLACEHOLDER_NAME.finditer(content):
+            segments.append(content[offset:match.start()])
+            placeholder_positions.append((len(segments), match.group(1)))
+            segments.append(match.group(1))
+            offset = match.end()
+
+        segments.append(content[offset:])
+
+        return segments, placeholder_positions
+
+    @staticmethod
+    def __join(segments, placeholder_positions, placeholders):
+        parts = list(segments)
+        for index, name in placeholder_positions:
+            parts[index] = placeholders[name]
+
+        return ''.join(parts)
+
+    @property
+    def content(self):
+        return self.__content
+
+    @classmethod
+    def load(cls, file_path_name):
+        """
+        Return the compiled template of a file.
+
+        The template is compiled once, and compiled again only when the file
+        has been modified.
+
+
+        :param file_path_name: The absolute path and name of a HTML e-mail
+            template file.
+
+
+        :return: An object `EmailTemplate`.
+        """
+        modification_time = os.stat(file_path_name).st_mtime
+        modification_time_, template = cls.__templates_cache.get(file_path_name, (None, None))
+
+        if modification_time_ != modification_time:
+            with open(file_path_name, 'rt', encoding='utf-8') as fd:
+                template = EmailTemplate(fd.read())
+
+            cls.__templates_cache[file_path_name] = (modification_time, template)
+
+        return template
+
+    @property
+    def placeholder_names(self):
+        return self.__placeholder_names
+
+    def render(self, placeholders, ignore_unused_placeholders=False):
+        """
+        Return the subject and the content of the template where the
+        placeholders have been replaced with their corresponding values.
+
+
+        :param placeholders: A dictionary where the key corresponds to the
+            name of a placeholder, the value corresponding to the value of the
+            placeholder.
+
+        :param ignore_unused_placeholders: Indicate whether to ignore
+            placeholders that would have been defined but that would have not
+            been declared in the template.
+
+
+        :return: A tuple `(subject, content)`.
+
+
+        :raise AssertError: If a placeholder declared in the template has not
+            been defined, or if a placeholder has been defined but not declared
+            in the template while `ignore_unused_placeholders` is `False`.
+        """
+        undefined_placeholder_names = self.__placeholder_names.difference(placeholders)
+        assert len(undefined_placeholder_names) == 0, \
+            "the following placeholders are declared but have not been defined: " \
+            f"{','.join(undefined_placeholder_names)}"
+
+        if not ignore_unused_placeholders:
+            unused_placeholder_names = set(placeholders).difference(self.__placeholder_names)
+            assert len(unused_placeholder_names) == 0, \
+                "the following placeholders are defined but have not been declared: " \
+                f"{','.join(unused_placeholder_names)}"
+
+        subject = self.__join(self.__subject_segments, self.__subject_placeholder_positions, placeholders)
+        content = self.__join(self.__segments, self.__placeholder_positions, placeholders)
+
+        return subject, content
+
+
+def expand_placeholders_value(content, placeholders, ignore_unused_placeholders=False):
+    """
+    Replace the placeholders defined in the given content with their
+    corresponding values.
+
+
+    :param content: The content with placeholders {{placeholder}} to be
+        replaced with their corresponding values.
+
+    :param placeholders: A dictionary where the key corresponds to the
+        name of a placeholder, the value corresponding to the value of the
+        placeholder.
+
+    :param ignore_unused_placeholders: Indicate whether to ignore
+        placeholders that would have been defined but that would have not
+        been declared in the given content.
+
+
+    :return: The content where the placeholders have been replaced with
+        their corresponding values.
+    """
+    # Find the list of placeholder names that have been used in the given
+    # document but that have not been defined with a corresponding value.
+    used_placeholders = set([
+        (match.group(0), match.group(1))
+        for match in REGEX_PLACEHOLDER_NAME.finditer(content)
+    ])
+
+    used_placeholder_names = [name for (_, name) in used_placeholders]
+
+    if used_placeholders:
+        undefined_placeholder_names = [
+            name
+            for name in used_placeholder_names
+            if name not in placeholders
+        ]
+
+        assert len(undefined_placeholder_names) == 0, \
+            "the following placeholders are declared but have not been defined: " \
+            f"{','.join(undefined_placeholder_names)}"
+
+    # Find the list of placeholder names that have been defined but have not
+    # been used in the given document.
+    if placeholders:
+        unused_placeholder_names = [
+            name
+            for name in placeholders
+            if name not in used_placeholder_names
+        ]
+
+        if len(unused_placeholder_names) > 0:
+            assert ignore_unused_placeholders, \
+                "the following placeholders are defined but have not been declared: " \
+                f"{','.join(unused_placeholder_names)}"
+
+    # Replace the placeholders referred in the content by their
+    # corresponding value.
+    for (placeholder_expression, placeholder_name) in used_placeholders:
+        content = content.replace(placeholder_expression, placeholders[placeholder_name])
+
+    return content
+
+
+def get_email_subject(content):
+    """
+    Return the subject of the HTML email taken from the title of the HTML
+    template.
+
+
+    :return: the subject of the HTML email template.
+
+
+    :raise AssertError: If the content of the HTML email template has not
+        been read, of if this HTML has no title defined.
+    """
+    start_offset = content.find('<title>')
+    assert start_offset > 0, "The HTML template has no title defined"
+    start_offset = content.find('>', start_offset) + 1
+
+    end_offset = content.find('</title>', start_offset)
+    assert end_offset > 0, "The HTML template has no title end tag."
+
+    return content[start_offset:end_offset]
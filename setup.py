@@ -38,6 +38,14 @@ __version__ = '2.0.0'
 # Base directory where this file is located.
 BASE_DIR = os.path.dirname(__file__)
 
+# Packages required only by some features, installed with the name of the
+# feature as an extra (e.g., `pip install ...[database]`).
+EXTRAS_REQUIREMENTS = {
+    # Import of the applications into the PostgreSQL database of the
+    # school bus platform (option `--database-dsn`).
+    'database': ['psycopg2'],
+}
+
 
 def get_requirements():
     pip_file = pipfile.load()
@@ -62,6 +70,7 @@ setuptools.setup(
         'Topic :: Software Development :: Libraries',
     ],
     description='School Transport Application Form Tool',
+    extras_require=EXTRAS_REQUIREMENTS,
     install_requires=get_requirements(),
     license=__license__,
     long_description=read_file(os.path.join(BASE_DIR, 'README.md')),